@@ -1,17 +1,19 @@
 import os
+import concurrent.futures
+import hashlib
+import importlib.util
+import time
 import streamlit as st
-import pandas as pd
-import requests
-import altair as alt
 
-from utils.schema_utils import infer_schema
-from utils.viz_utils import default_dashboard, detect_columns, chart_line_over_time, chart_bar_top_categories, chart_histogram
+from utils.agent_client import AgentClient, is_usable
+from utils import wire
+# pandas, altair and the dataset helpers are imported once a file is uploaded, so the empty
+# page renders without paying for them
 
 st.set_page_config(page_title="Data Agent Hub — Mini", page_icon="🧠", layout="wide")
 st.title("🧠 Data Agent Hub — Mini")
 
 # --- Agent endpoint switcher (sidebar) ---
-import os
 DEFAULTS = {
     "Mock Agent (8000)": "http://localhost:8000/agent",
     "Freestyle Stub (8001)": "http://localhost:8001/agent",
@@ -19,6 +21,15 @@ DEFAULTS = {
     "Hosted Freestyle (3000)": "http://localhost:3000/agent",
     "Custom…": "",
 }
+# Per-backend timeouts (seconds) for concurrent fan-out; LLM-backed targets get longer
+BACKEND_TIMEOUTS = {
+    "Mock Agent (8000)": 10,
+    "Freestyle Stub (8001)": 15,
+    "Local Freestyle Runner (8002)": 60,
+    "Hosted Freestyle (3000)": 60,
+}
+# The hosted TypeScript service only speaks JSON; the wire format choice applies to the others
+JSON_ONLY = {"Hosted Freestyle (3000)"}
 
 with st.sidebar:
     st.header("Agent Backend")
@@ -29,35 +40,86 @@ with st.sidebar:
         endpoint = DEFAULTS[choice]
     st.caption(f"Using: {endpoint}")
 
+    # Binary formats send the sample as typed columns; backends in this repo accept all three
+    WIRE_FORMATS = {"JSON": wire.JSON, "Arrow IPC": wire.ARROW, "MessagePack": wire.MSGPACK}
+    wire_choice = st.selectbox("Wire format", [k for k, v in WIRE_FORMATS.items() if v in wire.formats()], index=0)
+    wire_format = WIRE_FORMATS[wire_choice]
+    if choice in JSON_ONLY and wire_format != wire.JSON:
+        st.caption(f"{choice} accepts JSON only; sending JSON.")
+        wire_format = wire.JSON
+    stream_agent = st.checkbox("Stream agent response (SSE, local runner)", value=False)
+    # Submit to /agent/jobs and long-poll: no 60 s cut-off, and reruns reattach to the running job
+    agent_jobs = st.checkbox("Run agent as a background job", value=False)
+    fan_out = st.checkbox("Query several backends concurrently", value=False)
+    if fan_out:
+        fan_targets = st.multiselect(
+            "Backends", [k for k, v in DEFAULTS.items() if v], default=[k for k, v in DEFAULTS.items() if v]
+        )
+        hedge = st.checkbox("Hedge slow requests (resend after p95 latency)", value=True)
+
+    st.header("Ingestion")
+    # Files above the threshold are read in chunks; the dashboard then works on a reservoir sample
+    STREAMING_THRESHOLD_MB = float(os.getenv("STREAMING_THRESHOLD_MB", "200"))
+    streaming_mode = st.selectbox("CSV reading", ["Auto", "In-memory", "Streaming (chunked)"], index=0)
+    chunk_rows = st.number_input("Chunk size (rows)", min_value=10_000, max_value=2_000_000, value=200_000, step=10_000)
+    preview_rows = st.number_input("Preview sample (rows)", min_value=1_000, max_value=1_000_000, value=100_000, step=10_000)
+
+    st.header("Rendering")
+    # Auto = aggregate server-side once the frame is bigger than Altair's row limit
+    large_mode = st.selectbox("Large-data mode", ["Auto", "On", "Off"], index=0)
+    # DuckDB (optional) aggregates a Parquet copy of the data out of core; only chart tables reach pandas
+    engines = ["pandas"] + (["DuckDB"] if importlib.util.find_spec("duckdb") else [])
+    chart_engine = st.selectbox("Chart engine", engines, index=0)
+    large_data = {"Auto": None, "On": True, "Off": False}[large_mode]
 
 
 # endpoint = os.getenv("FREESTYLE_ENDPOINT", "http://localhost:8000/agent")
 st.caption(f"Agent endpoint: {endpoint}")
 
-uploaded_file = st.file_uploader("Upload a CSV file", type=["csv"])
+# --- Session caches: reruns reuse the parsed dataset and the agent response ---
+def upload_id(f):
+    # Streamlit gives every upload a new file_id; without one, key on the bytes themselves
+    from utils.session_cache import content_hash
+    return getattr(f, "file_id", None) or content_hash(f)
 
-if uploaded_file:
-    df = pd.read_csv(uploaded_file)
-    st.subheader("Sample Data")
-    st.dataframe(df.head(), use_container_width=True)
+@st.cache_resource(max_entries=8, show_spinner="Loading dataset...")
+def get_session_dataset(upload_key, _file, streaming, chunk_rows, preview_rows, name):
+    # upload_key (hashed, unlike _file) is what tells two uploads with the same name apart
+    from utils.session_cache import load_dataset
+    return load_dataset(_file, streaming=streaming, chunksize=chunk_rows, preview_rows=preview_rows, name=name)
 
-    schema_str, sample_str = infer_schema(df)
+@st.cache_resource(max_entries=8, show_spinner="Preparing DuckDB copy...")
+def get_sql_source(dataset_key, _ds, _file):
+    from utils.sql_engine import SqlSource
+    return SqlSource.from_dataset(_ds, _file)
 
-    with st.expander("🔎 Inferred Schema", expanded=False):
-        st.text(schema_str)
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_chart_recommendations(dataset_key, _df, nums, cats, times):
+    # Scored once per dataset (on a row sample), not on every rerun
+    from utils.recommend import recommend_charts
+    return recommend_charts(_df, nums, cats, times)
 
-    with st.spinner("Calling agent..."):
-        try:
-            response = requests.post(endpoint, json={
-                "schema_description": schema_str,
-                "sample_rows": sample_str
-            }, timeout=60)
-            response.raise_for_status()
-            output = response.json()
-        except Exception as e:
-            st.error(f"Agent call failed: {e}")
-            output = {"summary": "", "suggested_visuals": []}
+@st.cache_resource
+def get_agent_client():
+    # One pooled async client per server process, shared by every session and rerun
+    return AgentClient()
 
+@st.cache_data(max_entries=32, ttl=3600, show_spinner=False)
+def call_agent(endpoint, schema_str, sample_str, fmt=wire.JSON, name=None, timeout=60):
+    # Everything the call depends on is an argument, so it is part of the cache key
+    return get_agent_client().post(endpoint, {
+        "schema_description": schema_str,
+        "sample_rows": sample_str
+    }, timeout=timeout, name=name, fmt=fmt)
+
+def inline_datasets(spec, datasets):
+    # Backends ship aggregated tables once under `datasets`; specs refer to them by name
+    name = (spec.get("data") or {}).get("name") if isinstance(spec, dict) else None
+    if name and name in (datasets or {}):
+        return {**spec, "datasets": {name: datasets[name]}}
+    return spec
+
+def render_agent_output(output):
     col1, col2 = st.columns([1,1])
     with col1:
         st.subheader("🧾 Agent Summary")
@@ -70,7 +132,7 @@ if uploaded_file:
     if isinstance(specs, list) and specs:
         for i, spec in enumerate(specs, 1):
             st.caption(f"Chart {i}")
-            st.vega_lite_chart(spec, use_container_width=True)
+            st.vega_lite_chart(inline_datasets(spec, output.get("datasets")), use_container_width=True)
     else:
         st.info("No chart specs returned by the agent (yet).")
 
@@ -81,24 +143,207 @@ if uploaded_file:
         else:
             st.write(viz)
 
+def stream_agent_output(endpoint, payload):
+    # Progressively render /agent/stream events; returns the final response dict
+    live = st.empty()
+    summary, visuals, specs = "", [], []
+    stream_url = endpoint.rstrip("/") + "/stream"
+    for event, data in get_agent_client().stream_events(stream_url, payload):
+        if event == "summary":
+            summary += data
+        elif event == "suggested_visual":
+            visuals.append(data)
+        elif event == "chart_spec":
+            specs.append(data)
+        elif event == "done":
+            live.empty()
+            return data
+        elif event == "error":
+            raise RuntimeError(data)
+        with live.container():
+            st.subheader("🧾 Agent Summary (streaming…)")
+            st.write(summary)
+            for v in visuals:
+                st.markdown(f"- {v}")
+            for i, spec in enumerate(specs, 1):
+                st.caption(f"Chart {i}")
+                st.vega_lite_chart(spec, use_container_width=True)
+    raise RuntimeError("Stream ended without a final response")
+
+JOB_POLL_SECONDS = 15
+JOB_MAX_SECONDS = float(os.getenv("AGENT_JOB_MAX_SECONDS", "900"))
+
+def run_agent_job(endpoint, payload, fmt):
+    # One job per (endpoint, payload) per session. A rerun (or a reconnecting tab: the backend
+    # derives the id from the payload) picks up the same job instead of starting it again.
+    client = get_agent_client()
+    jobs = st.session_state.setdefault("agent_jobs", {})
+    key = hashlib.sha256(repr((endpoint, payload["schema_description"], payload["sample_rows"])).encode()).hexdigest()
+    job_id = jobs.get(key)
+    job = None
+    if job_id is not None:
+        try:
+            job = client.job(endpoint, job_id)
+        except Exception:
+            job = None  # expired or the backend restarted: submit again
+    if job is None:
+        job = client.submit_job(endpoint, payload, fmt=fmt)
+        jobs[key] = job["id"]
+        while len(jobs) > 16:
+            jobs.pop(next(iter(jobs)))
+    status = st.empty()
+    deadline = time.monotonic() + JOB_MAX_SECONDS
+    while job["status"] not in ("done", "failed") and time.monotonic() < deadline:
+        status.caption(f"Agent job {job['id'][:8]}… {job['status']} for {time.time() - job['created']:.0f}s")
+        job = client.job(endpoint, job["id"], wait=JOB_POLL_SECONDS)
+    status.empty()
+    if job["status"] == "failed":
+        jobs.pop(key, None)  # the next rerun submits it again
+        raise RuntimeError(job["error"])
+    if job["status"] != "done":
+        raise RuntimeError(f"job {job['id']} still {job['status']} after {JOB_MAX_SECONDS:.0f}s; rerun to keep waiting")
+    return job["result"]
+
+def render_backend_result(slot, r):
+    with slot.container():
+        if r["ok"]:
+            hedged = " (hedged)" if r.get("hedged") else ""
+            st.markdown(f"**{r['backend']}** — {r['latency']:.2f}s{hedged}")
+            st.write((r["output"] or {}).get("summary", ""))
+            st.caption(f"{len((r['output'] or {}).get('chart_specs', []) or [])} chart spec(s)")
+        else:
+            st.markdown(f"**{r['backend']}** — failed after {r['latency']:.2f}s: {r['error']}")
+
+uploaded_file = st.file_uploader("Upload a CSV file", type=["csv"])
+
+if uploaded_file:
+    from utils.viz_utils import (default_dashboard, chart_line_over_time, chart_bar_top_categories, chart_histogram,
+                                 chart_scatter)
+    from utils.dtype_optimizer import format_bytes
+
+    if streaming_mode == "Auto":
+        streaming = uploaded_file.size > STREAMING_THRESHOLD_MB * 1024 * 1024
+    else:
+        streaming = streaming_mode == "Streaming (chunked)"
+
+    ds = get_session_dataset(upload_id(uploaded_file), uploaded_file, streaming, int(chunk_rows), int(preview_rows),
+                             uploaded_file.name)
+    # The agent sees the schema/sample it last saw for this file name unless the data changed materially
+    df, schema_str, sample_str = ds.df, ds.agent_schema_str, ds.agent_sample_str
+
+    source = get_sql_source(ds.key, ds, uploaded_file) if chart_engine == "DuckDB" else None
+
+    st.subheader("Sample Data")
+    if streaming and source is not None:
+        st.caption("Streaming mode: schema computed over the full file; DuckDB charts aggregate the full file.")
+    elif streaming:
+        st.caption(f"Streaming mode: schema computed over the full file; charts use a {len(df):,}-row uniform sample.")
+    st.dataframe(df.head(), use_container_width=True)
+
+    with st.expander("🔎 Inferred Schema", expanded=False):
+        if ds.appended_rows is not None:
+            st.caption(f"Incremental profile: parsed {ds.appended_rows:,} appended rows; "
+                       f"reused the profile of the first {len(df) - ds.appended_rows:,}.")
+        if ds.agent_reused:
+            st.caption("No material change since the agent last saw this file; reusing its analysis.")
+        elif ds.summary_change:
+            st.caption(f"Agent re-queried: {ds.summary_change}.")
+        if ds.memory_before and ds.memory_after:
+            st.caption(f"In memory: {format_bytes(ds.memory_after)} "
+                       f"({format_bytes(ds.memory_before)} before dtype optimization).")
+        st.text(ds.schema_str)
+
+    payload = {"schema_description": schema_str, "sample_rows": sample_str}
+    pending = {}
+    if fan_out and fan_targets:
+        # Render the fastest usable response now; the rest fill in at the end of the script
+        targets = {name: DEFAULTS[name] for name in fan_targets}
+        fan_key = hashlib.sha256(repr((sorted(targets.items()), schema_str, sample_str)).encode()).hexdigest()
+        fan_cache = st.session_state.setdefault("fanout_results", {})
+        done = dict(fan_cache.get(fan_key, {}))
+        if not done:
+            pending = get_agent_client().submit(
+                targets, payload, timeouts={n: BACKEND_TIMEOUTS.get(n, 60) for n in targets}, hedge=hedge,
+                fmt=wire_format, formats={n: wire.JSON for n in targets if n in JSON_ONLY},
+            )
+        with st.spinner(f"Calling {len(targets)} agents..."):
+            for fut in concurrent.futures.as_completed(pending.values()):
+                r = fut.result()
+                done[r["backend"]] = r
+                if is_usable(r["output"]):
+                    break
+        pending = {n: f for n, f in pending.items() if n not in done}
+        usable = sorted((r for r in done.values() if r["ok"] and is_usable(r["output"])), key=lambda r: r["latency"])
+        primary = usable[0] if usable else None
+        if primary:
+            st.caption(f"Showing fastest usable response: {primary['backend']} ({primary['latency']:.2f}s)")
+            output = primary["output"]
+        else:
+            st.error("No backend returned a usable response.")
+            output = {"summary": "", "suggested_visuals": []}
+        render_agent_output(output)
+        with st.expander("📡 Other backend responses", expanded=False):
+            slots = {n: st.empty() for n in targets if not primary or n != primary["backend"]}
+            for n, slot in slots.items():
+                if n in done:
+                    render_backend_result(slot, done[n])
+                else:
+                    slot.caption(f"{n}: waiting…")
+    elif stream_agent:
+        # Stream once per (endpoint, payload); reruns reuse the finished response
+        stream_key = hashlib.sha256(repr((endpoint, schema_str, sample_str)).encode()).hexdigest()
+        streamed = st.session_state.setdefault("streamed_results", {})
+        output = streamed.get(stream_key)
+        if output is None:
+            try:
+                output = stream_agent_output(endpoint, payload)
+                streamed[stream_key] = output
+                while len(streamed) > 16:
+                    streamed.pop(next(iter(streamed)))
+            except Exception as e:
+                st.error(f"Agent stream failed: {e}")
+                output = {"summary": "", "suggested_visuals": []}
+        render_agent_output(output)
+    elif agent_jobs:
+        try:
+            output = run_agent_job(endpoint, payload, wire_format)
+        except Exception as e:
+            st.error(f"Agent job failed: {e}")
+            output = {"summary": "", "suggested_visuals": []}
+        render_agent_output(output)
+    else:
+        with st.spinner("Calling agent..."):
+            try:
+                output = call_agent(endpoint, schema_str, sample_str, wire_format, name=choice,
+                                    timeout=BACKEND_TIMEOUTS.get(choice, 60))
+            except Exception as e:
+                st.error(f"Agent call failed: {e}")
+                output = {"summary": "", "suggested_visuals": []}
+        render_agent_output(output)
+
     st.markdown("---")
     st.header("📊 Auto Dashboard (Local)")
 
-    charts, col_info = default_dashboard(df)
+    nums, cats, times = ds.numeric, ds.categorical, ds.datetime
+    recs = get_chart_recommendations(ds.key, df, tuple(nums), tuple(cats), tuple(times))
+    charts, col_info = default_dashboard(df, nums, cats, times, large_data=large_data, source=source,
+                                         recommendations=recs)
     if charts:
-        for ch in charts:
+        for ch, rec in zip(charts, col_info["recommendations"]):
             st.altair_chart(ch, use_container_width=True)
+            st.caption(f"{rec.kind.title()}: {rec.x}" + (f" / {rec.y}" if rec.y else "") + f" — {rec.reason}")
     else:
         st.info("Couldn't infer chart candidates. Try a dataset with numeric/date columns.")
 
     with st.expander("🔧 Build a Custom Chart"):
-        df2, nums, cats, times = detect_columns(df.copy())
-        chart_type = st.selectbox("Chart type", ["Line over time", "Bar by category", "Histogram"])
+        df2 = df
+        chart_type = st.selectbox("Chart type", ["Line over time", "Bar by category", "Scatter", "Histogram"])
         if chart_type == "Line over time":
             if times and nums:
                 tcol = st.selectbox("Time column", times, index=0)
                 vcol = st.selectbox("Value column", nums, index=0)
-                st.altair_chart(chart_line_over_time(df2, tcol, vcol), use_container_width=True)
+                st.altair_chart(chart_line_over_time(df2, tcol, vcol, large_data=large_data, source=source),
+                                use_container_width=True)
             else:
                 st.warning("No datetime and numeric columns detected.")
         elif chart_type == "Bar by category":
@@ -106,15 +351,62 @@ if uploaded_file:
                 ccol = st.selectbox("Category column", cats, index=0)
                 vcol = st.selectbox("Value column", nums, index=0)
                 agg = st.selectbox("Aggregation", ["mean", "sum"], index=0)
-                st.altair_chart(chart_bar_top_categories(df2, ccol, vcol, top_n=10, agg=agg), use_container_width=True)
+                st.altair_chart(chart_bar_top_categories(df2, ccol, vcol, top_n=10, agg=agg, large_data=large_data,
+                                                        source=source), use_container_width=True)
             else:
                 st.warning("Need at least one categorical and one numeric column.")
+        elif chart_type == "Scatter":
+            if len(nums) > 1:
+                xcol = st.selectbox("X column", nums, index=0)
+                ycol = st.selectbox("Y column", nums, index=1)
+                st.altair_chart(chart_scatter(df2, xcol, ycol, large_data=large_data, source=source),
+                                use_container_width=True)
+            else:
+                st.warning("Need at least two numeric columns.")
         else:
             if nums:
                 vcol = st.selectbox("Value column", nums, index=0)
                 bins = st.slider("Bins", 5, 60, 30)
-                st.altair_chart(chart_histogram(df2, vcol, bins=bins), use_container_width=True)
+                st.altair_chart(chart_histogram(df2, vcol, bins=bins, large_data=large_data, source=source),
+                                use_container_width=True)
             else:
                 st.warning("Need at least one numeric column.")
+
+    # Late fan-out responses land in the placeholders reserved above
+    for fut in concurrent.futures.as_completed(pending.values()):
+        r = fut.result()
+        done[r["backend"]] = r
+        if r["backend"] in slots:
+            render_backend_result(slots[r["backend"]], r)
+    if fan_out and fan_targets:
+        fan_cache[fan_key] = done
+        while len(fan_cache) > 16:
+            fan_cache.pop(next(iter(fan_cache)))
 else:
     st.info("Upload a CSV to begin.")
+
+with st.sidebar:
+    hist = get_agent_client().histograms()
+    timings = get_agent_client().last_timings()
+    if hist or timings:
+        import pandas as pd
+    if hist:
+        with st.expander("⏱️ Backend latency", expanded=False):
+            st.bar_chart(pd.DataFrame(hist))
+    if timings:
+        with st.expander("🐞 Request timings (debug)", expanded=False):
+            st.caption("Most recent request per backend. Server stages come from its Server-Timing header.")
+            for name, t in timings.items():
+                server = dict(t.get("server") or {})
+                server_total = server.pop("total", None)
+                rows = [("client", k[:-3], v) for k, v in t.items() if k.endswith("_ms")]
+                if server_total is not None and "wait_ms" in t:
+                    rows.append(("client", "network+queue", max(t["wait_ms"] - server_total, 0.0)))
+                rows += [("server", k, v) for k, v in server.items()]
+                if server_total is not None:
+                    rows.append(("server", "total", server_total))
+                wire_info = f" ({t['wire_bytes']:,} on the wire, {t['format']})" if "format" in t else ""
+                st.markdown(f"**{name}** — {t.get('bytes', 0):,} bytes{wire_info}")
+                st.dataframe(pd.DataFrame(rows, columns=["side", "stage", "ms"]).round(2),
+                             hide_index=True, use_container_width=True)
+
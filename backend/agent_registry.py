@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Agent-config registry for the local runner.
+#
+# Each agent YAML is read, validated and compiled once: the full prompt (instructions, the
+# strict-JSON directive and the prompt template) is split into literal and variable parts so
+# rendering is a single join. Files are re-stat'ed at most every `check_interval` seconds and
+# reloaded when their mtime changes; a broken edit keeps the last good version in service.
+#
+# Parsed YAML is snapshotted as JSON under FREESTYLE_AGENT_SNAPSHOTS, keyed by the content hash.
+# A process that finds a snapshot for the current file never imports yaml (cold start); set the
+# variable to an empty string to always parse.
+
+STRICT_DIRECTIVE = (
+    "Return ONLY a single JSON object with keys: "
+    '"summary", "suggested_visuals", "chart_specs". '
+    "Do not include markdown fences or extra text.\n"
+)
+DEFAULT_PROMPT = "SCHEMA DESCRIPTION:\n{{schema_description}}\n\nSAMPLE_ROWS (CSV):\n{{sample_rows}}\n"
+DEFAULT_SYSTEM = "You are a data visualization agent."
+TEMPLATE_VARS = {"schema_description", "sample_rows"}
+_VAR_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+SNAPSHOT_DIR = os.getenv("FREESTYLE_AGENT_SNAPSHOTS", ".cache/agents")
+
+
+class AgentConfigError(ValueError):
+    pass
+
+
+def compile_template(template: str) -> List[Any]:
+    # "a {{x}} b" -> ["a ", ("x",), " b"]; variables are 1-tuples so they can't collide with text
+    parts, pos = [], 0
+    for m in _VAR_RE.finditer(template):
+        if m.start() > pos:
+            parts.append(template[pos:m.start()])
+        parts.append((m.group(1),))
+        pos = m.end()
+    if pos < len(template):
+        parts.append(template[pos:])
+    return parts
+
+
+class AgentConfig:
+    def __init__(self, name: str, path: str, raw: Dict[str, Any], version: str, mtime: float):
+        self.name = name
+        self.path = path
+        self.raw = raw
+        self.version = version
+        self.mtime = mtime
+        self.system = raw.get("description") or DEFAULT_SYSTEM
+
+        instructions = raw.get("instructions")
+        if instructions is None and isinstance(raw.get("tasks"), list):
+            # Older YAMLs (repo root) describe tasks instead of free-form instructions
+            instructions = "\n".join(
+                f"- {k}: {str(v).strip()}" for task in raw["tasks"] if isinstance(task, dict) for k, v in task.items()
+            )
+        prompt = raw.get("prompt") or DEFAULT_PROMPT
+        if not isinstance(instructions or "", str) or not isinstance(prompt, str):
+            raise AgentConfigError(f"{path}: 'instructions' and 'prompt' must be strings")
+
+        # Only the prompt template is interpolated; instructions are taken literally
+        self.parts = [f"{(instructions or '').strip()}\n\n{STRICT_DIRECTIVE}\n"] + compile_template(prompt.strip())
+        unknown = {p[0] for p in self.parts if isinstance(p, tuple)} - TEMPLATE_VARS
+        if unknown:
+            raise AgentConfigError(f"{path}: unknown template variables {sorted(unknown)}")
+
+    def get(self, key: str, default=None):
+        return self.raw.get(key, default)
+
+    def render(self, **values: str) -> str:
+        return "".join(p if isinstance(p, str) else values.get(p[0], "") for p in self.parts)
+
+    def info(self) -> Dict[str, Any]:
+        return {"name": self.name, "path": self.path, "version": self.version, "mtime": self.mtime}
+
+
+def _parse_yaml(blob: bytes, digest: str) -> Any:
+    snapshot = os.path.join(SNAPSHOT_DIR, f"{digest}.json") if SNAPSHOT_DIR else None
+    if snapshot and os.path.exists(snapshot):
+        try:
+            with open(snapshot, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass  # unreadable snapshot: parse and rewrite it
+    import yaml
+    raw = yaml.safe_load(blob)
+    if snapshot:
+        try:
+            text = json.dumps(raw)  # TypeError for YAML-only types (dates): no snapshot
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            tmp = f"{snapshot}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, snapshot)
+        except (OSError, TypeError, ValueError):
+            pass
+    return raw
+
+
+def load_agent_config(path: str, name: Optional[str] = None) -> AgentConfig:
+    with open(path, "rb") as f:
+        blob = f.read()
+    digest = hashlib.sha256(blob).hexdigest()
+    raw = _parse_yaml(blob, digest)
+    if not isinstance(raw, dict):
+        raise AgentConfigError(f"{path}: expected a YAML mapping")
+    return AgentConfig(
+        name=name or raw.get("name") or os.path.splitext(os.path.basename(path))[0],
+        path=path,
+        raw=raw,
+        version=digest[:12],
+        mtime=os.path.getmtime(path),
+    )
+
+
+class AgentRegistry:
+    def __init__(self, paths: Dict[str, str], default: Optional[str] = None, check_interval: float = 1.0):
+        # paths: {agent name: yaml path}; the first entry is the default unless given
+        self.paths = dict(paths)
+        self.default = default or next(iter(self.paths))
+        self.check_interval = check_interval
+        self._configs: Dict[str, AgentConfig] = {}
+        self._checked: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        for name in self.paths:
+            self._load(name)
+
+    def _load(self, name: str):
+        try:
+            self._configs[name] = load_agent_config(self.paths[name], name)
+            self._errors.pop(name, None)
+        except Exception as e:
+            self._errors[name] = f"{type(e).__name__}: {e}"
+            if name not in self._configs:
+                raise
+
+    def get(self, name: Optional[str] = None) -> AgentConfig:
+        name = name or self.default
+        if name not in self.paths:
+            raise KeyError(name)
+        now = time.monotonic()
+        if now - self._checked.get(name, 0.0) >= self.check_interval:
+            with self._lock:
+                self._checked[name] = now
+                try:
+                    mtime = os.path.getmtime(self.paths[name])
+                except OSError:
+                    mtime = None
+                if mtime is not None and mtime != self._configs[name].mtime:
+                    self._load(name)
+        return self._configs[name]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "default": self.default,
+            "agents": {name: cfg.info() for name, cfg in self._configs.items()},
+            "errors": dict(self._errors),
+        }
+
+
+def registry_from_env(default_path: str) -> AgentRegistry:
+    # FREESTYLE_AGENTS="data-ui=freestyle/data_ui_agent.yaml,legacy=data_ui_agent.yaml"
+    spec = os.getenv("FREESTYLE_AGENTS", "")
+    paths = {}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        name, _, path = entry.partition("=")
+        paths[name.strip()] = path.strip()
+    if not paths:
+        cfg = load_agent_config(default_path)
+        paths[cfg.name] = default_path
+    return AgentRegistry(
+        paths,
+        default=os.getenv("FREESTYLE_DEFAULT_AGENT") or None,
+        check_interval=float(os.getenv("FREESTYLE_RELOAD_INTERVAL", "1")),
+    )
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Minimal OpenAI-compatible server for exercising the runner's LLM client locally:
+#   uvicorn backend.fake_openai:app --port 9000
+#   OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=fake uvicorn backend.freestyle_local_runner:app --port 8002
+#
+# Knobs (env, read per request so they can be flipped while running):
+#   FAKE_OPENAI_LATENCY      seconds before responding (default 0.05)
+#   FAKE_OPENAI_FAIL_RATE    probability of an error response (default 0)
+#   FAKE_OPENAI_FAIL_STATUS  status code for injected errors (default 503; 429 also useful)
+#   FAKE_OPENAI_CHUNK        characters per streamed delta (default 12)
+
+app = FastAPI(title="Fake OpenAI")
+stats = {"requests": 0, "errors": 0}
+
+
+def fake_content(prompt: str) -> str:
+    # Deterministic agent-shaped answer derived from the header of the SAMPLE_ROWS block
+    m = re.search(r"SAMPLE_ROWS \(CSV\):\s*\n(.*)", prompt)
+    header = m.group(1).split(",") if m else []
+    cols = [h.strip() for h in header if h.strip()]
+    return json.dumps({
+        "summary": f"Fake summary of a dataset with columns: {', '.join(cols) or 'unknown'}.",
+        "suggested_visuals": [f"Distribution of {c}" for c in cols[:3]],
+        "chart_specs": [],
+    })
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    await asyncio.sleep(float(os.getenv("FAKE_OPENAI_LATENCY", "0.05")))
+    if random.random() < float(os.getenv("FAKE_OPENAI_FAIL_RATE", "0")):
+        stats["errors"] += 1
+        status = int(os.getenv("FAKE_OPENAI_FAIL_STATUS", "503"))
+        return JSONResponse({"error": {"message": "injected failure", "type": "fake"}}, status_code=status)
+
+    prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+    content = fake_content(prompt)
+    created, model = int(time.time()), body.get("model", "fake")
+
+    if not body.get("stream"):
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }
+
+    size = int(os.getenv("FAKE_OPENAI_CHUNK", "12"))
+
+    async def events():
+        for i in range(0, len(content), size):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": content[i:i + size]}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(0)
+        done = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
@@ -1,58 +1,66 @@
 import os, json, io, re
-from typing import List, Dict, Any
-from fastapi import FastAPI
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import yaml
 
-# --- LLM client (OpenAI) ---
-from openai import OpenAI
+from backend import jobs
+from backend.agent_registry import AgentConfig, registry_from_env
+from backend.json_stream import IncrementalJSONParser
+from backend.lifecycle import WARMUP_CSV, install, run_cpu
+from backend.llm_client import LLMUnavailable, client_from_env
+from backend.models import AgentRequest, AgentResponse, agent_request_text, agent_response
+from backend.response_cache import cache_from_env, cache_key
+from backend.semantic_cache import semantic_cache_from_env
+from backend.tracing import instrument, span
 
 # Read env
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL   = os.getenv("OPENAI_MODEL", "gpt-4o-mini")  # pick your model
 
+# --- LLM client (OpenAI) ---
+# One pooled async client per process: retries, rate limiting and a circuit breaker live there
+llm_client = client_from_env(OPENAI_API_KEY, OPENAI_MODEL)
+
 # Paths
 YAML_PATH = os.getenv("FREESTYLE_YAML", "freestyle/data_ui_agent.yaml")
 
+# Agent configs: loaded and compiled once, hot-reloaded on file change (see FREESTYLE_AGENTS)
+agent_registry = registry_from_env(YAML_PATH)
+
+# Response cache (in-memory LRU + optional SQLite tier)
+CACHE_ENABLED = os.getenv("FREESTYLE_CACHE", "1") != "0"
+response_cache = cache_from_env()
+# Schema-similarity tier in front of the LLM: near-identical shapes reuse an answer, rebound
+semantic_cache = semantic_cache_from_env() if CACHE_ENABLED else None
+
+# Batch endpoint: LLM calls bounded by a semaphore (deterministic stages use the CPU pool)
+BATCH_LLM_CONCURRENCY = int(os.getenv("FREESTYLE_BATCH_LLM_CONCURRENCY", "4"))
+
 # App
 app = FastAPI(title="Local Freestyle Runner")
+instrument(app, "freestyle_local_runner")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
 )
 
-# Request / Response models (same as your UI expects)
-class AgentRequest(BaseModel):
-    schema_description: str
-    sample_rows: str
-
-class AgentResponse(BaseModel):
-    summary: str
-    suggested_visuals: List[str]
-    chart_specs: List[Dict[str, Any]]
+# Request / Response models live in backend/models.py (shared by every backend)
+class BatchRequest(BaseModel):
+    items: List[AgentRequest]
 
 # --- Utilities ---
-def load_agent_yaml(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
-
-def build_prompt(agent_cfg: Dict[str, Any], payload: AgentRequest) -> str:
-    # Use your tuned YAML fields
-    instructions = agent_cfg.get("instructions", "").strip()
-    prompt_tmpl  = agent_cfg.get("prompt", "").strip()
-
-    # Fill the simple jinja-style vars the YAML expects
-    prompt = prompt_tmpl.replace("{{schema_description}}", payload.schema_description)
-    prompt = prompt.replace("{{sample_rows}}", payload.sample_rows)
-
-    # Wrap with a strict directive to return only JSON
-    strict = (
-        "Return ONLY a single JSON object with keys: "
-        '"summary", "suggested_visuals", "chart_specs". '
-        "Do not include markdown fences or extra text.\n"
-    )
-    return f"{instructions}\n\n{strict}\n{prompt}"
+def build_prompt(agent_cfg: AgentConfig, payload: AgentRequest) -> str:
+    # Template is precompiled by the registry; this is a single join
+    return agent_cfg.render(schema_description=payload.schema_description, sample_rows=payload.sample_rows)
+
+def get_agent(name: Optional[str]) -> AgentConfig:
+    try:
+        return agent_registry.get(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown agent: {name}")
 
 def extract_json(text: str) -> Dict[str, Any]:
     # Best effort: find the first { ... } block
@@ -71,51 +79,66 @@ def extract_json(text: str) -> Dict[str, Any]:
 # --- Level 0: deterministic fallback (no LLM) ---
 def fallback_response(payload: AgentRequest) -> AgentResponse:
     # Minimal, safe default so you can debug end-to-end without an LLM
-    # Produces a single bar chart if it sees 'Location' and 'DataValue'
-    import csv
-    reader = csv.DictReader(io.StringIO(payload.sample_rows))
-    rows = list(reader)
-    values = rows if rows else []
-    spec = {
-        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
-        "data": {"values": values},
-        "mark": "bar",
-        "encoding": {
-            "x": {"field": "Location", "type": "nominal", "title": "Location"},
-            "y": {"field": "DataValue", "type": "quantitative", "title": "DataValue"},
-            "tooltip": [
-                {"field": "Location", "type": "nominal"},
-                {"field": "DataValue", "type": "quantitative"}
-            ]
-        },
-        "height": 300
-    }
+    # Produces a single bar chart (mean DataValue per Location) if it sees both columns
+    import pandas as pd
+    from backend.vega_specs import add_dataset, bar_spec
+    from utils.aggregation import aggregate_by_category
+    df = payload.sample_frame
+    if df is None:
+        try:
+            df = pd.read_csv(io.StringIO(payload.sample_rows))
+        except Exception:
+            df = pd.DataFrame()
+    datasets: Dict[str, List[Dict[str, Any]]] = {}
+    specs = []
+    if not df.empty and {"Location", "DataValue"} <= set(df.columns):
+        df = df.assign(DataValue=pd.to_numeric(df["DataValue"], errors="coerce"))
+        table = aggregate_by_category(df, "Location", "DataValue", agg="mean", top_n=None)
+        specs.append(bar_spec(add_dataset(datasets, table), "Location", "DataValue"))
     return AgentResponse(
         summary="Fallback summary (no LLM).",
         suggested_visuals=["Bar chart of Location vs DataValue"],
-        chart_specs=[spec] if values else []
+        chart_specs=specs,
+        datasets=datasets,
     )
 
 # --- Level 1: LLM-backed ---
-def llm_response(agent_cfg: Dict[str, Any], payload: AgentRequest) -> AgentResponse:
+def llm_messages(agent_cfg: AgentConfig, prompt: str) -> List[Dict[str, str]]:
+    # System content: keep it minimal; YAML 'description' is a good fit
+    return [
+        {"role": "system", "content": agent_cfg.system},
+        {"role": "user", "content": prompt},
+    ]
+
+def semantic_scope(agent_cfg: AgentConfig) -> str:
+    return f"{agent_cfg.name}:{agent_cfg.version}:{OPENAI_MODEL}"
+
+async def llm_response(agent_cfg: AgentConfig, payload: AgentRequest, prompt: str = None) -> AgentResponse:
     if not OPENAI_API_KEY:
         # No key? fall back deterministically
-        return fallback_response(payload)
+        return await run_cpu("fallback", fallback_response, payload)
 
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    prompt = build_prompt(agent_cfg, payload)
+    if semantic_cache is not None:
+        with span("semantic"):
+            reused = semantic_cache.get(semantic_scope(agent_cfg), payload.schema_description,
+                                        payload.sample_rows, payload.sample_frame)
+        if reused is not None:
+            return AgentResponse(**reused)
+    resp = await _llm_call(agent_cfg, payload, prompt)
+    if semantic_cache is not None:
+        semantic_cache.put(semantic_scope(agent_cfg), payload.schema_description, resp.model_dump())
+    return resp
 
-    # System content: keep it minimal; YAML 'description' is a good fit
-    system = agent_cfg.get("description", "You are a data visualization agent.")
-    completion = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.1,
-    )
-    text = completion.choices[0].message.content
+async def _llm_call(agent_cfg: AgentConfig, payload: AgentRequest, prompt: str = None) -> AgentResponse:
+    if prompt is None:
+        with span("prompt"):
+            prompt = build_prompt(agent_cfg, payload)
+    with span("llm"):
+        text = await llm_client.complete(llm_messages(agent_cfg, prompt), temperature=0.1)
+    with span("extract"):
+        return parse_agent_json(text)
+
+def parse_agent_json(text: str) -> AgentResponse:
     data = extract_json(text)
 
     # Validate minimal contract
@@ -127,18 +150,191 @@ def llm_response(agent_cfg: Dict[str, Any], payload: AgentRequest) -> AgentRespo
 
     return AgentResponse(summary=summary, suggested_visuals=suggested, chart_specs=specs)
 
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def response_events(resp: Dict[str, Any]):
+    # Replay a finished response in the same event vocabulary as a live stream
+    yield sse("summary", resp.get("summary", ""))
+    for v in resp.get("suggested_visuals", []):
+        yield sse("suggested_visual", v)
+    for spec in resp.get("chart_specs", []):
+        yield sse("chart_spec", spec)
+    yield sse("done", resp)
+
+async def llm_stream(agent_cfg: AgentConfig, payload: AgentRequest, key: str):
+    parser = IncrementalJSONParser()
+    with span("prompt"):
+        messages = llm_messages(agent_cfg, build_prompt(agent_cfg, payload))
+    try:
+        with span("llm"):
+            async for delta in llm_client.stream(messages, temperature=0.1):
+                for event, value in parser.feed(delta):
+                    yield sse(event, value)
+    except Exception as e:
+        # Every failure ends in an event: LLMUnavailable (retries exhausted, circuit open or the
+        # stream dropped) falls back when nothing was sent yet; anything else (e.g. a 400 for an
+        # oversized prompt) is reported
+        if parser.text or not isinstance(e, LLMUnavailable):
+            yield sse("error", f"LLM stream failed: {type(e).__name__}: {e}")
+            return
+        # Nothing sent yet: degrade to the deterministic answer (not cached)
+        for event in response_events((await run_cpu("fallback", fallback_response, payload)).model_dump()):
+            yield event
+        return
+    try:
+        with span("extract"):
+            resp = parse_agent_json(parser.text).model_dump()
+    except ValueError as e:
+        yield sse("error", str(e))
+        return
+    if CACHE_ENABLED:
+        response_cache.put(key, resp)
+    if semantic_cache is not None:
+        semantic_cache.put(semantic_scope(agent_cfg), payload.schema_description, resp)
+    yield sse("done", resp)
+
+async def _batch_item(agent_cfg: AgentConfig, payload: AgentRequest, level: str) -> Tuple[AgentResponse, bool]:
+    # -> (response, whether to cache it)
+    if level == "0" or not OPENAI_API_KEY:
+        # Level 0 keys its own cache entries; a fallback for a missing key must not stand in for
+        # the LLM answer once a key is configured
+        return await run_cpu("fallback", fallback_response, payload), level == "0"
+    prompt = await run_cpu("prompt", build_prompt, agent_cfg, payload)
+    try:
+        return await llm_response(agent_cfg, payload, prompt=prompt), True
+    except LLMUnavailable:
+        # As in /agent: the deterministic answer, not cached so a later batch tries the LLM again
+        return await run_cpu("fallback", fallback_response, payload), False
+
+def warmup():
+    fallback_response(AgentRequest(schema_description="", sample_rows=WARMUP_CSV))
+
+# The LLM path needs openai on the first request; at level 0 (or without a key) it never loads
+install(app, warmup, preload=("openai", "httpx") if OPENAI_API_KEY and os.getenv("FREESTYLE_LEVEL", "1") != "0" else ())
+
 # --- Routes ---
 @app.get("/health")
 def health():
-    return {"ok": True, "yaml": YAML_PATH, "model": OPENAI_MODEL}
+    return {
+        "ok": True, "yaml": YAML_PATH, "model": OPENAI_MODEL,
+        "config": agent_registry.info(),
+        "cache": {"enabled": CACHE_ENABLED, **response_cache.stats()},
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else {"enabled": False},
+        "llm": llm_client.stats(),
+        "jobs": job_runner.stats(),
+    }
 
-@app.post("/agent", response_model=AgentResponse)
-def agent(req: AgentRequest):
-    agent_cfg = load_agent_yaml(YAML_PATH)
+async def agent_answer(req: AgentRequest) -> AgentResponse:
+    agent_cfg = get_agent(req.agent)
 
     # Toggle levels with an env var for easy debugging
     level = os.getenv("FREESTYLE_LEVEL", "1")  # "0" = fallback only, "1" = LLM
-    if level == "0":
-        return fallback_response(req)
 
-    return llm_response(agent_cfg, req)
+    key = cache_key(req.schema_description, req.sample_rows, agent_cfg.name, agent_cfg.version, OPENAI_MODEL, level)
+    if CACHE_ENABLED:
+        with span("cache"):
+            cached = response_cache.get(key)
+        if cached is not None:
+            return AgentResponse(**cached)
+
+    if level == "0" or not OPENAI_API_KEY:
+        resp = await run_cpu("fallback", fallback_response, req)
+        if level != "0":
+            return resp  # no key: not cached under the LLM level's key
+    else:
+        try:
+            resp = await llm_response(agent_cfg, req)
+        except LLMUnavailable:
+            # Upstream degraded (retries exhausted or circuit open): serve the deterministic
+            # answer, but don't cache it so the next request tries the LLM again
+            return await run_cpu("fallback", fallback_response, req)
+
+    if CACHE_ENABLED:
+        response_cache.put(key, resp.model_dump())
+    return resp
+
+# Slow LLM completions: POST /agent/jobs returns an id to poll instead (see backend/jobs.py)
+job_runner = jobs.install(app, agent_answer, agent_request_text)
+
+@app.post("/agent", response_model=AgentResponse)
+async def agent(request: Request, req: AgentRequest = Depends(agent_request_text)):
+    return agent_response(request, await agent_answer(req))
+
+@app.post("/agent/batch")
+def agent_batch(batch: BatchRequest):
+    # Streams one NDJSON line per input item ({"index", "cached", "response"|"error"}) in
+    # completion order. Identical payloads are computed once and fanned back out by index.
+    level = os.getenv("FREESTYLE_LEVEL", "1")
+
+    groups: Dict[str, List[int]] = {}
+    configs: Dict[str, AgentConfig] = {}
+    for i, item in enumerate(batch.items):
+        cfg = get_agent(item.agent)
+        key = cache_key(item.schema_description, item.sample_rows, cfg.name, cfg.version, OPENAI_MODEL, level)
+        groups.setdefault(key, []).append(i)
+        configs[key] = cfg
+
+    def lines(key: str, body: Dict[str, Any]):
+        return "".join(json.dumps({"index": i, **body}) + "\n" for i in groups[key])
+
+    async def generate():
+        results: "asyncio.Queue[tuple]" = asyncio.Queue()
+        limit = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+        async def run(key: str):
+            async with limit:
+                try:
+                    results.put_nowait((key, *await _batch_item(configs[key], batch.items[groups[key][0]], level), None))
+                except Exception as e:
+                    results.put_nowait((key, None, False, e))
+
+        tasks = []
+        for key in groups:
+            cached = response_cache.get(key) if CACHE_ENABLED else None
+            if cached is not None:
+                yield lines(key, {"cached": True, "response": cached})
+                continue
+            tasks.append(asyncio.create_task(run(key)))
+        try:
+            for _ in range(len(tasks)):
+                key, resp, cacheable, err = await results.get()
+                if err is not None:
+                    yield lines(key, {"cached": False, "error": f"{type(err).__name__}: {err}"})
+                    continue
+                resp = resp.model_dump()
+                if CACHE_ENABLED and cacheable:
+                    response_cache.put(key, resp)
+                yield lines(key, {"cached": False, "response": resp})
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.post("/agent/stream")
+async def agent_stream(req: AgentRequest = Depends(agent_request_text)):
+    # Server-Sent Events: "summary" (text deltas), "suggested_visual" and "chart_spec" (one per
+    # completed element), then "done" with the full validated response, or "error".
+    agent_cfg = get_agent(req.agent)
+    level = os.getenv("FREESTYLE_LEVEL", "1")
+    key = cache_key(req.schema_description, req.sample_rows, agent_cfg.name, agent_cfg.version, OPENAI_MODEL, level)
+
+    with span("cache"):
+        cached = response_cache.get(key) if CACHE_ENABLED else None
+    if cached is None and semantic_cache is not None and level != "0" and OPENAI_API_KEY:
+        with span("semantic"):
+            cached = semantic_cache.get(semantic_scope(agent_cfg), req.schema_description, req.sample_rows,
+                                        req.sample_frame)
+        if cached is not None:
+            response_cache.put(key, cached)
+    if cached is not None:
+        events = response_events(cached)
+    elif level == "0" or not OPENAI_API_KEY:
+        resp = (await run_cpu("fallback", fallback_response, req)).model_dump()
+        if CACHE_ENABLED and level == "0":
+            response_cache.put(key, resp)
+        events = response_events(resp)
+    else:
+        events = llm_stream(agent_cfg, req, key)
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,13 +1,19 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
 from typing import List, Dict, Any
 import csv, io
-import pandas as pd
 
-# Local Freestyle-like stub with the same HTTP contract
+from backend import jobs
+from backend.lifecycle import WARMUP_CSV, install, run_cpu
+from backend.models import AgentRequest, AgentResponse, agent_request, agent_response
+from backend.tracing import instrument, span
+
+# Local Freestyle-like stub with the same HTTP contract.
+# pandas and the chart helpers are imported where they are used: with a CPU pool the web
+# process only routes requests, and warm-up loads them in the pool processes.
 
 app = FastAPI(title="Freestyle Local Stub")
+instrument(app, "freestyle_stub")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -16,110 +22,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class AgentRequest(BaseModel):
-    schema_description: str
-    sample_rows: str
-
-class AgentResponse(BaseModel):
-    summary: str
-    suggested_visuals: List[str]
-    chart_specs: List[Dict[str, Any]]
+TOP_N = 10
 
-def parse_rows(csv_text: str) -> pd.DataFrame:
+def parse_rows(csv_text: str):
+    import pandas as pd
     df = pd.read_csv(io.StringIO(csv_text))
     return df
 
-def infer_types(df: pd.DataFrame):
-    datetime_cols, numeric_cols, categorical_cols = [], [], []
-    df2 = df.copy()
-    for col in df2.columns:
-        if df2[col].dtype == object:
-            try:
-                parsed = pd.to_datetime(df2[col], errors="raise", infer_datetime_format=True)
-                df2[col] = parsed
-            except Exception:
-                pass
-        if pd.api.types.is_datetime64_any_dtype(df2[col]):
-            datetime_cols.append(col)
-            continue
-        ser = pd.to_numeric(df2[col], errors="coerce")
-        non_na_ratio = ser.notna().mean()
-        if non_na_ratio >= 0.6:
-            df2[col] = ser
-            numeric_cols.append(col)
-        else:
-            if col not in datetime_cols:
-                categorical_cols.append(col)
+def infer_types(df):
+    from utils.type_inference import infer_column_types
+    df2, numeric_cols, categorical_cols, datetime_cols = infer_column_types(df)
     return df2, datetime_cols, numeric_cols, categorical_cols
 
-def vega_bar(values, cat_col, num_col):
-    return {
-        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
-        "data": {"values": values},
-        "mark": "bar",
-        "encoding": {
-            "x": {"field": cat_col, "type": "nominal", "title": cat_col},
-            "y": {"field": num_col, "type": "quantitative", "title": num_col},
-            "tooltip": [
-                {"field": cat_col, "type": "nominal"},
-                {"field": num_col, "type": "quantitative"}
-            ]
-        },
-        "height": 300
-    }
-
-def vega_line(values, time_col, num_col):
-    return {
-        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
-        "data": {"values": values},
-        "mark": "line",
-        "encoding": {
-            "x": {"field": time_col, "type": "temporal", "title": time_col},
-            "y": {"field": num_col, "type": "quantitative", "title": num_col},
-            "tooltip": [
-                {"field": time_col, "type": "temporal"},
-                {"field": num_col, "type": "quantitative"}
-            ]
-        },
-        "height": 300
-    }
-
-def coerce_values_for_spec(df: pd.DataFrame):
-    return df.to_dict(orient="records")
-
-@app.post("/agent", response_model=AgentResponse)
-def agent(req: AgentRequest):
-    try:
-        df = parse_rows(req.sample_rows)
-    except Exception:
-        reader = csv.DictReader(io.StringIO(req.sample_rows))
-        import pandas as pd
-        df = pd.DataFrame(list(reader))
-
-    df2, time_cols, num_cols, cat_cols = infer_types(df)
-
-    visuals = []
-    specs: List[Dict[str, Any]] = []
-    values = coerce_values_for_spec(df2)
-
-    if time_cols and num_cols:
-        tcol, ncol = time_cols[0], num_cols[0]
-        visuals.append("Line chart of numeric metric over time")
-        specs.append(vega_line(values, tcol, ncol))
-
-    if cat_cols and num_cols:
-        ccol, ncol = cat_cols[0], num_cols[0]
-        visuals.append("Bar chart of category vs numeric metric")
-        specs.append(vega_bar(values, ccol, ncol))
+VISUALS = {
+    "line": "Line chart of {y} over {x}",
+    "bar": "Bar chart of mean {y} by {x}",
+    "scatter": "Scatter plot of {y} against {x}",
+    "histogram": "Histogram of {x}",
+}
+
+def chart_spec(df, rec, datasets):
+    # utils.recommend.Recommendation -> Vega-Lite spec over a pre-aggregated table
+    from backend.vega_specs import add_dataset, bar_spec, histogram_spec, line_spec, scatter_spec
+    from utils.aggregation import aggregate_by_category, aggregate_over_time, histogram_table, scatter_sample
+    if rec.kind == "line":
+        table = aggregate_over_time(df, rec.x, rec.y, agg="mean")
+        return line_spec(add_dataset(datasets, table), rec.x, rec.y, title=f"Mean {rec.y}")
+    if rec.kind == "bar":
+        table = aggregate_by_category(df, rec.x, rec.y, agg="mean", top_n=TOP_N)
+        return bar_spec(add_dataset(datasets, table), rec.x, rec.y, title=f"Mean {rec.y}")
+    if rec.kind == "scatter":
+        return scatter_spec(add_dataset(datasets, scatter_sample(df, rec.x, rec.y)), rec.x, rec.y)
+    return histogram_spec(add_dataset(datasets, histogram_table(df[rec.x])), rec.x)
+
+def build_response(sample) -> AgentResponse:
+    # `sample` is a typed frame (binary requests) or CSV text (JSON). Runs in the CPU pool.
+    import pandas as pd
+    from utils.recommend import recommend_charts
+
+    with span("parse"):
+        try:
+            df = sample if isinstance(sample, pd.DataFrame) else parse_rows(sample)
+        except Exception:
+            reader = csv.DictReader(io.StringIO(sample))
+            df = pd.DataFrame(list(reader))
+
+    with span("infer"):
+        df2, time_cols, num_cols, cat_cols = infer_types(df)
+
+    with span("recommend"):
+        picks = recommend_charts(df2, num_cols, cat_cols, time_cols)
+
+    # Aggregated tables shared by the specs (referenced by name, shipped once)
+    datasets: Dict[str, List[Dict[str, Any]]] = {}
+    with span("specs"):
+        specs: List[Dict[str, Any]] = [chart_spec(df2, rec, datasets) for rec in picks]
+    visuals = [VISUALS[rec.kind].format(x=rec.x, y=rec.y) for rec in picks]
 
     if not visuals:
-        visuals = ["Histogram of a numeric column (not implemented in stub)", "Bar chart of counts by category"]
+        visuals = ["Histogram of a numeric column", "Bar chart of counts by category"]
 
     rows, cols = df.shape
     summary = (
         f"Detected {cols} columns and {rows} rows. "
         f"Temporal: {time_cols or 'none'}, Numeric: {num_cols or 'none'}, Categorical: {cat_cols or 'none'}. "
-        "Generated chart specs based on the detected column types."
+        "Generated chart specs for the highest-scoring column pairs"
+        + (": " + "; ".join(f"{rec.kind} {rec.x}" + (f" / {rec.y}" if rec.y else "") + f" ({rec.reason})"
+                            for rec in picks) + "." if picks else ".")
     )
 
-    return {"summary": summary, "suggested_visuals": visuals, "chart_specs": specs}
+    return AgentResponse(summary=summary, suggested_visuals=visuals, chart_specs=specs, datasets=datasets)
+
+def warmup():
+    build_response(WARMUP_CSV)
+
+install(app, warmup)
+
+async def answer(req: AgentRequest) -> AgentResponse:
+    sample = req.sample_frame if req.sample_frame is not None else req.sample_rows
+    return await run_cpu("compute", build_response, sample)
+
+# POST /agent/jobs + GET /agent/jobs/{id}: the same work, queued (see backend/jobs.py)
+jobs.install(app, answer, agent_request)
+
+@app.post("/agent", response_model=AgentResponse)
+async def agent(request: Request, req: AgentRequest = Depends(agent_request)):
+    return agent_response(request, await answer(req))
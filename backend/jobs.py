@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from backend import lifecycle
+from backend.models import AgentRequest, AgentResponse
+
+# Asynchronous job API shared by the agent backends.
+#
+#   POST /agent/jobs        same body as /agent; 202 with {"id", "status", ...} right away
+#   GET  /agent/jobs/{id}   the job document; ?wait=N long-polls up to N seconds for it to finish
+#
+# install(app, answer, dependency) runs `answer` (the coroutine behind /agent) in JOB_WORKERS
+# worker tasks fed by a queue of JOB_QUEUE_SIZE. A full queue answers 429 with Retry-After, so
+# clients back off instead of piling up work the process cannot finish. The job id is a hash of
+# the request body: resubmitting the same payload (a Streamlit rerun, a second tab) returns the
+# job already queued, running or done instead of starting it again. Only failed and expired
+# jobs are re-run.
+#
+# Job documents live in a result store with a TTL: in-process by default, or a SQLite file
+# (FREESTYLE_JOBS_DB) shared by every worker of backend/serve.py, so a poll that lands on
+# another process still finds the job. Long-polls wake on a local event, or re-read SQLite
+# when the job runs in another process. SQLite calls run in the threadpool, off the event loop.
+# A job left unfinished by a process that died (shared store) is re-run when resubmitted:
+# running far past the job timeout, or queued by a process that no longer exists.
+#
+# Submitting is a compare-and-set on the store: the new job replaces exactly the document that
+# was read (or its absence), so two identical POSTs, in one process or in two, start one job.
+# Within a process a per-id lock keeps the second POST from even trying.
+
+JOB_WORKERS = int(os.getenv("FREESTYLE_JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("FREESTYLE_JOB_QUEUE", "64"))
+JOB_TTL = float(os.getenv("FREESTYLE_JOB_TTL", "3600"))
+JOB_TIMEOUT = float(os.getenv("FREESTYLE_JOB_TIMEOUT", "600"))
+JOB_DB = os.getenv("FREESTYLE_JOBS_DB") or None
+MAX_WAIT = 60.0
+REMOTE_POLL = 0.25  # seconds between SQLite reads while long-polling a job owned by another process
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+
+class MemoryStore:
+    blocking = False
+
+    def __init__(self, ttl_seconds: float = JOB_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    def _expired(self, job, now):
+        return bool(self.ttl_seconds) and job["status"] in FINISHED and now - job["updated"] > self.ttl_seconds
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is not None and self._expired(job, time.time()):
+            del self._jobs[job_id]
+            return None
+        return job
+
+    def put(self, job: Dict[str, Any]):
+        now = time.time()
+        self._jobs[job["id"]] = job
+        for job_id in [k for k, v in self._jobs.items() if self._expired(v, now)]:
+            del self._jobs[job_id]
+
+    def put_if(self, job: Dict[str, Any], expected: Optional[Dict[str, Any]]) -> bool:
+        # Store `job` only if get() still returns `expected` (None: no live job)
+        if self.get(job["id"]) != expected:
+            return False
+        self.put(job)
+        return True
+
+
+class SqliteStore:
+    blocking = True  # file I/O and lock waits: called through the threadpool
+
+    def __init__(self, path: str, ttl_seconds: float = JOB_TTL):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, doc TEXT NOT NULL, "
+                         "finished INTEGER NOT NULL, updated REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT doc, finished, updated FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (self.ttl_seconds and row[1] and time.time() - row[2] > self.ttl_seconds):
+            return None
+        return json.loads(row[0])
+
+    def put(self, job: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO jobs (id, doc, finished, updated) VALUES (?, ?, ?, ?)",
+                         (job["id"], json.dumps(job), int(job["status"] in FINISHED), job["updated"]))
+            if self.ttl_seconds:
+                conn.execute("DELETE FROM jobs WHERE finished = 1 AND updated < ?", (time.time() - self.ttl_seconds,))
+
+    def put_if(self, job: Dict[str, Any], expected: Optional[Dict[str, Any]]) -> bool:
+        # One statement, so atomic across processes: insert, or replace the row only while it
+        # is still the `expected` document (None: no row, or an expired one)
+        expired_before = time.time() - self.ttl_seconds if self.ttl_seconds else float("-inf")
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (id, doc, finished, updated) VALUES (?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                "doc = excluded.doc, finished = excluded.finished, updated = excluded.updated "
+                "WHERE jobs.doc = ? OR (jobs.finished = 1 AND jobs.updated < ?)",
+                (job["id"], json.dumps(job), int(job["status"] in FINISHED), job["updated"],
+                 json.dumps(expected) if expected is not None else None, expired_before))
+            return cur.rowcount == 1
+
+
+class JobRunner:
+    def __init__(self, answer: Callable[[AgentRequest], Awaitable[AgentResponse]], store,
+                 workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE, timeout: float = JOB_TIMEOUT):
+        self.answer = answer
+        self.store = store
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.queue: Optional[asyncio.Queue] = None
+        self._events: Dict[str, asyncio.Event] = {}  # jobs owned by this process
+        self._locks: Dict[str, list] = {}  # job id -> [asyncio.Lock, users] while submitting
+        self._tasks = []
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self.store.blocking:
+            return await run_in_threadpool(self.store.get, job_id)
+        return self.store.get(job_id)
+
+    async def put(self, job: Dict[str, Any]):
+        if self.store.blocking:
+            await run_in_threadpool(self.store.put, dict(job))
+        else:
+            self.store.put(job)
+
+    async def put_if(self, job: Dict[str, Any], expected: Optional[Dict[str, Any]]) -> bool:
+        if self.store.blocking:
+            return await run_in_threadpool(self.store.put_if, dict(job), expected)
+        return self.store.put_if(job, expected)
+
+    @asynccontextmanager
+    async def _id_lock(self, job_id: str):
+        entry = self._locks.setdefault(job_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[job_id]
+
+    def is_stale(self, job: Dict[str, Any]) -> bool:
+        # Unfinished, but its process can no longer finish it (only possible with a shared store)
+        if job["status"] == RUNNING:
+            return time.time() - (job["started"] or job["updated"]) > self.timeout + 60
+        if job["status"] == QUEUED and job["pid"] != os.getpid():
+            try:
+                os.kill(job["pid"], 0)
+            except ProcessLookupError:
+                return True
+            except OSError:
+                pass
+        return False
+
+    async def _save(self, job: Dict[str, Any], **changes):
+        job.update(changes, updated=time.time())
+        await self.put(job)
+        if job["status"] in FINISHED:
+            event = self._events.pop(job["id"], None)
+            if event is not None:
+                event.set()
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Cancel until every worker is gone: asyncio.wait_for drops a cancel that lands as the answer completes
+        tasks = self._tasks
+        while tasks:
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks, timeout=0.1)
+            tasks = [task for task in tasks if not task.done()]
+        while self.queue is not None and not self.queue.empty():
+            job, _ = self.queue.get_nowait()
+            await self._save(job, status=FAILED, error="server shut down before the job ran")
+
+    async def submit(self, job_id: str, req: AgentRequest) -> Optional[Dict[str, Any]]:
+        # The job for this id: the live one, or a new one queued here. None when the queue is full.
+        async with self._id_lock(job_id):
+            while True:
+                current = await self.get(job_id)
+                if current is not None and current["status"] != FAILED and not self.is_stale(current):
+                    return current
+                if self.queue.full():
+                    self.rejected += 1
+                    return None
+                now = time.time()
+                job = {"id": job_id, "status": QUEUED, "created": now, "updated": now, "started": None,
+                       "finished": None, "pid": os.getpid(), "result": None, "error": None}
+                if await self.put_if(job, current):
+                    break
+                # Another process submitted it after our read: look again
+            try:
+                self.queue.put_nowait((job, req))
+            except asyncio.QueueFull:
+                # Filled up while the store was written: fail it so the client's retry resubmits
+                self.rejected += 1
+                await self._save(job, status=FAILED, finished=time.time(), error="Job queue is full")
+                return None
+            self.submitted += 1
+            self._events[job_id] = asyncio.Event()
+            return job
+
+    async def _worker(self):
+        while True:
+            job, req = await self.queue.get()
+            await self._save(job, status=RUNNING, started=time.time())
+            try:
+                resp = await asyncio.wait_for(self.answer(req), self.timeout)
+                await self._save(job, status=DONE, finished=time.time(), result=resp.model_dump(mode="json"))
+                self.completed += 1
+            except asyncio.TimeoutError:
+                await self._save(job, status=FAILED, finished=time.time(), error=f"Timed out after {self.timeout:g}s")
+                self.failed += 1
+            except asyncio.CancelledError:
+                await asyncio.shield(self._save(job, status=FAILED, finished=time.time(),
+                                                error="server shut down while the job ran"))
+                raise
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else e
+                await self._save(job, status=FAILED, finished=time.time(), error=f"{type(e).__name__}: {detail}")
+                self.failed += 1
+            finally:
+                self.queue.task_done()
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINISHED or timeout <= 0:
+            return job
+        event = self._events.get(job_id)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await self.get(job_id)
+        deadline = time.monotonic() + timeout
+        while job is not None and job["status"] not in FINISHED and time.monotonic() < deadline:
+            await asyncio.sleep(min(REMOTE_POLL, max(deadline - time.monotonic(), 0)))
+            job = await self.get(job_id)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "queue_size": self.queue_size,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "store": JOB_DB or "memory",
+        }
+
+
+def install(app: FastAPI, answer: Callable[[AgentRequest], Awaitable[AgentResponse]],
+            dependency: Callable[[Request], Awaitable[AgentRequest]]) -> JobRunner:
+    runner = JobRunner(answer, SqliteStore(JOB_DB) if JOB_DB else MemoryStore())
+    inner = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app_):
+        await runner.start()
+        try:
+            async with inner(app_) as maybe_state:
+                yield maybe_state
+        finally:
+            await runner.stop()
+
+    app.router.lifespan_context = lifespan
+
+    @app.post("/agent/jobs", status_code=202)
+    async def submit_job(request: Request, req: AgentRequest = Depends(dependency)):
+        if lifecycle.state.draining:
+            raise HTTPException(status_code=503, detail="Server is draining", headers={"Retry-After": "1"})
+        body = await request.body()
+        job_id = hashlib.sha256(request.headers.get("content-type", "").encode() + b"\0" + body).hexdigest()[:32]
+        job = await runner.submit(job_id, req)
+        if job is None:
+            raise HTTPException(status_code=429, detail="Job queue is full", headers={"Retry-After": "1"})
+        return JSONResponse(job, status_code=202, headers={"Location": f"/agent/jobs/{job_id}"})
+
+    @app.get("/agent/jobs/{job_id}")
+    async def get_job(job_id: str, wait: float = 0.0):
+        job = await runner.wait(job_id, min(max(wait, 0.0), MAX_WAIT))
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+        return job
+
+    return runner
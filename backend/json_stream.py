@@ -0,0 +1,127 @@
+import json
+from typing import Any, List, Tuple
+
+# Incremental parser for the agent's JSON contract as it streams from the LLM:
+#   {"summary": "...", "suggested_visuals": ["...", ...], "chart_specs": [{...}, ...]}
+# feed() consumes text chunks and returns events as soon as they are complete:
+#   ("summary", <new decoded text>)        while the summary string grows
+#   ("suggested_visual", <str>)            per finished array element
+#   ("chart_spec", <dict>)                 per finished array element
+# Anything before the first "{" (e.g. a markdown fence) is skipped. The full text is kept so
+# the caller can still run extract_json() on it at the end for the authoritative result.
+
+ARRAY_EVENTS = {"suggested_visuals": "suggested_visual", "chart_specs": "chart_spec"}
+STRING_EVENTS = {"summary": "summary"}
+
+
+_decoder = json.JSONDecoder(strict=False)
+
+
+def _decode_partial(raw: str) -> str:
+    # Decode a JSON string body that may end mid-escape (e.g. "\\" or "\\u00"): back off
+    # at most the length of one escape sequence until it decodes.
+    for cut in range(len(raw), max(-1, len(raw) - 7), -1):
+        try:
+            return _decoder.decode('"' + raw[:cut] + '"')
+        except ValueError:
+            continue
+    return ""
+
+
+class IncrementalJSONParser:
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.expect_key = False
+        self.key = None
+        self.elem_start = None
+        self.emitted_chars = 0  # decoded length of the streamed string value so far
+
+    def _streaming_value(self) -> bool:
+        return len(self.stack) == 1 and not self.expect_key and self.key in STRING_EVENTS
+
+    def _in_tracked_array(self) -> bool:
+        return len(self.stack) == 2 and self.stack[-1] == "[" and self.key in ARRAY_EVENTS
+
+    def _emit_element(self, end: int, events: List[Tuple[str, Any]]):
+        raw = self.text[self.elem_start:end].strip()
+        self.elem_start = None
+        try:
+            events.append((ARRAY_EVENTS[self.key], json.loads(raw)))
+        except ValueError:
+            pass  # malformed element: the final extract_json pass decides
+
+    def _emit_string_delta(self, raw: str, events: List[Tuple[str, Any]]):
+        decoded = _decode_partial(raw)
+        if len(decoded) > self.emitted_chars:
+            events.append((STRING_EVENTS[self.key], decoded[self.emitted_chars:]))
+            self.emitted_chars = len(decoded)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        if not chunk or self.done:
+            self.text += chunk or ""
+            return events
+        self.text += chunk
+        text = self.text
+        i = self.pos
+        while i < len(text) and not self.done:
+            c = text[i]
+            if not self.started:
+                if c == "{":
+                    self.started, self.stack, self.expect_key = True, ["{"], True
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    raw = text[self.string_start:i]
+                    if len(self.stack) == 1 and self.expect_key:
+                        self.key = _decode_partial(raw)
+                    elif self._streaming_value():
+                        self._emit_string_delta(raw, events)
+                    elif self._in_tracked_array() and self.elem_start == self.string_start - 1:
+                        self._emit_element(i + 1, events)
+            elif c == '"':
+                self.in_string = True
+                self.string_start = i + 1
+                if self._streaming_value():
+                    self.emitted_chars = 0
+                if self._in_tracked_array() and self.elem_start is None:
+                    self.elem_start = i
+            elif c in "{[":
+                if self._in_tracked_array() and self.elem_start is None:
+                    self.elem_start = i
+                self.stack.append(c)
+            elif c in "}]":
+                if self.stack:
+                    self.stack.pop()
+                if self._in_tracked_array() and self.elem_start is not None and text[self.elem_start] in "{[":
+                    self._emit_element(i + 1, events)
+                elif len(self.stack) == 1 and c == "]" and self.elem_start is not None:
+                    self._emit_element(i, events)  # trailing scalar element
+                if not self.stack:
+                    self.done = True
+            elif c == ",":
+                if self._in_tracked_array() and self.elem_start is not None and text[self.elem_start] not in '{["':
+                    self._emit_element(i, events)
+                elif len(self.stack) == 1:
+                    self.expect_key = True
+            elif c == ":":
+                if len(self.stack) == 1:
+                    self.expect_key = False
+            elif not c.isspace() and self._in_tracked_array() and self.elem_start is None:
+                self.elem_start = i  # number / true / false / null element
+            i += 1
+        self.pos = i
+        if self.in_string and self._streaming_value():
+            self._emit_string_delta(text[self.string_start:i], events)
+        return events
@@ -0,0 +1,205 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Callable, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+
+from backend.tracing import call_traced, merge_spans, span
+
+# Process lifecycle shared by the agent backends.
+#
+# install(app, warmup, preload) starts a warm-up task from the app's lifespan:
+#   1. import `preload`, the modules the web process needs for its first request;
+#   2. start the CPU pool and run `warmup` in it;
+#   3. mark the process ready;
+#   4. import BACKGROUND_PRELOAD in a thread. Those modules are only needed for binary wire
+#      formats, so they do not hold up readiness.
+# Backends import pandas and friends inside the functions that use them, so module import (and
+# with it the time until the port is bound) stays small.
+# /readyz returns 503 until that finishes, and again once a drain starts (see backend/serve.py),
+# so a load balancer stops routing here before in-flight requests are cut off. /livez only says
+# the event loop is responsive.
+#
+# CPU-bound pandas work (type inference, aggregation) goes through run_cpu(). That uses a
+# per-process pool of FREESTYLE_CPU_WORKERS spawned processes, so one slow frame never blocks
+# the event loop. With 0 workers the work runs in the threadpool instead. Spans opened inside
+# the pool process come back with the result and join the request's trace. If a pool process
+# dies (OOM, segfault) the pool is rebuilt and the call retried once. A second failure answers
+# 503. Under the supervisor (backend/serve.py sets FREESTYLE_SUPERVISED) it also fails readiness
+# and drains the worker so a fresh one replaces it; a plain uvicorn process keeps running and
+# rebuilds the pool on the next call.
+
+BACKGROUND_PRELOAD = ("pandas", "pyarrow")
+# Standalone (uvicorn, --reload) a small pool; backend/serve.py sets cores / workers
+CPU_WORKERS = int(os.getenv("FREESTYLE_CPU_WORKERS", os.getenv("FREESTYLE_BATCH_WORKERS",
+                                                               str(min(2, os.cpu_count() or 1)))))
+SUPERVISED = os.getenv("FREESTYLE_SUPERVISED") == "1"
+PROBE_PATHS = ("/livez", "/readyz")
+
+# A few rows that exercise the time/categorical/numeric paths during warm-up
+WARMUP_CSV = "Date,Location,DataValue\n2020-01-01,A,1.5\n2020-02-01,B,2.5\n2020-03-01,A,3.0\n"
+
+
+class Lifecycle:
+    def __init__(self):
+        self.started = time.time()
+        self.ready = False
+        self.draining = False
+        self.inflight = 0
+        self.apps = 0  # running lifespans in this process (tests may host several apps)
+        self.warmup_s: Optional[float] = None
+        self.warmup_error: Optional[str] = None  # a failed warm-up keeps the process unready
+        self.cpu_error: Optional[str] = None     # the CPU pool broke again after a rebuild
+
+
+state = Lifecycle()
+
+
+def begin_drain():
+    # Called from the worker's signal handler: readiness fails, in-flight requests finish
+    state.draining = True
+
+
+def import_modules(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+_cpu_pool = None
+
+
+def cpu_pool() -> Optional[ProcessPoolExecutor]:
+    # spawn, not fork: the parent has event loop and threadpool threads by the time this runs
+    global _cpu_pool
+    if _cpu_pool is None and CPU_WORKERS > 0:
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _cpu_pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    # Concurrent callers see the same broken pool; only the first one replaces it
+    global _cpu_pool
+    if _cpu_pool is pool:
+        _cpu_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_cpu(name: str, fn, *args):
+    # fn and args must be picklable (module-level function)
+    with span(name):
+        if cpu_pool() is None:
+            return await run_in_threadpool(fn, *args)
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = cpu_pool()
+            try:
+                result, spans = await loop.run_in_executor(pool, call_traced, fn, *args)
+            except BrokenProcessPool as e:
+                _discard_pool(pool)
+                if attempt == 0:
+                    continue
+                state.cpu_error = f"{type(e).__name__}: {e}"
+                if SUPERVISED:
+                    state.ready = False
+                    if not state.draining:
+                        os.kill(os.getpid(), signal.SIGTERM)  # the supervisor starts a replacement
+                raise HTTPException(status_code=503, detail=f"CPU pool failed: {state.cpu_error}",
+                                    headers={"Retry-After": "1"}) from e
+            merge_spans(spans)
+            return result
+
+
+class LifecycleMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in PROBE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        async def draining_send(message):
+            # Ask keep-alive clients to reconnect (to another worker) once a drain has begun
+            if message["type"] == "http.response.start" and state.draining:
+                MutableHeaders(scope=message)["Connection"] = "close"
+            await send(message)
+
+        state.inflight += 1
+        try:
+            await self.app(scope, receive, draining_send)
+        finally:
+            state.inflight -= 1
+
+
+async def _warm(warmup: Optional[Callable[[], None]], modules):
+    t0 = time.perf_counter()
+    try:
+        await run_in_threadpool(import_modules, modules)
+        pool = cpu_pool()
+        if warmup is not None:
+            if pool is None:
+                await run_in_threadpool(warmup)
+            else:
+                # One task per pool process (idle processes pick them up) so none starts cold
+                loop = asyncio.get_running_loop()
+                await asyncio.gather(*(loop.run_in_executor(pool, warmup) for _ in range(CPU_WORKERS)))
+    except Exception as e:
+        state.warmup_error = f"{type(e).__name__}: {e}"
+        return
+    state.warmup_s = round(time.perf_counter() - t0, 3)
+    state.ready = True
+    threading.Thread(target=import_modules, args=(BACKGROUND_PRELOAD,), name="preload", daemon=True).start()
+
+
+def install(app: FastAPI, warmup: Optional[Callable[[], None]] = None, preload: Tuple[str, ...] = ()):
+    app.add_middleware(LifecycleMiddleware)
+    inner = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app_):
+        global _cpu_pool
+        state.apps += 1
+        # Warm up in the background: the port binds (and /livez answers) right after import,
+        # /readyz flips once the pool is warm
+        warming = asyncio.create_task(_warm(warmup, preload))
+        try:
+            async with inner(app_) as maybe_state:
+                yield maybe_state
+        finally:
+            warming.cancel()
+            state.apps -= 1
+            if state.apps == 0:
+                state.ready = False
+                if _cpu_pool is not None:
+                    _cpu_pool.shutdown(wait=True, cancel_futures=True)
+                    _cpu_pool = None
+
+    app.router.lifespan_context = lifespan
+
+    @app.get("/livez", include_in_schema=False)
+    def livez():
+        return {"ok": True, "pid": os.getpid(), "uptime_s": round(time.time() - state.started, 1)}
+
+    @app.get("/readyz", include_in_schema=False)
+    def readyz():
+        body = {"ready": state.ready and not state.draining, "draining": state.draining,
+                "inflight": state.inflight, "warmup_s": state.warmup_s, "pid": os.getpid()}
+        if state.warmup_error:
+            body["warmup_error"] = state.warmup_error
+        if state.cpu_error:
+            body["cpu_error"] = state.cpu_error
+        return JSONResponse(body, status_code=200 if body["ready"] else 503)
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# Shared async LLM client for the local runner.
+#
+# One AsyncOpenAI instance (and one pooled httpx connection pool) per process, a semaphore for
+# in-flight requests, an optional token bucket for request rate, jittered exponential backoff
+# on 429/5xx/connection errors, and a circuit breaker that fails fast while the upstream is
+# degraded so the runner can serve fallback_response instead of queueing behind timeouts.
+# Point OPENAI_BASE_URL at backend/fake_openai.py to exercise all of this locally (the tests
+# mount it in-process through `transport`).
+# openai and httpx are imported on first use: a runner at FREESTYLE_LEVEL=0 never loads them.
+
+
+class LLMUnavailable(RuntimeError):
+    # Upstream is degraded (breaker open or retries exhausted); callers should fall back
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    # closed -> open after `threshold` consecutive failures; after `reset_after` seconds one
+    # trial request is let through (half-open) and its outcome closes or re-opens the circuit.
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def abandon_trial(self):
+        # The trial ended without an outcome (cancelled): the next call may try again
+        self.trial_in_flight = False
+
+
+def is_retryable(exc: Exception) -> bool:
+    from openai import APIConnectionError, APIStatusError, APITimeoutError
+    if isinstance(exc, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+class LLMClient:
+    def __init__(self, api_key: str, model: str, base_url: Optional[str] = None,
+                 max_concurrency: int = 8, rate: float = 0.0, burst: int = 1,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 timeout: float = 60.0, breaker: Optional[CircuitBreaker] = None,
+                 max_connections: int = 32, transport=None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.transport = transport  # httpx transport override, e.g. ASGITransport(fake_openai.app) in tests
+        self.breaker = breaker or CircuitBreaker()
+        self._rate, self._burst = rate, burst
+        self._client = None  # openai.AsyncOpenAI
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket: Optional[TokenBucket] = None
+        self.counters = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    @property
+    def client(self):
+        # Created lazily so it binds to the server's event loop, then reused for every request
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self._client = AsyncOpenAI(
+                api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout,
+                http_client=httpx.AsyncClient(limits=limits, timeout=self.timeout, transport=self.transport),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._bucket = TokenBucket(self._rate, self._burst) if self._rate > 0 else None
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: U(0, min(max, base * 2^attempt))
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _with_retries(self, call):
+        client = self.client
+        if not self.breaker.allow():
+            self.counters["rejected"] += 1
+            raise LLMUnavailable("circuit open")
+        trial = self.breaker.trial_in_flight  # this call is the half-open trial
+        attempt = 0
+        try:
+            while True:
+                try:
+                    if self._bucket is not None:
+                        await self._bucket.acquire()
+                    async with self._semaphore:
+                        self.counters["requests"] += 1
+                        result = await call(client)
+                    self.breaker.record_success()
+                    return result
+                except Exception as e:
+                    if not is_retryable(e):
+                        # Upstream answered (e.g. 400): a caller error, not a health signal
+                        self.breaker.record_success()
+                        raise
+                    if attempt >= self.max_retries:
+                        self.counters["failures"] += 1
+                        self.breaker.record_failure()
+                        raise LLMUnavailable(f"{type(e).__name__}: {e}") from e
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+        finally:
+            # Cancelled (client gone, batch or hedge cancelled) is a BaseException: no outcome
+            # was recorded, so release the trial instead of leaving the circuit stuck open
+            if trial and self.breaker.trial_in_flight:
+                self.breaker.abandon_trial()
+
+    async def complete(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        async def call(client):
+            completion = await client.chat.completions.create(model=self.model, messages=messages, **kwargs)
+            return completion.choices[0].message.content or ""
+        return await self._with_retries(call)
+
+    async def stream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        # Retries cover opening the stream only. Once tokens flow a dropped stream can't be
+        # retried, but it still counts against the breaker and surfaces as LLMUnavailable.
+        async def call(client):
+            return await client.chat.completions.create(model=self.model, messages=messages, stream=True, **kwargs)
+        stream = await self._with_retries(call)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            self.counters["failures"] += 1
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"stream interrupted: {type(e).__name__}: {e}") from e
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "max_concurrency": self.max_concurrency,
+            "rate_limit_per_s": self._rate or None,
+            "base_url": self.base_url,
+        }
+
+
+def client_from_env(api_key: str, model: str) -> LLMClient:
+    return LLMClient(
+        api_key=api_key,
+        model=model,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        max_concurrency=int(os.getenv("FREESTYLE_LLM_CONCURRENCY", "8")),
+        rate=float(os.getenv("FREESTYLE_LLM_RATE", "0")),
+        burst=int(os.getenv("FREESTYLE_LLM_BURST", "4")),
+        max_retries=int(os.getenv("FREESTYLE_LLM_RETRIES", "3")),
+        backoff_base=float(os.getenv("FREESTYLE_LLM_BACKOFF", "0.5")),
+        backoff_max=float(os.getenv("FREESTYLE_LLM_BACKOFF_MAX", "8")),
+        timeout=float(os.getenv("FREESTYLE_LLM_TIMEOUT", "60")),
+        breaker=CircuitBreaker(
+            threshold=int(os.getenv("FREESTYLE_BREAKER_THRESHOLD", "5")),
+            reset_after=float(os.getenv("FREESTYLE_BREAKER_RESET", "30")),
+        ),
+    )
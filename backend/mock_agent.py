@@ -1,19 +1,16 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import Depends, FastAPI, Request
 from typing import List, Dict, Any
 import csv
 import io
 
-app = FastAPI()
-
-class AgentRequest(BaseModel):
-    schema_description: str
-    sample_rows: str
+from backend import jobs
+from backend.lifecycle import WARMUP_CSV, install, run_cpu
+from backend.models import AgentRequest, AgentResponse, agent_request, agent_response
+from backend.tracing import instrument, span
 
-class AgentResponse(BaseModel):
-    summary: str
-    suggested_visuals: List[str]
-    chart_specs: List[Dict[str, Any]]
+# pandas-backed helpers are imported inside the functions that run in the CPU pool
+app = FastAPI()
+instrument(app, "mock_agent")
 
 def parse_sample_rows(csv_text: str):
     try:
@@ -23,106 +20,72 @@ def parse_sample_rows(csv_text: str):
     except csv.Exception:
         return []
 
-def coerce_numeric(value: str):
-    try:
-        if value is None:
-            return None
-        v = float(value)
-        return v
-    except (ValueError, TypeError):
-        return value
-
 def detect_columns(rows: List[dict]):
     if not rows:
         return [], [], []
-    columns = list(rows[0].keys())
-    # detect numeric by trying to parse first non-empty value in each column
-    numeric_cols = []
-    categorical_cols = []
-    time_cols = []
-    for col in columns:
-        val = None
-        for r in rows:
-            if r.get(col) not in (None, ""):
-                val = r[col]
-                break
-        if val is None:
-            categorical_cols.append(col)
-            continue
-        lower = col.lower()
-        if "date" in lower or "time" in lower:
-            time_cols.append(col)
-            continue
-        try:
-            float(val)
-            numeric_cols.append(col)
-        except (ValueError, TypeError):
-            categorical_cols.append(col)
+    _, numeric_cols, categorical_cols, time_cols = typed_frame(rows)
     return numeric_cols, categorical_cols, time_cols
 
-def make_bar_spec(rows: List[dict], cat_col: str, num_col: str):
-    # inline data
-    # coerce numeric
-    values = []
-    for r in rows:
-        new_r = dict(r)
-        new_r[num_col] = coerce_numeric(r.get(num_col))
-        values.append(new_r)
-    spec = {
-        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
-        "data": {"values": values},
-        "mark": "bar",
-        "encoding": {
-            "x": {"field": cat_col, "type": "nominal", "title": cat_col},
-            "y": {"field": num_col, "type": "quantitative", "title": num_col},
-            "tooltip": [
-                {"field": cat_col, "type": "nominal"},
-                {"field": num_col, "type": "quantitative"}
-            ]
-        },
-        "height": 300
-    }
-    return spec
-
-def make_line_spec(rows: List[dict], time_col: str, num_col: str):
-    values = []
-    for r in rows:
-        new_r = dict(r)
-        new_r[num_col] = coerce_numeric(r.get(num_col))
-        values.append(new_r)
-    spec = {
-        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
-        "data": {"values": values},
-        "mark": "line",
-        "encoding": {
-            "x": {"field": time_col, "type": "temporal", "title": time_col},
-            "y": {"field": num_col, "type": "quantitative", "title": num_col},
-            "tooltip": [
-                {"field": time_col, "type": "temporal"},
-                {"field": num_col, "type": "quantitative"}
-            ]
-        },
-        "height": 300
-    }
-    return spec
+def typed_frame(rows: List[dict]):
+    # (typed_df, numeric, categorical, time) via the shared inference, for aggregation
+    import pandas as pd
+    from utils.type_inference import infer_column_types
+    df = pd.DataFrame(rows, dtype=object).replace("", None)
+    return infer_column_types(df)
 
-@app.post("/agent", response_model=AgentResponse)
-def agent(req: AgentRequest):
-    rows = parse_sample_rows(req.sample_rows)
-    numeric_cols, categorical_cols, time_cols = detect_columns(rows)
+def make_bar_spec(df, cat_col: str, num_col: str, datasets: Dict[str, Any]):
+    # aggregate server-side; the spec references the table by name
+    from backend.vega_specs import add_dataset, bar_spec
+    from utils.aggregation import aggregate_by_category
+    table = aggregate_by_category(df, cat_col, num_col, agg="mean", top_n=10)
+    return bar_spec(add_dataset(datasets, table), cat_col, num_col, title=f"Mean {num_col}")
+
+def make_line_spec(df, time_col: str, num_col: str, datasets: Dict[str, Any]):
+    from backend.vega_specs import add_dataset, line_spec
+    from utils.aggregation import aggregate_over_time
+    table = aggregate_over_time(df, time_col, num_col, agg="mean")
+    return line_spec(add_dataset(datasets, table), time_col, num_col, title=f"Mean {num_col}")
+
+def build_response(sample) -> AgentResponse:
+    # `sample` is a typed frame (binary requests) or CSV text (JSON). Runs in the CPU pool.
+    with span("parse"):
+        rows = parse_sample_rows(sample) if isinstance(sample, str) else None
+    with span("infer"):
+        if rows is None and not sample.empty:
+            from utils.type_inference import infer_column_types
+            df, numeric_cols, categorical_cols, time_cols = infer_column_types(sample)
+        elif rows:
+            df, numeric_cols, categorical_cols, time_cols = typed_frame(rows)
+        else:
+            df, numeric_cols, categorical_cols, time_cols = None, [], [], []
 
     visuals_text = []
     specs = []
+    datasets = {}
 
-    # Prefer time series if available
-    if time_cols and numeric_cols:
-        visuals_text.append("Line chart of numeric metric over time")
-        specs.append(make_line_spec(rows, time_cols[0], numeric_cols[0]))
+    with span("recommend"):
+        # The best-scoring time series and category comparison (utils.recommend). Filtered to
+        # line/bar before picking, so scatter or histogram candidates never crowd them out; the
+        # first columns stand in when no candidate of a kind scored
+        picks = []
+        if df is not None and numeric_cols:
+            from utils.recommend import score_candidates
+            candidates = score_candidates(df, numeric_cols, categorical_cols, time_cols)
+            for kind, cols in (("line", time_cols), ("bar", categorical_cols)):
+                best = next((rec for rec in candidates if rec.kind == kind), None)
+                if best is not None:
+                    picks.append((kind, best.x, best.y))
+                elif cols:
+                    picks.append((kind, cols[0], numeric_cols[0]))
 
-    # Add a bar chart if we can
-    if categorical_cols and numeric_cols:
-        visuals_text.append("Bar chart of category vs numeric metric")
-        specs.append(make_bar_spec(rows, categorical_cols[0], numeric_cols[0]))
+    with span("specs"):
+        for kind, x, y in picks:
+            if kind == "line":
+                visuals_text.append("Line chart of numeric metric over time")
+                specs.append(make_line_spec(df, x, y, datasets))
+            else:
+                visuals_text.append("Bar chart of category vs numeric metric")
+                specs.append(make_bar_spec(df, x, y, datasets))
 
     # Default suggestions if we couldn't detect much
     if not visuals_text:
@@ -134,4 +97,20 @@ def agent(req: AgentRequest):
         "Otherwise a category vs numeric bar chart is suggested."
     )
 
-    return AgentResponse(summary=summary, suggested_visuals=visuals_text, chart_specs=specs)
+    return AgentResponse(summary=summary, suggested_visuals=visuals_text, chart_specs=specs, datasets=datasets)
+
+def warmup():
+    build_response(WARMUP_CSV)
+
+install(app, warmup)
+
+async def answer(req: AgentRequest) -> AgentResponse:
+    sample = req.sample_frame if req.sample_frame is not None else req.sample_rows
+    return await run_cpu("compute", build_response, sample)
+
+# POST /agent/jobs + GET /agent/jobs/{id}: the same work, queued (see backend/jobs.py)
+jobs.install(app, answer, agent_request)
+
+@app.post("/agent", response_model=AgentResponse)
+async def agent(request: Request, req: AgentRequest = Depends(agent_request)):
+    return agent_response(request, await answer(req))
@@ -0,0 +1,78 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from pydantic import BaseModel, PrivateAttr, ValidationError
+
+from backend.tracing import span
+from utils.wire import (ARROW, JSON, ZSTD_MIN_BYTES, BodyTooLarge, accepts_zstd, compress, decode_request,
+                        decompress, encode_response, negotiate)
+
+# Request/response contract shared by every /agent backend, plus the content negotiation that
+# lets clients send and receive JSON, MessagePack or Arrow IPC (see utils/wire.py).
+# Request bodies over MAX_REQUEST_BYTES, before or after zstd decoding, are answered 413.
+
+MAX_REQUEST_BYTES = int(os.getenv("FREESTYLE_MAX_REQUEST_BYTES", str(64 << 20)))
+
+
+class AgentRequest(BaseModel):
+    schema_description: str
+    sample_rows: str = ""  # CSV; empty when a binary request carried typed columns instead
+    agent: Optional[str] = None  # named agent (local runner registry); default if omitted
+
+    _frame: Any = PrivateAttr(default=None)  # pandas.DataFrame; pandas loads only for binary requests
+
+    @property
+    def sample_frame(self):
+        # Typed sample rows from a binary request, or None (JSON: parse sample_rows)
+        return self._frame
+
+
+class AgentResponse(BaseModel):
+    summary: str
+    suggested_visuals: List[str]
+    chart_specs: List[Dict[str, Any]]
+    datasets: Dict[str, List[Dict[str, Any]]] = {}
+
+
+async def agent_request(request: Request) -> AgentRequest:
+    # FastAPI dependency: decode the body according to Content-Type / Content-Encoding
+    body = await request.body()
+    with span("decode"):
+        try:
+            if len(body) > MAX_REQUEST_BYTES:
+                raise BodyTooLarge(f"body exceeds {MAX_REQUEST_BYTES:,} bytes")
+            if "zstd" in request.headers.get("content-encoding", ""):
+                body = decompress(body, MAX_REQUEST_BYTES)
+            fields, frame = decode_request(body, request.headers.get("content-type"))
+            req = AgentRequest(**fields)
+        except BodyTooLarge as e:
+            raise HTTPException(status_code=413, detail=f"Request too large: {e}")
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not decode request: {type(e).__name__}: {e}")
+    req._frame = frame
+    return req
+
+
+async def agent_request_text(request: Request) -> AgentRequest:
+    # Same, but guarantees CSV sample_rows (prompt building and cache keys need text)
+    req = await agent_request(request)
+    if not req.sample_rows and req.sample_frame is not None:
+        req.sample_rows = req.sample_frame.to_csv(index=False)
+    return req
+
+
+def agent_response(request: Request, resp: AgentResponse) -> Response:
+    fmt = negotiate(request.headers.get("accept"))
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    with span("serialize"):
+        body = resp.model_dump_json().encode("utf-8") if fmt == JSON else encode_response(resp.model_dump(mode="json"), fmt)
+    # Arrow compresses its own buffers; JSON/MessagePack get Content-Encoding when large
+    if fmt != ARROW and len(body) >= ZSTD_MIN_BYTES and accepts_zstd(request.headers.get("accept-encoding")):
+        with span("compress"):
+            body = compress(body)
+        headers["Content-Encoding"] = "zstd"
+    return Response(body, media_type=fmt, headers=headers)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Content-addressed cache for /agent responses.
+# Tier 1: in-memory LRU (bounded by entry count). Tier 2 (optional): SQLite file.
+# Both tiers honour the same TTL; SQLite is additionally bounded by row count.
+
+
+def cache_key(*parts: Any) -> str:
+    # Stable hash over JSON-serialisable parts (schema, sample rows, agent cfg, model, level)
+    blob = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600.0,
+                 db_path: Optional[str] = None, db_max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if db_path:
+            self._init_db()
+
+    # --- SQLite tier ---
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        parent = os.path.dirname(self.db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses(created)")
+
+    def _db_get(self, key: str) -> Optional[tuple]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _db_put(self, key: str, value: Dict[str, Any], created: float):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), created),
+            )
+            if self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE created < ?", (created - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.db_max_entries,),
+            )
+
+    def _db_delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    # --- Public API ---
+    def _expired(self, created: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created > self.ttl_seconds
+
+    def _mem_put(self, key: str, value: Dict[str, Any], created: float):
+        self._mem[key] = (value, created)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._mem[key]
+                self.evictions += 1
+        if self.db_path:
+            entry = self._db_get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    with self._lock:
+                        self._mem_put(key, value, created)
+                        self.hits += 1
+                        self.disk_hits += 1
+                    return value
+                self._db_delete(key)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        created = time.time()
+        with self._lock:
+            self._mem_put(key, value, created)
+        if self.db_path:
+            self._db_put(key, value, created)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "disk": self.db_path or None,
+            }
+
+
+def cache_from_env() -> ResponseCache:
+    # FREESTYLE_CACHE_DB=path/to/cache.sqlite enables the on-disk tier;
+    # FREESTYLE_CACHE_SIZE=0 keeps nothing in memory (disk tier only).
+    return ResponseCache(
+        max_entries=int(os.getenv("FREESTYLE_CACHE_SIZE", "256")),
+        ttl_seconds=float(os.getenv("FREESTYLE_CACHE_TTL", "3600")),
+        db_path=os.getenv("FREESTYLE_CACHE_DB") or None,
+        db_max_entries=int(os.getenv("FREESTYLE_CACHE_DB_SIZE", "10000")),
+    )
@@ -0,0 +1,235 @@
+import hashlib
+import io
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Schema-similarity cache for LLM responses.
+#
+# The exact response cache keys on the sample rows, so two uploads with the same columns and a
+# different date range never share an answer. This cache keys on the *shape* of the data instead:
+# a fingerprint of normalized column names, roles and dtype families parsed from the schema
+# description. Fingerprints are compared with MinHash signatures, and an LSH band index finds
+# candidates without scanning every entry. On a hit above the threshold, the cached summary and
+# suggested visuals are reused, and the chart specs are rebound to the new sample: field names
+# are mapped onto the new columns and inline `data.values` are replaced with the new rows. A
+# hit is only served when every chart spec can be rebound (each field maps to a column with the
+# same role).
+
+NUM_PERM = 128
+BANDS = 32  # 4 rows per band: a pair at Jaccard 0.8 shares a band with probability > 0.99
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_PERM)]
+
+# describe_column lines: "Name (dtype) - Missing: ... - Quantiles ...|Range ...|Top ..."
+_LINE_RE = re.compile(r"^(?P<name>.+?) \((?P<dtype>[^()]*)\)(?: - |$)")
+
+
+def _norm(name: str) -> str:
+    return re.sub(r"[^0-9a-z]+", "", name.lower())
+
+
+def _dtype_family(dtype: str) -> str:
+    dtype = dtype.lower()
+    for family in ("datetime", "bool", "int", "float"):
+        if family in dtype:
+            return family
+    return "text"
+
+
+def parse_schema(schema_description: str) -> List[Tuple[str, str, str]]:
+    # -> [(column, role, dtype family)]; lines that don't look like column summaries are ignored
+    columns = []
+    for line in schema_description.splitlines():
+        m = _LINE_RE.match(line.strip())
+        if not m:
+            continue
+        family = _dtype_family(m["dtype"])
+        if "Range:" in line or family == "datetime":
+            role = "datetime"
+        elif "Quantiles" in line or family in ("int", "float"):
+            role = "numeric"
+        else:
+            role = "categorical"
+        columns.append((m["name"], role, family))
+    return columns
+
+
+def fingerprint(columns) -> List[str]:
+    tokens = set()
+    for name, role, family in columns:
+        n = _norm(name)
+        tokens.update((f"name:{n}", f"role:{n}:{role}", f"dtype:{n}:{family}"))
+    return sorted(tokens)
+
+
+def minhash(tokens) -> Tuple[int, ...]:
+    # Pure Python: a schema has tens of tokens, and the runner keeps numpy off its import path
+    x = [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little") for t in tokens]
+    if not x:
+        return (_PRIME,) * NUM_PERM
+    return tuple(min((a * v + b) % _PRIME for v in x) for a, b in _PERMS)
+
+
+def similarity(a, b) -> float:
+    # Share of equal MinHash components: an unbiased estimate of the Jaccard similarity
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def _bands(scope: str, signature) -> List[str]:
+    rows = NUM_PERM // BANDS
+    return [hashlib.sha1(f"{scope}:{b}:{signature[b * rows:(b + 1) * rows]}".encode()).hexdigest()
+            for b in range(BANDS)]
+
+
+def _spec_fields(node, out):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == "field" and isinstance(v, str):
+                out.add(v)
+            else:
+                _spec_fields(v, out)
+    elif isinstance(node, list):
+        for v in node:
+            _spec_fields(v, out)
+    return out
+
+
+def _rename_fields(node, mapping):
+    if isinstance(node, dict):
+        return {k: (mapping.get(v, v) if k == "field" and isinstance(v, str) else _rename_fields(v, mapping))
+                for k, v in node.items()}
+    if isinstance(node, list):
+        return [_rename_fields(v, mapping) for v in node]
+    return node
+
+
+def sample_records(sample_rows: str, frame=None) -> List[Dict[str, Any]]:
+    import pandas as pd
+    from backend.vega_specs import to_records
+    if frame is None:
+        frame = pd.read_csv(io.StringIO(sample_rows)) if sample_rows.strip() else pd.DataFrame()
+    return to_records(frame)
+
+
+def rebind(resp: Dict[str, Any], old_columns, new_columns, records) -> Optional[Dict[str, Any]]:
+    # Point the cached response's chart specs at the new data; None if some spec can't be rebound
+    old_roles = {_norm(name): role for name, role, _ in old_columns}
+    new_names = {_norm(name): (name, role) for name, role, _ in new_columns}
+    specs = []
+    for spec in resp.get("chart_specs", []):
+        data = spec.get("data") if isinstance(spec, dict) else None
+        if not isinstance(data, dict) or "values" not in data:
+            return None  # named/URL data was computed from the old frame
+        body = {k: v for k, v in spec.items() if k != "data"}
+        mapping = {}
+        for field in _spec_fields(body, set()):
+            target = new_names.get(_norm(field))
+            if target is None or old_roles.get(_norm(field), target[1]) != target[1]:
+                return None
+            mapping[field] = target[0]
+        specs.append({**_rename_fields(body, mapping), "data": {**data, "values": records}})
+    return {**resp, "chart_specs": specs}
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.9, max_entries: int = 512, ttl_seconds: float = 3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._buckets: Dict[str, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rebind_failures = 0
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for band in entry["bands"]:
+            ids = self._buckets.get(band)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._buckets[band]
+
+    def put(self, scope: str, schema_description: str, resp: Dict[str, Any]):
+        columns = parse_schema(schema_description)
+        if not columns:
+            return
+        signature = minhash(fingerprint(columns))
+        bands = _bands(scope, signature)
+        with self._lock:
+            entry_id, self._next_id = self._next_id, self._next_id + 1
+            self._entries[entry_id] = {"signature": signature, "bands": bands, "columns": columns,
+                                       "response": resp, "created": time.time()}
+            for band in bands:
+                self._buckets.setdefault(band, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def get(self, scope: str, schema_description: str, sample_rows: str, frame=None) -> Optional[Dict[str, Any]]:
+        columns = parse_schema(schema_description)
+        if not columns:
+            return None
+        signature = minhash(fingerprint(columns))
+        now = time.time()
+        with self._lock:
+            candidates = set().union(*(self._buckets.get(b, ()) for b in _bands(scope, signature)))
+            scored = []
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if self.ttl_seconds and now - entry["created"] > self.ttl_seconds:
+                    self._drop(entry_id)
+                    continue
+                score = similarity(entry["signature"], signature)
+                if score >= self.threshold:
+                    scored.append((score, entry_id))
+            scored.sort(reverse=True)
+            best = [self._entries[i] for _, i in scored]
+            for _, i in scored[:1]:
+                self._entries.move_to_end(i)
+        records = None
+        for entry in best:
+            if records is None:
+                records = sample_records(sample_rows, frame)
+            resp = rebind(entry["response"], entry["columns"], columns, records)
+            if resp is not None:
+                with self._lock:
+                    self.hits += 1
+                return resp
+            with self._lock:
+                self.rebind_failures += 1
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rebind_failures": self.rebind_failures,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def semantic_cache_from_env() -> Optional[SemanticCache]:
+    # FREESTYLE_SEMANTIC_CACHE=0 disables it; the threshold is the estimated Jaccard similarity
+    # of the two schema fingerprints (1.0 = same column names, roles and dtype families)
+    if os.getenv("FREESTYLE_SEMANTIC_CACHE", "1") == "0":
+        return None
+    return SemanticCache(
+        threshold=float(os.getenv("FREESTYLE_SEMANTIC_THRESHOLD", "0.9")),
+        max_entries=int(os.getenv("FREESTYLE_SEMANTIC_SIZE", "512")),
+        ttl_seconds=float(os.getenv("FREESTYLE_CACHE_TTL", "3600")),
+    )
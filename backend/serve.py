@@ -0,0 +1,108 @@
+"""Production entry point: run an agent backend under several worker processes.
+
+    python -m backend.serve freestyle_stub --workers 4 --port 8001
+    python -m backend.serve freestyle_local_runner --workers 8 --cpu-workers 1 --port 8002
+
+The supervisor binds the listening socket once and spawns --workers uvicorn processes that accept
+on it. The workers share nothing: each has its own caches, LLM client and CPU pool. A worker
+that dies is replaced. On SIGTERM/SIGINT every worker drains:
+  1. /readyz returns 503 and responses carry `Connection: close`;
+  2. after --drain-seconds the worker stops accepting;
+  3. it waits up to --graceful-timeout for in-flight requests, then exits.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import uvicorn
+
+from backend import lifecycle
+
+APPS = {
+    "mock_agent": "backend.mock_agent:app",
+    "freestyle_stub": "backend.freestyle_stub:app",
+    "freestyle_local_runner": "backend.freestyle_local_runner:app",
+}
+
+
+class DrainingServer(uvicorn.Server):
+    def __init__(self, config: uvicorn.Config, drain_seconds: float):
+        super().__init__(config)
+        self.drain_seconds = drain_seconds
+
+    def handle_exit(self, sig, frame):
+        # First signal: fail readiness and keep serving for drain_seconds. A second signal
+        # skips the rest of the drain (uvicorn treats a third as force-exit).
+        if self.drain_seconds <= 0 or lifecycle.state.draining:
+            return super().handle_exit(sig, frame)
+        lifecycle.begin_drain()
+        timer = threading.Timer(self.drain_seconds, super().handle_exit, (sig, frame))
+        timer.daemon = True
+        timer.start()
+
+
+def run_worker(app: str, sock, log_level: str, drain_seconds: float, graceful_timeout: float):
+    config = uvicorn.Config(app, log_level=log_level, timeout_graceful_shutdown=graceful_timeout,
+                            proxy_headers=True, server_header=False)
+    DrainingServer(config, drain_seconds).run(sockets=[sock])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("app", choices=sorted(APPS), help="backend to serve")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--cpu-workers", type=int,
+                    help="CPU pool processes per worker (default: $FREESTYLE_CPU_WORKERS, else cores / workers; 0 = threads)")
+    ap.add_argument("--drain-seconds", type=float, default=float(os.getenv("FREESTYLE_DRAIN_SECONDS", "5")))
+    ap.add_argument("--graceful-timeout", type=float, default=30.0)
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args()
+
+    cpu_workers = args.cpu_workers
+    if cpu_workers is None:
+        cpu_workers = int(os.getenv("FREESTYLE_CPU_WORKERS", max(1, (os.cpu_count() or 1) // args.workers)))
+    # Read by backend.lifecycle in each spawned worker (env is inherited, module state is not)
+    os.environ["FREESTYLE_CPU_WORKERS"] = str(cpu_workers)
+    os.environ["FREESTYLE_SUPERVISED"] = "1"  # a worker may exit to be replaced
+
+    config = uvicorn.Config(APPS[args.app], host=args.host, port=args.port)
+    sock = config.bind_socket()
+    ctx = multiprocessing.get_context("spawn")
+    worker_args = (APPS[args.app], sock, args.log_level, args.drain_seconds, args.graceful_timeout)
+
+    def spawn():
+        proc = ctx.Process(target=run_worker, args=worker_args, daemon=False)
+        proc.start()
+        return proc
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    procs = [spawn() for _ in range(args.workers)]
+    print(f"serving {args.app} on {args.host}:{args.port}: {args.workers} workers x {cpu_workers} CPU processes "
+          f"(pids {', '.join(str(p.pid) for p in procs)})", flush=True)
+    while not stop.wait(1.0):
+        for i, proc in enumerate(procs):
+            if not proc.is_alive():
+                print(f"worker {proc.pid} exited with {proc.exitcode}; restarting", flush=True)
+                procs[i] = spawn()
+
+    for proc in procs:
+        if proc.is_alive():
+            os.kill(proc.pid, signal.SIGTERM)
+    deadline = time.monotonic() + args.drain_seconds + args.graceful_timeout + 5
+    for proc in procs:
+        proc.join(max(deadline - time.monotonic(), 0))
+        if proc.is_alive():
+            proc.kill()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
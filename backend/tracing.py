@@ -0,0 +1,236 @@
+import bisect
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import Response
+from starlette.datastructures import MutableHeaders
+
+# Request tracing shared by the three agent backends.
+#
+# instrument(app, service) installs an ASGI middleware that opens a Trace per request. Code
+# under it marks stages with `with span("infer"):`. Each request gets a Server-Timing header
+# (stages finished before the response started) and feeds Prometheus-style histograms served
+# at /metrics. Outside a request span() is a no-op, so helpers stay cheap when called directly.
+#
+# Opt-in sampling profiler: TRACE_PROFILE_RATE=0.01 samples 1% of requests. For each sampled
+# request a thread snapshots every thread's stack every TRACE_PROFILE_INTERVAL_MS milliseconds.
+# The stacks are written in folded format (flamegraph.pl / speedscope) to TRACE_PROFILE_DIR.
+
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+BYTES_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864]
+
+UNTRACED_PATHS = ("/metrics", "/livez", "/readyz")  # scrapes and probes would swamp the histograms
+UNMATCHED = "<unmatched>"  # route label of requests no route matched
+
+PROFILE_RATE = float(os.getenv("TRACE_PROFILE_RATE", "0"))
+PROFILE_DIR = os.getenv("TRACE_PROFILE_DIR", ".cache/profiles")
+PROFILE_INTERVAL = float(os.getenv("TRACE_PROFILE_INTERVAL_MS", "5")) / 1000
+
+
+class Histogram:
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._hists: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._meta: Dict[str, Tuple[str, List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def define(self, name: str, help_text: str, buckets: List[float]):
+        self._meta[name] = (help_text, buckets)
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram(self._meta[name][1])
+            hist.observe(value)
+
+    def render(self) -> str:
+        # Prometheus text exposition format 0.0.4
+        out = []
+        with self._lock:
+            by_name = defaultdict(list)
+            for (name, labels), hist in sorted(self._hists.items()):
+                by_name[name].append((labels, hist))
+            for name, series in by_name.items():
+                out.append(f"# HELP {name} {self._meta[name][0]}")
+                out.append(f"# TYPE {name} histogram")
+                for labels, hist in series:
+                    base = ",".join(f'{k}="{v}"' for k, v in labels)
+                    sep = "," if base else ""
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets + ["+Inf"], hist.counts):
+                        cumulative += n
+                        out.append(f'{name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+                    out.append(f"{name}_sum{{{base}}} {hist.sum}")
+                    out.append(f"{name}_count{{{base}}} {hist.count}")
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
+metrics.define("agent_request_duration_seconds", "End-to-end request latency (until the last body byte).", LATENCY_BUCKETS)
+metrics.define("agent_stage_duration_seconds", "Latency of traced stages within a request.", LATENCY_BUCKETS)
+metrics.define("agent_request_bytes", "Request body size.", BYTES_BUCKETS)
+metrics.define("agent_response_bytes", "Response body size.", BYTES_BUCKETS)
+
+
+class Trace:
+    def __init__(self, service: str):
+        self.service = service
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+
+    def server_timing(self) -> str:
+        # Spans with the same name (e.g. concurrent batch items) are summed
+        totals: Dict[str, float] = {}
+        for name, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("agent_trace", default=None)
+
+
+@contextmanager
+def span(name: str):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        trace.spans.append((name, seconds))
+        metrics.observe("agent_stage_duration_seconds", seconds, service=trace.service, stage=name)
+
+
+def call_traced(fn, *args):
+    # For code that runs where the request's trace is not visible (a pool process):
+    # -> (fn(*args), [(stage, seconds), ...]) for merge_spans() in the request
+    trace = Trace("pool")
+    token = _current.set(trace)
+    try:
+        return fn(*args), trace.spans
+    finally:
+        _current.reset(token)
+
+
+def merge_spans(spans: List[Tuple[str, float]]):
+    trace = _current.get()
+    if trace is None:
+        return
+    for name, seconds in spans:
+        trace.spans.append((name, seconds))
+        metrics.observe("agent_stage_duration_seconds", seconds, service=trace.service, stage=name)
+
+
+class StackSampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, path: str):
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+class TracingMiddleware:
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNTRACED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(self.service)
+        token = _current.set(trace)
+        state = {"status": 500, "req_bytes": 0, "resp_bytes": 0}
+
+        async def traced_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["req_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            elif message["type"] == "http.response.body":
+                state["resp_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        sampler = None
+        if PROFILE_RATE > 0 and random.random() < PROFILE_RATE:
+            sampler = StackSampler(PROFILE_INTERVAL)
+            sampler.start()
+        try:
+            await self.app(scope, traced_receive, traced_send)
+        finally:
+            _current.reset(token)
+            # The route template; one shared label for 404s so scanners can't add series per path
+            route = getattr(scope.get("route"), "path", UNMATCHED)
+            labels = {"service": self.service, "route": route}
+            metrics.observe("agent_request_duration_seconds", time.perf_counter() - trace.start,
+                            status=str(state["status"]), **labels)
+            metrics.observe("agent_request_bytes", state["req_bytes"], **labels)
+            metrics.observe("agent_response_bytes", state["resp_bytes"], **labels)
+            if sampler is not None:
+                stamp = time.strftime("%Y%m%d-%H%M%S")
+                slug = route.strip("/<>").replace("/", "_") or "root"
+                sampler.stop(os.path.join(PROFILE_DIR, f"{self.service}-{slug}-{stamp}-{id(trace):x}.folded"))
+
+
+def instrument(app: FastAPI, service: str):
+    app.add_middleware(TracingMiddleware, service=service)
+
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        return Response(metrics.render(), media_type="text/plain; version=0.0.4")
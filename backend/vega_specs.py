@@ -0,0 +1,102 @@
+import hashlib
+import json
+from typing import Any, Dict, List
+
+import pandas as pd
+
+# Vega-Lite spec builders shared by the backends. Specs reference their (pre-aggregated)
+# table by name, `"data": {"name": ...}`, and the tables travel once per response in a
+# top-level `datasets` map, so two charts over the same table don't duplicate it. The UI
+# copies `datasets` into each spec before rendering (Vega-Lite's own `datasets` property).
+
+VEGA_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+
+
+def to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # JSON-safe rows: ISO timestamps, None for missing values
+    out = df.copy(deep=False)  # copy-on-write: only the converted columns are materialized
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = out[col].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    out = out.astype(object).where(out.notna(), None)
+    return out.to_dict(orient="records")
+
+
+def add_dataset(datasets: Dict[str, List[Dict[str, Any]]], df: pd.DataFrame) -> str:
+    # Content-addressed name, so identical tables collapse to one entry
+    records = to_records(df)
+    digest = hashlib.sha1(json.dumps(records, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    name = f"data_{digest[:10]}"
+    datasets.setdefault(name, records)
+    return name
+
+
+def bar_spec(dataset: str, cat_col: str, num_col: str, title: str = None):
+    return {
+        "$schema": VEGA_SCHEMA,
+        "data": {"name": dataset},
+        "mark": "bar",
+        "encoding": {
+            "x": {"field": cat_col, "type": "nominal", "title": cat_col, "sort": "-y"},
+            "y": {"field": num_col, "type": "quantitative", "title": title or num_col},
+            "tooltip": [
+                {"field": cat_col, "type": "nominal"},
+                {"field": num_col, "type": "quantitative"}
+            ]
+        },
+        "height": 300
+    }
+
+
+def line_spec(dataset: str, time_col: str, num_col: str, title: str = None):
+    return {
+        "$schema": VEGA_SCHEMA,
+        "data": {"name": dataset},
+        "mark": "line",
+        "encoding": {
+            "x": {"field": time_col, "type": "temporal", "title": time_col},
+            "y": {"field": num_col, "type": "quantitative", "title": title or num_col},
+            "tooltip": [
+                {"field": time_col, "type": "temporal"},
+                {"field": num_col, "type": "quantitative"}
+            ]
+        },
+        "height": 300
+    }
+
+
+def scatter_spec(dataset: str, x_col: str, y_col: str, title: str = None):
+    return {
+        "$schema": VEGA_SCHEMA,
+        "data": {"name": dataset},
+        "mark": {"type": "point", "opacity": 0.5},
+        "encoding": {
+            "x": {"field": x_col, "type": "quantitative", "title": x_col, "scale": {"zero": False}},
+            "y": {"field": y_col, "type": "quantitative", "title": title or y_col, "scale": {"zero": False}},
+            "tooltip": [
+                {"field": x_col, "type": "quantitative"},
+                {"field": y_col, "type": "quantitative"}
+            ]
+        },
+        "height": 300
+    }
+
+
+def histogram_spec(dataset: str, num_col: str):
+    # Expects histogram_table output: bin_start, bin_end, count
+    return {
+        "$schema": VEGA_SCHEMA,
+        "data": {"name": dataset},
+        "mark": "bar",
+        "encoding": {
+            "x": {"field": "bin_start", "type": "quantitative", "bin": {"binned": True}, "title": num_col},
+            "x2": {"field": "bin_end"},
+            "y": {"field": "count", "type": "quantitative", "title": "Count"},
+            "tooltip": [
+                {"field": "bin_start", "type": "quantitative"},
+                {"field": "bin_end", "type": "quantitative"},
+                {"field": "count", "type": "quantitative"}
+            ]
+        },
+        "height": 300
+    }
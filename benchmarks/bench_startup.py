@@ -0,0 +1,157 @@
+"""Cold-start benchmark: import-time audit and time-to-first-response of each backend.
+
+Every measurement starts a fresh interpreter, so nothing is shared with this process or between
+runs.
+
+  audit       `python -X importtime` for each entry point. Reports the total import time, the
+              heaviest direct imports, and which heavy third-party modules got loaded at all.
+  cold start  starts `uvicorn backend.<app>:app` and polls until the port answers /livez
+              (bound) and /readyz (warm). It then sends one POST /agent; time-to-first-response
+              is measured from process start.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_startup --out startup.json
+    python -m benchmarks.bench_startup --repeat 5 --out new.json --compare startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+# What each entry point imports at load time (app.py: its module-level imports)
+ENTRY_POINTS = {
+    "app.py": "import streamlit, utils.agent_client, utils.wire",
+    "mock_agent": "import backend.mock_agent",
+    "freestyle_stub": "import backend.freestyle_stub",
+    "freestyle_local_runner": "import backend.freestyle_local_runner",
+}
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "altair", "openai", "yaml", "httpx", "fastapi", "streamlit")
+PAYLOAD = {"schema_description": "Date (datetime), Location (str), DataValue (float64)",
+           "sample_rows": "Date,Location,DataValue\n2020-01-01,A,1.5\n2020-02-01,B,2.5\n"}
+
+
+def bench_env():
+    # Deterministic paths (no LLM, no response cache), like bench_suite
+    return {**os.environ, "FREESTYLE_LEVEL": "0", "FREESTYLE_CACHE": "0"}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def audit(statement, top=8):
+    code = statement + "; import sys; print(' '.join(m for m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                          env=bench_env(), check=True)
+    loaded = set(proc.stdout.split())
+    direct, total_us = [], 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            total_us += int(cumulative)
+            direct.append((name.strip(), int(cumulative)))
+    direct.sort(key=lambda x: -x[1])
+    return {
+        "import_ms": round(total_us / 1000, 1),
+        "heaviest": {name: round(us / 1000, 1) for name, us in direct[:top]},
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in loaded],
+    }
+
+
+def cold_start(app, port, timeout=120.0):
+    cmd = [sys.executable, "-m", "uvicorn", f"backend.{app}:app", "--port", str(port), "--log-level", "warning"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=bench_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    out = {}
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            deadline = t0 + timeout
+            for probe, key in (("/livez", "bound_ms"), ("/readyz", "ready_ms")):
+                while True:
+                    if time.perf_counter() > deadline or proc.poll() is not None:
+                        raise RuntimeError(f"{app} never answered {probe}")
+                    try:
+                        if client.get(base + probe).status_code == 200:
+                            break
+                    except httpx.TransportError:
+                        pass
+                    time.sleep(0.01)
+                out[key] = round((time.perf_counter() - t0) * 1000, 1)
+            t1 = time.perf_counter()
+            client.post(base + "/agent", json=PAYLOAD).raise_for_status()
+            done = time.perf_counter()
+            out["first_request_ms"] = round((done - t1) * 1000, 1)
+            out["first_response_ms"] = round((done - t0) * 1000, 1)
+    finally:
+        proc.terminate()
+        proc.wait(30)
+    return out
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')}): new / old")
+    for name, v in results["audit"].items():
+        old = baseline.get("audit", {}).get(name)
+        if old:
+            print(f"  import {name}: {old['import_ms']} -> {v['import_ms']} ms ({v['import_ms'] / old['import_ms']:.2f}x)")
+    for name, v in results["cold_start"].items():
+        old = baseline.get("cold_start", {}).get(name)
+        if old and "first_response_ms" in v:
+            ratio = v["first_response_ms"] / old["first_response_ms"]
+            print(f"  first response {name}: {old['first_response_ms']} -> {v['first_response_ms']} ms ({ratio:.2f}x)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=3, help="cold starts per backend (median reported)")
+    ap.add_argument("--apps", default="mock_agent,freestyle_stub,freestyle_local_runner")
+    ap.add_argument("--port", type=int, default=8790)
+    ap.add_argument("--out", help="write JSON results to this path")
+    ap.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = ap.parse_args()
+    apps = [a for a in args.apps.split(",") if a]
+
+    results = {"meta": {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "python": sys.version.split()[0], "cpu_count": os.cpu_count(), "args": vars(args)},
+               "audit": {}, "cold_start": {}}
+    for name, statement in ENTRY_POINTS.items():
+        results["audit"][name] = a = audit(statement)
+        print(f"import {name}: {a['import_ms']} ms; heavy: {', '.join(a['heavy_loaded']) or 'none'}; "
+              f"top: {', '.join(f'{k}={v}' for k, v in list(a['heaviest'].items())[:3])}", flush=True)
+    for app in apps:
+        runs = []
+        for _ in range(args.repeat):
+            try:
+                runs.append(cold_start(app, args.port))
+            except Exception as e:
+                runs.append({"error": f"{type(e).__name__}: {e}"})
+        ok = [r for r in runs if "error" not in r]
+        summary = {k: round(float(np.median([r[k] for r in ok])), 1) for k in ok[0]} if ok else {}
+        results["cold_start"][app] = {**summary, "runs": runs}
+        print(f"cold start {app}: " + (", ".join(f"{k}={v}" for k, v in summary.items()) or runs[-1]["error"]),
+              flush=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
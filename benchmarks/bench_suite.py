@@ -0,0 +1,271 @@
+"""End-to-end benchmark of the profiling helpers and the three /agent backends.
+
+Runs every stage against the bundled CSVs in data/ and synthetically scaled frames, then drives
+each FastAPI app in-process with a concurrent load generator. Results are written as JSON so two
+commits can be compared with --compare.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_suite --out bench.json
+    python -m benchmarks.bench_suite --rows 10000,1000000,10000000 --cols 10,2000 --out big.json
+    python -m benchmarks.bench_suite --out new.json --compare bench.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Benchmark the deterministic paths: no LLM calls and no response cache in the runner
+os.environ.setdefault("FREESTYLE_LEVEL", "0")
+os.environ.setdefault("FREESTYLE_CACHE", "0")
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from backend import freestyle_local_runner, freestyle_stub, mock_agent  # noqa: E402
+from benchmarks.bench_type_inference import synthetic_frame  # noqa: E402
+from utils.schema_utils import infer_schema, infer_schema_chunked  # noqa: E402
+from utils.viz_utils import default_dashboard, detect_columns  # noqa: E402
+
+BACKENDS = {
+    "mock_agent": mock_agent.app,
+    "freestyle_stub": freestyle_stub.app,
+    "freestyle_local_runner": freestyle_local_runner.app,
+}
+
+
+def max_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# --- Stages: each takes the dataset context and returns the bytes it would ship ---
+
+def stage_infer_schema(ctx):
+    schema_str, sample_str = infer_schema(ctx["df"])
+    return len(schema_str.encode()) + len(sample_str.encode())
+
+
+def stage_infer_schema_chunked(ctx):
+    schema_str, sample_str, _ = infer_schema_chunked(ctx["path"])
+    return len(schema_str.encode()) + len(sample_str.encode())
+
+
+def stage_detect_columns(ctx):
+    detect_columns(ctx["df"])
+    return 0
+
+
+def stage_stub_infer_types(ctx):
+    freestyle_stub.infer_types(ctx["df"])
+    return 0
+
+
+def stage_default_dashboard(ctx):
+    # Includes spec serialization: that is what the browser actually receives
+    charts, _ = default_dashboard(ctx["df"])
+    return sum(len(json.dumps(c.to_dict(), default=str)) for c in charts)
+
+
+def agent_stage(name):
+    def stage(ctx):
+        resp = ctx["clients"][name].post("/agent", json=ctx["payload"])
+        resp.raise_for_status()
+        return len(resp.content)
+    stage.__name__ = f"stage_agent_{name}"
+    return stage
+
+
+STAGES = {
+    "infer_schema": stage_infer_schema,
+    "infer_schema_chunked": stage_infer_schema_chunked,
+    "detect_columns": stage_detect_columns,
+    "stub_infer_types": stage_stub_infer_types,
+    "default_dashboard": stage_default_dashboard,
+    **{f"agent:{name}": agent_stage(name) for name in BACKENDS},
+}
+
+
+def run_stage(fn, ctx, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        nbytes = fn(ctx)
+        timings.append(time.perf_counter() - t0)
+    # Separate traced run: tracemalloc slows allocation-heavy code, so it never overlaps timing
+    tracemalloc.start()
+    fn(ctx)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "best_s": round(min(timings), 6),
+        "median_s": round(float(np.median(timings)), 6),
+        "peak_alloc_mb": round(peak / 2**20, 2),
+        "max_rss_mb": max_rss_mb(),
+        "response_bytes": nbytes,
+    }
+
+
+def bench_dataset(name, path, clients, repeat, stages):
+    df = pd.read_csv(path)
+    schema_str, sample_str = infer_schema(df)
+    ctx = {"df": df, "path": path, "clients": clients,
+           "payload": {"schema_description": schema_str, "sample_rows": sample_str}}
+    out = {"dataset": name, "rows": len(df), "cols": df.shape[1], "stages": {}}
+    for stage in stages:
+        try:
+            out["stages"][stage] = run_stage(STAGES[stage], ctx, repeat)
+        except Exception as e:
+            out["stages"][stage] = {"error": f"{type(e).__name__}: {e}"}
+    return out
+
+
+# --- In-process load generator ---
+
+async def _load(app, payload, requests, concurrency):
+    latencies, errors = [], 0
+    queue = iter(range(requests))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal errors
+            for _ in queue:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.post("/agent", json=payload)
+                    resp.raise_for_status()
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    lat = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+    }
+
+
+def load_test(payload, requests, concurrency):
+    return {name: asyncio.run(_load(app, payload, requests, concurrency)) for name, app in BACKENDS.items()}
+
+
+# --- Reporting ---
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    base = {(d["dataset"], s): v for d in baseline["datasets"] for s, v in d["stages"].items()}
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')}): time ratio new/old, >1 is slower")
+    for d in results["datasets"]:
+        ratios = []
+        for stage, v in d["stages"].items():
+            old = base.get((d["dataset"], stage))
+            if old and "best_s" in old and "best_s" in v and old["best_s"] > 0:
+                ratios.append(f"{stage}={v['best_s'] / old['best_s']:.2f}x")
+        print(f"  {d['dataset']}: {', '.join(ratios) or 'no overlap'}")
+    for name, v in results["load"].items():
+        old = baseline.get("load", {}).get(name)
+        if old and old.get("rps"):
+            print(f"  load {name}: rps {old['rps']} -> {v['rps']}, p99 {old['p99_ms']} -> {v['p99_ms']} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", default="10000,100000,1000000",
+                    help="comma-separated synthetic row counts (at the narrowest --cols)")
+    ap.add_argument("--cols", default="10,200",
+                    help="comma-separated synthetic column counts (at the smallest --rows)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of stages")
+    ap.add_argument("--requests", type=int, default=500, help="load test requests per backend")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--out", help="write JSON results to this path")
+    ap.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = ap.parse_args()
+
+    rows = sorted(int(r) for r in args.rows.split(","))
+    cols = sorted(int(c) for c in args.cols.split(","))
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        ap.error(f"unknown stages: {sorted(unknown)}")
+    warnings.simplefilter("ignore", UserWarning)
+
+    datasets = [(os.path.splitext(os.path.basename(p))[0], p) for p in sorted(glob.glob("data/*.csv"))]
+    shapes = [(r, cols[0]) for r in rows] + [(rows[0], c) for c in cols[1:]]
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "datasets": [],
+        "load": {},
+    }
+    with TestClient(mock_agent.app) as mock, TestClient(freestyle_stub.app) as stub, \
+            TestClient(freestyle_local_runner.app) as runner, tempfile.TemporaryDirectory() as tmp:
+        clients = {"mock_agent": mock, "freestyle_stub": stub, "freestyle_local_runner": runner}
+        for name, path in datasets:
+            results["datasets"].append(bench_dataset(name, path, clients, args.repeat, stages))
+        for r, c in shapes:
+            path = os.path.join(tmp, f"synthetic_{r}x{c}.csv")
+            synthetic_frame(r, c).to_csv(path, index=False)
+            results["datasets"].append(bench_dataset(f"synthetic_{r}x{c}", path, clients, args.repeat, stages))
+            os.remove(path)
+
+        # Still inside the clients' lifespans, so the backends' CPU pools are warm
+        chronic = pd.read_csv("data/chronic_disease.csv")
+        schema_str, sample_str = infer_schema(chronic)
+        results["load"] = load_test({"schema_description": schema_str, "sample_rows": sample_str},
+                                    args.requests, args.concurrency)
+
+    for d in results["datasets"]:
+        line = ", ".join(f"{k}={v['best_s'] * 1000:.1f}ms" if "best_s" in v else f"{k}=ERR"
+                         for k, v in d["stages"].items())
+        print(f"{d['dataset']} ({d['rows']}x{d['cols']}): {line}")
+    for name, v in results["load"].items():
+        print(f"load {name}: {v['rps']} rps, p50 {v['p50_ms']} ms, p99 {v['p99_ms']} ms, errors {v['errors']}")
+    print(f"max RSS {max_rss_mb()} MB")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=str)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
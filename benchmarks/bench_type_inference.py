@@ -0,0 +1,171 @@
+"""Speed and agreement of utils.type_inference vs. the three implementations it replaced.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_type_inference --rows 100000 --cols 200
+"""
+import argparse
+import csv
+import glob
+import io
+import json
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.type_inference import infer_column_types
+
+
+# --- Legacy implementations (verbatim apart from dropping `infer_datetime_format`, which
+# pandas >= 3 rejects and which would otherwise make every datetime attempt fail) ---
+
+def legacy_viz_detect_columns(df):
+    df = df.copy()
+    numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    datetime_cols = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    for c in df.columns:
+        if c not in datetime_cols and not pd.api.types.is_numeric_dtype(df[c]):
+            try:
+                parsed = pd.to_datetime(df[c], errors="raise")
+                if parsed.isna().mean() < 0.2:
+                    df[c] = parsed
+                    datetime_cols.append(c)
+            except Exception:
+                pass
+    cat_cols = [c for c in df.columns if c not in numeric_cols and c not in datetime_cols]
+    return numeric_cols, cat_cols, datetime_cols
+
+
+def legacy_stub_infer_types(df):
+    datetime_cols, numeric_cols, categorical_cols = [], [], []
+    df2 = df.copy()
+    for col in df2.columns:
+        if not pd.api.types.is_numeric_dtype(df2[col]):
+            try:
+                df2[col] = pd.to_datetime(df2[col], errors="raise")
+            except Exception:
+                pass
+        if pd.api.types.is_datetime64_any_dtype(df2[col]):
+            datetime_cols.append(col)
+            continue
+        ser = pd.to_numeric(df2[col], errors="coerce")
+        if ser.notna().mean() >= 0.6:
+            numeric_cols.append(col)
+        else:
+            categorical_cols.append(col)
+    return numeric_cols, categorical_cols, datetime_cols
+
+
+def legacy_mock_detect_columns(df):
+    rows = list(csv.DictReader(io.StringIO(df.to_csv(index=False))))
+    if not rows:
+        return [], [], []
+    numeric_cols, categorical_cols, time_cols = [], [], []
+    for col in rows[0].keys():
+        val = next((r[col] for r in rows if r.get(col) not in (None, "")), None)
+        if val is None:
+            categorical_cols.append(col)
+            continue
+        if "date" in col.lower() or "time" in col.lower():
+            time_cols.append(col)
+            continue
+        try:
+            float(val)
+            numeric_cols.append(col)
+        except (ValueError, TypeError):
+            categorical_cols.append(col)
+    return numeric_cols, categorical_cols, time_cols
+
+
+def shared(df):
+    _, nums, cats, times = infer_column_types(df)
+    return nums, cats, times
+
+
+IMPLEMENTATIONS = {
+    "shared": shared,
+    "legacy_viz": legacy_viz_detect_columns,
+    "legacy_stub": legacy_stub_infer_types,
+    "legacy_mock": legacy_mock_detect_columns,
+}
+
+
+# --- Inputs ---
+
+def synthetic_frame(rows, cols, seed=0):
+    # Mix of column kinds in roughly equal proportion, all loaded the way read_csv would
+    rng = np.random.default_rng(seed)
+    data = {}
+    dates = pd.date_range("2020-01-01", periods=rows, freq="h")
+    for i in range(cols):
+        kind = i % 5
+        if kind == 0:
+            data[f"value_{i}"] = rng.normal(size=rows)
+        elif kind == 1:
+            data[f"count_{i}"] = rng.integers(0, 1000, size=rows)
+        elif kind == 2:
+            data[f"date_{i}"] = dates.strftime("%Y-%m-%d %H:%M:%S")
+        elif kind == 3:
+            data[f"label_{i}"] = rng.choice(["alpha", "beta", "gamma", "delta"], size=rows)
+        else:
+            data[f"text_num_{i}"] = rng.integers(0, 100, size=rows).astype(str)
+    buf = io.StringIO()
+    pd.DataFrame(data).to_csv(buf, index=False)
+    buf.seek(0)
+    return pd.read_csv(buf)
+
+
+def roles_of(result):
+    nums, cats, times = result
+    roles = {c: "numeric" for c in nums}
+    roles.update({c: "categorical" for c in cats})
+    roles.update({c: "datetime" for c in times})
+    return roles
+
+
+def bench(name, df, repeat):
+    out = {"dataset": name, "rows": len(df), "cols": df.shape[1], "impls": {}}
+    reference = roles_of(shared(df))
+    # Legacy paths fall back to dateutil and warn once per column; keep the report readable
+    warnings.simplefilter("ignore", UserWarning)
+    for impl_name, fn in IMPLEMENTATIONS.items():
+        if impl_name == "legacy_mock" and len(df) > 200_000:
+            continue  # csv round-trip of the whole frame; the mock only ever saw 10 rows
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = fn(df)
+            timings.append(time.perf_counter() - t0)
+        roles = roles_of(result)
+        agree = sum(roles.get(c) == reference.get(c) for c in df.columns) / max(df.shape[1], 1)
+        out["impls"][impl_name] = {
+            "best_s": round(min(timings), 5),
+            "agreement_with_shared": round(agree, 4),
+            "disagreements": {c: [roles.get(c), reference.get(c)] for c in df.columns
+                              if roles.get(c) != reference.get(c)},
+        }
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=50_000)
+    ap.add_argument("--cols", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", help="write JSON results to this path")
+    args = ap.parse_args()
+
+    results = [bench(path, pd.read_csv(path), args.repeat) for path in sorted(glob.glob("data/*.csv"))]
+    results.append(bench(f"synthetic_{args.rows}x{args.cols}", synthetic_frame(args.rows, args.cols), args.repeat))
+
+    for r in results:
+        line = ", ".join(f"{k}={v['best_s'] * 1000:.1f}ms/{v['agreement_with_shared']:.0%}" for k, v in r["impls"].items())
+        print(f"{r['dataset']} ({r['rows']}x{r['cols']}): {line}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Load test of backend.serve: requests per second as the worker count grows.
+
+Starts `python -m backend.serve <app> --workers W` for each W, waits for every worker to pass
+/readyz, then drives POST /agent over real sockets from several client processes (one asyncio
+loop each, so the load generator is not the bottleneck). Scaling efficiency is
+rps(W) / (W * rps(1)). Near 1.0 means linear. Expect it to fall off once server and client
+processes together exceed the cores; run the client on another host for clean numbers.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_workers --workers 1,2,4,8 --out workers.json
+    python -m benchmarks.bench_workers --app mock_agent --duration 20 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from utils.schema_utils import infer_schema
+
+
+def payload():
+    schema_str, sample_str = infer_schema(pd.read_csv("data/chronic_disease.csv"))
+    return {"schema_description": schema_str, "sample_rows": sample_str}
+
+
+async def _client(url, body, duration, connections):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.post(url, json=body)
+                    resp.raise_for_status()
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - t0)
+
+        await asyncio.gather(*(worker() for _ in range(connections)))
+    return latencies, errors
+
+
+def client_process(args):
+    return asyncio.run(_client(*args))
+
+
+def wait_ready(base, workers, timeout=120):
+    # Each new connection may land on a different worker; ready once `workers` distinct pids say so
+    seen, deadline = set(), time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with httpx.Client(timeout=2) as client:  # fresh connection per probe
+                r = client.get(f"{base}/readyz")
+            if r.status_code == 200:
+                seen.add(r.json()["pid"])
+                if len(seen) >= workers:
+                    return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"only {len(seen)}/{workers} workers became ready")
+
+
+def run_level(app, workers, cpu_workers, port, body, duration, concurrency, clients):
+    cmd = [sys.executable, "-m", "backend.serve", app, "--workers", str(workers), "--port", str(port),
+           "--drain-seconds", "0", "--log-level", "warning"]
+    if cpu_workers is not None:
+        cmd += ["--cpu-workers", str(cpu_workers)]
+    env = {**os.environ, "FREESTYLE_LEVEL": "0", "FREESTYLE_CACHE": "0"}
+    server = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base, workers)
+        per_client = max(concurrency // clients, 1)
+        jobs = [(f"{base}/agent", body, duration, per_client)] * clients
+        with multiprocessing.get_context("spawn").Pool(clients) as pool:
+            t0 = time.perf_counter()
+            results = pool.map(client_process, jobs)
+            elapsed = time.perf_counter() - t0
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(60)
+    latencies = np.array([x for lat, _ in results for x in lat]) * 1000
+    return {
+        "workers": workers,
+        "requests": int(latencies.size),
+        "errors": sum(e for _, e in results),
+        "rps": round(latencies.size / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2) if latencies.size else None,
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2) if latencies.size else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--app", default="freestyle_stub")
+    ap.add_argument("--workers", default=",".join(str(w) for w in (1, 2, 4, 8) if w <= (os.cpu_count() or 1)) or "1")
+    ap.add_argument("--cpu-workers", type=int, default=0,
+                    help="CPU pool processes per worker (default 0: compute in threads, one process per core)")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    ap.add_argument("--concurrency", type=int, default=32, help="total open connections")
+    ap.add_argument("--clients", type=int, default=max((os.cpu_count() or 2) // 2, 1), help="client processes")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--out", help="write JSON results to this path")
+    args = ap.parse_args()
+
+    body = payload()
+    levels = []
+    for w in sorted(int(w) for w in args.workers.split(",")):
+        level = run_level(args.app, w, args.cpu_workers, args.port, body, args.duration, args.concurrency,
+                          args.clients)
+        base = levels[0] if levels else level
+        level["efficiency"] = round(level["rps"] / (base["rps"] * w / base["workers"]), 2) if base["rps"] else None
+        levels.append(level)
+        print(f"{args.app} x{w}: {level['rps']} rps, p50 {level['p50_ms']} ms, p99 {level['p99_ms']} ms, "
+              f"errors {level['errors']}, efficiency {level['efficiency']}", flush=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"app": args.app, "cpu_count": os.cpu_count(), "args": vars(args), "levels": levels}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
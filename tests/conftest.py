@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Backends read their knobs at import time: run CPU work inline (no spawned pool) and keep
+# every on-disk cache out of the working tree.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ["FREESTYLE_CPU_WORKERS"] = "0"
+os.environ["DATA_AGENT_PROFILE_WORKERS"] = "1"
+os.environ.setdefault("FREESTYLE_AGENT_SNAPSHOTS", os.path.join(ROOT, ".cache", "test-agents"))
+for name in ("FREESTYLE_CACHE_DB", "FREESTYLE_JOBS_DB", "OPENAI_BASE_URL"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
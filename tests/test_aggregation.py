@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.aggregation import aggregate_over_time
+
+duckdb = pytest.importorskip("duckdb")
+
+
+@pytest.mark.parametrize("freq,periods", [("h", 2000), ("3h", 3000), ("D", 900), ("7D", 600)])
+def test_time_buckets_match_duckdb(tmp_path, freq, periods):
+    from utils.sql_engine import SqlSource
+
+    df = pd.DataFrame({"t": pd.date_range("2019-12-28", periods=periods, freq=freq), "v": np.arange(periods, dtype=float)})
+    path = str(tmp_path / "data.parquet")
+    df.to_parquet(path)
+    expected = aggregate_over_time(df, "t", "v")
+    got = SqlSource(path).aggregate_over_time("t", "v")
+    assert len(expected) == len(got)
+    assert (expected["t"].to_numpy(dtype="datetime64[ns]") == got["t"].to_numpy(dtype="datetime64[ns]")).all()
+    assert np.allclose(expected["v"], got["v"])
+
+
+def test_large_line_chart_buckets_like_duckdb(tmp_path):
+    # Large pandas frames get the same calendar buckets as the DuckDB path, not an LTTB pick
+    # of a full-resolution groupby
+    from utils.sql_engine import SqlSource
+    from utils.viz_utils import chart_line_over_time
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"t": pd.date_range("2020-01-01", periods=50_000, freq="min"), "v": rng.normal(size=50_000)})
+    path = str(tmp_path / "data.parquet")
+    df.to_parquet(path)
+    local = chart_line_over_time(df, "t", "v", max_points=500).data
+    pushed = chart_line_over_time(None, "t", "v", max_points=500, source=SqlSource(path)).data
+    assert len(local) == len(pushed) <= 500
+    assert (local["t"].to_numpy(dtype="datetime64[ns]") == pushed["t"].to_numpy(dtype="datetime64[ns]")).all()
+    assert np.allclose(local["v"], pushed["v"])
@@ -0,0 +1,42 @@
+import io
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest
+
+from utils import session_cache
+from utils.agent_client import AgentClient
+
+
+class Upload(io.BytesIO):
+    # What st.file_uploader returns: bytes plus name, size and a per-upload file_id
+    def __init__(self, data, name, file_id):
+        super().__init__(data)
+        self.name, self.file_id, self.size = name, file_id, len(data)
+
+
+def test_reupload_under_the_same_name_loads_the_new_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(session_cache, "PROFILE_DIR", str(tmp_path / "profiles"))
+    uploads = iter([Upload(b"Location,DataValue\nCA,1.5\nTX,2.5\n", "data.csv", "first"),
+                    Upload(b"Location,DataValue\nNY,7.5\nWA,8.5\nOR,9.5\n", "data.csv", "second")])
+    current = {}
+
+    def file_uploader(*args, **kwargs):
+        return current["file"]
+
+    answer = {"summary": "ok", "suggested_visuals": [], "chart_specs": []}
+    with mock.patch("streamlit.file_uploader", file_uploader), \
+            mock.patch.object(AgentClient, "post", lambda *args, **kwargs: answer):
+        at = AppTest.from_file("../app.py", default_timeout=60)
+        current["file"] = next(uploads)
+        at.run()
+        first = at.dataframe[0].value
+        current["file"] = next(uploads)
+        at.run()
+        second = at.dataframe[0].value
+    assert not at.exception
+    assert first["Location"].tolist() == ["CA", "TX"]
+    assert second["Location"].tolist() == ["NY", "WA", "OR"]
@@ -0,0 +1,128 @@
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import freestyle_local_runner as runner
+from backend.llm_client import CircuitBreaker, LLMClient
+from backend.response_cache import ResponseCache
+
+SAMPLE_CSV = "Date,Location,DataValue\n2020-01-01,A,1.5\n2020-02-01,B,2.5\n"
+ANSWER = json.dumps({"summary": "Streamed summary.", "suggested_visuals": ["Line chart"], "chart_specs": []})
+
+
+def chunk(content):
+    body = {"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+            "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]}
+    return f"data: {json.dumps(body)}\n\n".encode()
+
+
+def sse_response(parts, fail_after=None):
+    # Streams `parts` as chat.completion chunks; with fail_after=n the connection drops after n
+    async def body():
+        for i, part in enumerate(parts):
+            if fail_after is not None and i == fail_after:
+                raise httpx.ReadTimeout("upstream stalled")
+            yield chunk(part)
+        yield b"data: [DONE]\n\n"
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body())
+
+
+def error(status):
+    return httpx.Response(status, json={"error": {"message": f"status {status}", "type": "test"}})
+
+
+def events(text):
+    out = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+@pytest.fixture
+def llm_runner(monkeypatch):
+    # -> install(handler, **client kwargs): the runner with its LLM behind an httpx.MockTransport
+    def install(handler, **kwargs):
+        kwargs.setdefault("backoff_base", 0.0)
+        llm = LLMClient(api_key="fake", model="fake", base_url="http://upstream/v1",
+                        transport=httpx.MockTransport(handler), **kwargs)
+        monkeypatch.setattr(runner, "llm_client", llm)
+        return llm
+
+    monkeypatch.setenv("FREESTYLE_LEVEL", "1")
+    monkeypatch.setattr(runner, "OPENAI_API_KEY", "fake")
+    monkeypatch.setattr(runner, "response_cache", ResponseCache())
+    monkeypatch.setattr(runner, "semantic_cache", None)
+    return install
+
+
+def post_stream(client, schema="Location, DataValue"):
+    r = client.post("/agent/stream", json={"schema_description": schema, "sample_rows": SAMPLE_CSV})
+    assert r.status_code == 200
+    return events(r.text)
+
+
+def test_stream_success_is_cached(llm_runner):
+    llm_runner(lambda request: sse_response([ANSWER[i:i + 10] for i in range(0, len(ANSWER), 10)]))
+    out = post_stream(TestClient(runner.app))
+    assert out[-1] == ("done", json.loads(ANSWER) | {"datasets": {}})
+    assert runner.response_cache.stats()["entries"] == 1
+
+
+def test_stream_dropped_midway_reports_error_and_counts_failure(llm_runner):
+    llm = llm_runner(lambda request: sse_response([ANSWER[:20], ANSWER[20:]], fail_after=1),
+                     breaker=CircuitBreaker(threshold=5, reset_after=60))
+    out = post_stream(TestClient(runner.app))
+    assert out[-1][0] == "error"
+    assert "stream interrupted" in out[-1][1]
+    assert llm.breaker.failures == 1
+    assert runner.response_cache.stats()["entries"] == 0
+
+
+def test_stream_dropped_before_any_text_falls_back(llm_runner):
+    llm = llm_runner(lambda request: sse_response([ANSWER], fail_after=0))
+    out = post_stream(TestClient(runner.app))
+    assert out[-1][0] == "done"
+    assert out[-1][1]["summary"] == "Fallback summary (no LLM)."
+    assert llm.breaker.failures == 1
+    assert runner.response_cache.stats()["entries"] == 0
+
+
+def test_stream_non_retryable_error_reports_error(llm_runner):
+    llm = llm_runner(lambda request: error(400))
+    out = post_stream(TestClient(runner.app))
+    assert out == [("error", out[-1][1])]
+    assert "BadRequestError" in out[-1][1]
+    assert llm.breaker.failures == 0
+
+
+def test_batch_falls_back_uncached_when_llm_unavailable(llm_runner):
+    llm = llm_runner(lambda request: error(503), max_retries=1)
+    items = [{"schema_description": s, "sample_rows": SAMPLE_CSV} for s in ("Location, DataValue", "DataValue", "DataValue")]
+    r = TestClient(runner.app).post("/agent/batch", json={"items": items})
+    assert r.status_code == 200
+    out = sorted((json.loads(line) for line in r.text.splitlines()), key=lambda line: line["index"])
+    assert [line["index"] for line in out] == [0, 1, 2]
+    assert all(line["response"]["summary"] == "Fallback summary (no LLM)." and not line["cached"] for line in out)
+    assert llm.breaker.failures == 2
+    assert runner.response_cache.stats()["entries"] == 0
+
+
+def test_fallback_without_api_key_is_not_cached(llm_runner, monkeypatch):
+    monkeypatch.setattr(runner, "OPENAI_API_KEY", "")
+    client = TestClient(runner.app)
+    body = {"schema_description": "Location, DataValue", "sample_rows": SAMPLE_CSV}
+    assert client.post("/agent", json=body).json()["summary"] == "Fallback summary (no LLM)."
+    assert post_stream(client)[-1][1]["summary"] == "Fallback summary (no LLM)."
+    batch = client.post("/agent/batch", json={"items": [body]}).text
+    assert json.loads(batch)["response"]["summary"] == "Fallback summary (no LLM)."
+    assert runner.response_cache.stats()["entries"] == 0
+
+    # Once a key is configured the same request reaches the LLM
+    monkeypatch.setattr(runner, "OPENAI_API_KEY", "fake")
+    llm_runner(lambda request: httpx.Response(200, json={
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "fake",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": ANSWER}}]}))
+    assert client.post("/agent", json=body).json()["summary"] == "Streamed summary."
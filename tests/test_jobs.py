@@ -0,0 +1,188 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from backend import jobs
+from backend.jobs import FAILED, QUEUED, RUNNING, JobRunner, MemoryStore, SqliteStore
+from backend.models import AgentRequest, AgentResponse
+
+pytestmark = pytest.mark.anyio
+
+PAYLOAD = {"schema_description": "Location, DataValue", "sample_rows": "Location,DataValue\nA,1\n"}
+
+
+class StubAgent:
+    # The coroutine behind /agent: counts calls and, with `gate`, blocks until it is set
+    def __init__(self, gate=None):
+        self.calls = 0
+        self.gate = gate
+
+    async def __call__(self, req: AgentRequest) -> AgentResponse:
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        return AgentResponse(summary=f"answer for {req.schema_description}", suggested_visuals=[], chart_specs=[])
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore(ttl_seconds=60)
+    return SqliteStore(str(tmp_path / "jobs.sqlite"), ttl_seconds=60)
+
+
+async def body(request: Request) -> AgentRequest:
+    return AgentRequest(**(await request.json()))
+
+
+async def serve(answer, store, **kwargs):
+    # -> (runner, client) with the job API on a bare app; the caller stops the runner
+    app = FastAPI()
+    runner = jobs.install(app, answer, body)
+    runner.store = store
+    for key, value in kwargs.items():
+        setattr(runner, key, value)
+    await runner.start()
+    return runner, httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def test_same_body_is_one_job(store):
+    agent = StubAgent()
+    runner, client = await serve(agent, store)
+    try:
+        first = await client.post("/agent/jobs", json=PAYLOAD)
+        assert first.status_code == 202
+        job_id = first.json()["id"]
+        assert first.headers["location"] == f"/agent/jobs/{job_id}"
+        done = (await client.get(f"/agent/jobs/{job_id}", params={"wait": 5})).json()
+        assert done["status"] == "done"
+        assert done["result"]["summary"] == "answer for Location, DataValue"
+
+        again = await client.post("/agent/jobs", json=PAYLOAD)
+        assert again.json()["id"] == job_id
+        assert again.json()["status"] == "done"
+        other = await client.post("/agent/jobs", json=PAYLOAD | {"schema_description": "Other"})
+        assert other.json()["id"] != job_id
+        await runner.wait(other.json()["id"], 5)
+        assert agent.calls == 2
+    finally:
+        await runner.stop()
+
+
+async def test_concurrent_identical_posts_start_one_job(store):
+    gate = asyncio.Event()
+    agent = StubAgent(gate)
+    runner, client = await serve(agent, store)
+    try:
+        first, second = await asyncio.gather(*(client.post("/agent/jobs", json=PAYLOAD) for _ in range(2)))
+        assert first.json()["id"] == second.json()["id"]
+        # The long-poller is woken by the event of the one job that runs
+        asyncio.get_running_loop().call_later(0.2, gate.set)
+        start = time.monotonic()
+        job = (await client.get(f"/agent/jobs/{first.json()['id']}", params={"wait": 10})).json()
+        assert job["status"] == "done"
+        assert time.monotonic() - start < 2
+        assert agent.calls == 1
+    finally:
+        await runner.stop()
+
+
+def test_put_if_is_compare_and_set_across_processes(tmp_path):
+    # Two stores on one file stand in for two server processes that both read "no job"
+    path = str(tmp_path / "jobs.sqlite")
+    a, b = SqliteStore(path), SqliteStore(path)
+    now = time.time()
+    job = {"id": "x", "status": QUEUED, "created": now, "updated": now, "started": None,
+           "finished": None, "pid": os.getpid(), "result": None, "error": None}
+    assert a.put_if(job, None)
+    assert not b.put_if(job | {"pid": os.getpid() + 1}, None)
+    assert b.get("x")["pid"] == os.getpid()
+    # A failed job is replaced only by whoever read that failed document
+    failed = job | {"status": FAILED, "updated": now + 1}
+    a.put(failed)
+    assert not b.put_if(job, job)
+    assert b.put_if(job | {"updated": now + 2}, b.get("x"))
+    assert not a.put_if(job | {"updated": now + 3}, failed)
+
+
+async def test_full_queue_answers_429(store):
+    gate = asyncio.Event()
+    runner, client = await serve(StubAgent(gate), store, workers=1, queue_size=1)
+    try:
+        running = await client.post("/agent/jobs", json=PAYLOAD | {"schema_description": "a"})
+        await asyncio.sleep(0.05)  # the worker takes it off the queue
+        queued = await client.post("/agent/jobs", json=PAYLOAD | {"schema_description": "b"})
+        full = await client.post("/agent/jobs", json=PAYLOAD | {"schema_description": "c"})
+        assert running.status_code == queued.status_code == 202
+        assert full.status_code == 429
+        assert full.headers["retry-after"] == "1"
+        assert runner.stats()["rejected"] == 1
+        gate.set()
+    finally:
+        await runner.stop()
+
+
+async def test_long_poll_wakes_when_the_job_finishes(store):
+    gate = asyncio.Event()
+    runner, client = await serve(StubAgent(gate), store)
+    try:
+        job_id = (await client.post("/agent/jobs", json=PAYLOAD)).json()["id"]
+        asyncio.get_running_loop().call_later(0.2, gate.set)
+        start = time.monotonic()
+        job = (await client.get(f"/agent/jobs/{job_id}", params={"wait": 10})).json()
+        assert job["status"] == "done"
+        assert time.monotonic() - start < 2
+        missing = await client.get("/agent/jobs/" + "0" * 32)
+        assert missing.status_code == 404
+    finally:
+        await runner.stop()
+
+
+async def test_long_poll_reads_the_store_for_remote_jobs(tmp_path):
+    # A job owned by another process: wait() re-reads the shared store until it finishes
+    path = str(tmp_path / "jobs.sqlite")
+    runner = JobRunner(StubAgent(), SqliteStore(path))
+    other = SqliteStore(path)
+    job = {"id": "remote", "status": RUNNING, "created": time.time(), "updated": time.time(), "started": time.time(),
+           "finished": None, "pid": os.getpid() + 1, "result": None, "error": None}
+    other.put(job)
+
+    async def finish():
+        await asyncio.sleep(0.3)
+        other.put(job | {"status": "done", "updated": time.time()})
+
+    task = asyncio.create_task(finish())
+    assert (await runner.wait("remote", 5))["status"] == "done"
+    await task
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_finished_jobs_expire(kind, tmp_path):
+    store = MemoryStore(ttl_seconds=1) if kind == "memory" else SqliteStore(str(tmp_path / "jobs.sqlite"), 1)
+    now = time.time()
+    base = {"created": now, "started": None, "finished": None, "pid": os.getpid(), "result": None, "error": None}
+    store.put(base | {"id": "old", "status": FAILED, "updated": now - 5})
+    store.put(base | {"id": "waiting", "status": QUEUED, "updated": now - 5})
+    store.put(base | {"id": "new", "status": FAILED, "updated": now})
+    assert store.get("old") is None
+    assert store.get("waiting")["status"] == QUEUED  # only finished jobs expire
+    assert store.get("new")["status"] == FAILED
+
+
+def test_stale_only_when_the_owner_cannot_finish():
+    runner = JobRunner(StubAgent(), MemoryStore(), timeout=10)
+    now = time.time()
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    job = {"id": "x", "created": now - 3600, "updated": now - 3600, "finished": None, "result": None, "error": None}
+    # Queued for an hour behind a backed-up queue, in a live process: not stale
+    assert not runner.is_stale(job | {"status": QUEUED, "started": None, "pid": os.getppid()})
+    assert runner.is_stale(job | {"status": QUEUED, "started": None, "pid": dead.pid})
+    assert not runner.is_stale(job | {"status": RUNNING, "started": now - 30, "pid": os.getpid()})
+    assert runner.is_stale(job | {"status": RUNNING, "started": now - 100, "pid": os.getpid()})
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from backend import lifecycle
+
+pytestmark = pytest.mark.anyio
+
+
+def crash():
+    os._exit(1)  # a pool process dying (OOM kill, segfault)
+
+
+def double(x):
+    return 2 * x
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(lifecycle, "CPU_WORKERS", 1)
+    monkeypatch.setattr(lifecycle, "state", lifecycle.Lifecycle())
+    lifecycle.state.ready = True
+    kills, kill = [], os.kill
+
+    def record(pid, sig):
+        # Signals to this process are recorded; the pool still terminates its own children
+        if pid == os.getpid():
+            kills.append(sig)
+        else:
+            kill(pid, sig)
+
+    monkeypatch.setattr(os, "kill", record)
+    yield kills
+    if lifecycle._cpu_pool is not None:
+        lifecycle._discard_pool(lifecycle._cpu_pool)
+
+
+async def test_broken_pool_answers_503_and_recovers_standalone(pool, monkeypatch):
+    monkeypatch.setattr(lifecycle, "SUPERVISED", False)
+    with pytest.raises(HTTPException) as exc:
+        await lifecycle.run_cpu("crash", crash)
+    assert exc.value.status_code == 503
+    # A plain uvicorn process is neither killed nor marked unready; the next call rebuilds the pool
+    assert pool == [] and lifecycle.state.ready
+    assert lifecycle.state.cpu_error.startswith("BrokenProcessPool")
+    assert await lifecycle.run_cpu("double", double, 21) == 42
+
+
+async def test_broken_pool_drains_a_supervised_worker(pool, monkeypatch):
+    monkeypatch.setattr(lifecycle, "SUPERVISED", True)
+    with pytest.raises(HTTPException):
+        await lifecycle.run_cpu("crash", crash)
+    assert pool == [lifecycle.signal.SIGTERM]
+    assert not lifecycle.state.ready
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import time
+
+import httpx
+import openai
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import fake_openai
+from backend.llm_client import CircuitBreaker, LLMClient, LLMUnavailable, TokenBucket
+
+pytestmark = pytest.mark.anyio
+
+MESSAGES = [{"role": "user", "content": "SAMPLE_ROWS (CSV):\nDate,Location,DataValue\n2020-01-01,A,1"}]
+SAMPLE_CSV = "Date,Location,DataValue\n2020-01-01,A,1.5\n2020-02-01,B,2.5\n"
+
+
+def completion(content="{}"):
+    return httpx.Response(200, json={
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "fake",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+    })
+
+
+def error(status):
+    return httpx.Response(status, json={"error": {"message": f"status {status}", "type": "test"}})
+
+
+class Upstream:
+    # httpx.MockTransport handler answering with the queued responses, then the last one forever
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, request):
+        self.calls.append(time.monotonic())
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+
+def make_client(upstream=None, **kwargs):
+    transport = httpx.MockTransport(upstream) if upstream is not None else httpx.ASGITransport(app=fake_openai.app)
+    kwargs.setdefault("backoff_base", 0.0)
+    return LLMClient(api_key="fake", model="fake", base_url="http://upstream/v1", transport=transport, **kwargs)
+
+
+async def test_complete_and_stream_against_fake_server(monkeypatch):
+    monkeypatch.setenv("FAKE_OPENAI_LATENCY", "0")
+    llm = make_client()
+    text = await llm.complete(MESSAGES)
+    assert json.loads(text)["summary"] == "Fake summary of a dataset with columns: Date, Location, DataValue."
+    assert "".join([delta async for delta in llm.stream(MESSAGES)]) == text
+    assert llm.counters == {"requests": 2, "retries": 0, "failures": 0, "rejected": 0}
+
+
+async def test_fake_server_failures_exhaust_retries(monkeypatch):
+    monkeypatch.setenv("FAKE_OPENAI_LATENCY", "0")
+    monkeypatch.setenv("FAKE_OPENAI_FAIL_RATE", "1")
+    monkeypatch.setenv("FAKE_OPENAI_FAIL_STATUS", "503")
+    llm = make_client(max_retries=2)
+    with pytest.raises(LLMUnavailable):
+        await llm.complete(MESSAGES)
+    assert llm.counters["requests"] == 3
+    assert llm.counters["retries"] == 2
+    assert llm.breaker.failures == 1
+
+
+async def test_429_is_retried_then_succeeds():
+    upstream = Upstream(error(429), completion('{"summary": "ok"}'))
+    llm = make_client(upstream)
+    assert await llm.complete(MESSAGES) == '{"summary": "ok"}'
+    assert len(upstream.calls) == 2
+    assert llm.counters["retries"] == 1
+    assert llm.counters["failures"] == 0
+    assert llm.breaker.state == "closed"
+
+
+async def test_consecutive_5xx_open_the_breaker():
+    upstream = Upstream(error(503))
+    llm = make_client(upstream, max_retries=0, breaker=CircuitBreaker(threshold=3, reset_after=60))
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable):
+            await llm.complete(MESSAGES)
+    assert llm.breaker.state == "open"
+    with pytest.raises(LLMUnavailable, match="circuit open"):
+        await llm.complete(MESSAGES)
+    assert len(upstream.calls) == 3  # the open circuit fails fast without calling upstream
+    assert llm.counters["rejected"] == 1
+
+
+async def test_half_open_trial_closes_the_breaker():
+    upstream = Upstream(error(500), completion())
+    llm = make_client(upstream, max_retries=0, breaker=CircuitBreaker(threshold=1, reset_after=0))
+    with pytest.raises(LLMUnavailable):
+        await llm.complete(MESSAGES)
+    assert llm.breaker.state == "half-open"
+    await llm.complete(MESSAGES)
+    assert llm.breaker.state == "closed"
+
+
+async def test_cancelled_half_open_trial_is_released():
+    started = asyncio.Event()
+    responses = [error(500), None, completion()]  # None: the trial stalls until it is cancelled
+
+    async def upstream(request):
+        response = responses.pop(0)
+        if response is None:
+            started.set()
+            await asyncio.sleep(60)
+        return response
+
+    llm = make_client(upstream, max_retries=0, breaker=CircuitBreaker(threshold=1, reset_after=0))
+    with pytest.raises(LLMUnavailable):
+        await llm.complete(MESSAGES)
+    trial = asyncio.create_task(llm.complete(MESSAGES))
+    await started.wait()
+    assert llm.breaker.trial_in_flight
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+    # Not counted as a failure, and the next call becomes the new trial instead of being rejected
+    assert not llm.breaker.trial_in_flight
+    assert llm.breaker.failures == 1
+    await llm.complete(MESSAGES)
+    assert llm.breaker.state == "closed"
+
+
+async def test_400_is_reraised_without_counting_as_a_failure():
+    upstream = Upstream(error(400))
+    llm = make_client(upstream, breaker=CircuitBreaker(threshold=1, reset_after=60))
+    with pytest.raises(openai.BadRequestError):
+        await llm.complete(MESSAGES)
+    assert len(upstream.calls) == 1  # not retried
+    assert llm.counters["failures"] == 0
+    assert llm.breaker.failures == 0
+    assert llm.breaker.state == "closed"
+
+
+async def test_token_bucket_spaces_calls_at_rate():
+    bucket = TokenBucket(rate=20, burst=1)
+    stamps = []
+    for _ in range(5):
+        await bucket.acquire()
+        stamps.append(time.monotonic())
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+    assert min(gaps) >= 0.045
+
+
+async def test_client_rate_limit_spaces_upstream_calls():
+    upstream = Upstream(completion())
+    llm = make_client(upstream, rate=20, burst=2)
+    for _ in range(6):
+        await llm.complete(MESSAGES)
+    # The burst goes out at once, the rest one per 1/rate seconds
+    assert upstream.calls[-1] - upstream.calls[0] >= 4 / 20 * 0.9
+    assert min(b - a for a, b in zip(upstream.calls[2:], upstream.calls[3:])) >= 0.045
+
+
+def test_open_breaker_serves_uncached_fallback(monkeypatch):
+    from backend import freestyle_local_runner as runner
+    from backend.response_cache import ResponseCache
+
+    upstream = Upstream(error(503))
+    llm = make_client(upstream, max_retries=0, breaker=CircuitBreaker(threshold=2, reset_after=60))
+    cache = ResponseCache()
+    monkeypatch.setenv("FREESTYLE_LEVEL", "1")
+    monkeypatch.setattr(runner, "OPENAI_API_KEY", "fake")
+    monkeypatch.setattr(runner, "llm_client", llm)
+    monkeypatch.setattr(runner, "response_cache", cache)
+    monkeypatch.setattr(runner, "semantic_cache", None)
+
+    client = TestClient(runner.app)
+    for _ in range(3):
+        r = client.post("/agent", json={"schema_description": "Location, DataValue", "sample_rows": SAMPLE_CSV})
+        assert r.status_code == 200
+        assert r.json()["summary"] == "Fallback summary (no LLM)."
+    assert llm.breaker.state == "open"
+    assert len(upstream.calls) == 2
+    assert llm.counters["rejected"] == 1
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from backend.mock_agent import build_response
+from utils.recommend import recommend_charts
+
+
+def daily(days=30, seed=0):
+    # One row per date: every time bin holds a single row
+    rng = np.random.default_rng(seed)
+    t = np.arange(days)
+    return pd.DataFrame({
+        "Date": pd.date_range("2024-01-01", periods=days, freq="D"),
+        "Region": np.array(["North", "South", "East"])[t % 3],
+        "Sales": 100 + 5 * t + rng.normal(0, 5, days),
+        "Visits": rng.normal(200, 20, days),
+        "Spend": rng.normal(200, 20, days),
+    })
+
+
+def test_line_scores_the_trend_when_bins_hold_one_row():
+    df = daily()
+    picks = recommend_charts(df, ["Sales", "Visits", "Spend"], ["Region"], ["Date"])
+    line = next(r for r in picks if r.kind == "line")
+    assert (line.x, line.y) == ("Date", "Sales")
+    assert "one row per time bin" in line.reason
+    assert line.score > 0.5
+
+
+def test_mock_agent_keeps_its_line_and_bar_charts():
+    # Many correlated measurements make scatter the top candidates; the mock still answers
+    # with the line and bar charts it always returned
+    rng = np.random.default_rng(1)
+    base = rng.normal(0, 1, 30)
+    df = daily()[["Date", "Region", "Sales"]].assign(**{f"m{i}": base + rng.normal(0, 0.3, 30) for i in range(6)})
+    resp = build_response(df.to_csv(index=False))
+    assert resp.suggested_visuals == ["Line chart of numeric metric over time", "Bar chart of category vs numeric metric"]
+    assert len(resp.chart_specs) == 2
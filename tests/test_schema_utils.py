@@ -0,0 +1,32 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.schema_utils import infer_schema, infer_schema_chunked
+
+
+def labels(schema):
+    return [line.split(" - ")[0] for line in schema.splitlines() if " - " in line]
+
+
+def frame(values):
+    n = len(values)
+    return pd.DataFrame({"k": np.arange(n) % 7, "val": values})
+
+
+@pytest.mark.parametrize("values", [
+    np.arange(3000) * 1.5,
+    np.arange(3000),
+    np.where(np.arange(3000) == 2900, np.nan, np.arange(3000)),
+])
+@pytest.mark.parametrize("dirty", [False, True])
+def test_chunked_schema_labels_match_full(values, dirty):
+    df = frame(values.astype(object))
+    if dirty:
+        df.loc[2500, "val"] = "oops"  # one bad value in one chunk, outside the preview
+    csv = df.to_csv(index=False)
+    full, _ = infer_schema(pd.read_csv(io.StringIO(csv)))
+    chunked, _, _ = infer_schema_chunked(io.StringIO(csv), chunksize=500, preview_rows=300)
+    assert labels(chunked) == labels(full)
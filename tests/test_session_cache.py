@@ -0,0 +1,73 @@
+import io
+import os
+
+import pandas as pd
+
+from utils import session_cache
+
+
+def csv(rows, seed):
+    return pd.DataFrame({"k": [f"{seed}-{i % 7}" for i in range(rows)], "v": range(rows)}).to_csv(index=False).encode()
+
+
+def entries(folder):
+    return sorted(f.split(".")[0] for f in os.listdir(folder) if f.endswith(".json"))
+
+
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(session_cache, "PROFILE_DIR", str(tmp_path / "profiles"))
+    files = [csv(2_000, seed) for seed in range(3)]
+    keys = []
+    for age, data in zip((300, 200), files):
+        keys.append(session_cache.load_dataset(io.BytesIO(data)).key)
+        for fname in os.listdir(tmp_path):
+            if fname.startswith(keys[-1]):
+                os.utime(tmp_path / fname, (0, os.path.getmtime(tmp_path / fname) - age))
+    entry_size = sum(os.path.getsize(tmp_path / f) for f in os.listdir(tmp_path) if f.startswith(keys[0]))
+
+    # A hit makes the older entry the most recently used one
+    assert session_cache.load_dataset(io.BytesIO(files[0])).from_cache
+    monkeypatch.setattr(session_cache, "CACHE_MAX_BYTES", int(entry_size * 2.5))
+    keys.append(session_cache.load_dataset(io.BytesIO(files[2])).key)
+    assert entries(tmp_path) == sorted([keys[0], keys[2]])
+    assert not session_cache.load_dataset(io.BytesIO(files[1])).from_cache
+
+
+def test_cache_sweep_never_drops_the_entry_just_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(session_cache, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(session_cache, "CACHE_MAX_BYTES", 1)
+    first = session_cache.load_dataset(io.BytesIO(csv(500, 0)), name="a.csv")
+    second = session_cache.load_dataset(io.BytesIO(csv(500, 1)), name="b.csv")
+    assert entries(tmp_path) == [second.key]
+    assert len(os.listdir(tmp_path / "profiles")) == 1
+    assert first.key != second.key
+
+
+def labels(schema):
+    return [line.split(" - ")[0] for line in schema.splitlines() if " - " in line]
+
+
+def test_agent_sees_parsed_dtypes_not_optimized_ones(tmp_path, monkeypatch):
+    from utils.schema_utils import infer_schema
+    from utils.viz_utils import detect_columns
+
+    monkeypatch.setattr(session_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(session_cache, "PROFILE_DIR", str(tmp_path / "profiles"))
+    rows = 2_000
+    frame = pd.DataFrame({"Location": [["CA", "TX", "NY"][i % 3] for i in range(rows)],
+                          "DataValue": [i % 40 * 0.5 for i in range(rows)], "Cases": [i % 90 for i in range(rows)]})
+    data = frame.to_csv(index=False).encode()
+    ds = session_cache.load_dataset(io.BytesIO(data))
+    assert str(ds.df["Cases"].dtype) == "int8"  # stored optimized...
+    expected = infer_schema(detect_columns(pd.read_csv(io.BytesIO(data)))[0])
+    assert (ds.schema_str, ds.sample_str) == expected  # ...described as parsed
+    assert labels(ds.schema_str) == ["Location (str)", "DataValue (float64)", "Cases (int64)"]
+
+    # The incremental path describes the optimized frame with the same labels
+    monkeypatch.setattr(session_cache, "CACHE_DIR", str(tmp_path / "named"))
+    named = session_cache.load_dataset(io.BytesIO(data), name="log.csv")
+    grown = session_cache.load_dataset(io.BytesIO(data + b"CA,1.5,3\n"), name="log.csv")
+    assert grown.appended_rows == 1
+    assert labels(grown.schema_str) == labels(named.schema_str) == labels(ds.schema_str)
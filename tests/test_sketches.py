@@ -0,0 +1,143 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import session_cache
+from utils.sketches import TOPK_CAPACITY, DatasetSketch, TopK, materially_changed
+
+ROLES = (["DataValue"], ["Location"], ["Date"])  # numeric, categorical, datetime
+
+
+def log_frame(rows, start=0, seed=0, shift=0.0):
+    # A growing log: hourly rows, a skewed categorical with a long tail, a noisy measurement
+    rng = np.random.default_rng(seed)
+    heavy = rng.choice(["CA", "TX", "NY", "FL", "WA"], rows, p=[0.35, 0.25, 0.2, 0.12, 0.08])
+    location = np.where(rng.random(rows) < 0.6, heavy, [f"site-{i}" for i in rng.integers(0, 5000, rows)])
+    value = rng.normal(50 + shift, 10, rows)
+    value[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        "Date": pd.date_range("2020-01-01", periods=rows, freq="h") + pd.Timedelta(hours=start),
+        "Location": location,
+        "DataValue": value,
+    })
+
+
+def sketch(df):
+    return DatasetSketch.from_frame(df, *ROLES)
+
+
+def test_prefix_merged_with_tail_matches_whole_file():
+    df = log_frame(20_000)
+    whole = sketch(df)
+    merged = sketch(df.iloc[:14_000]).merge(sketch(df.iloc[14_000:]))
+    # Through JSON, as the session cache stores it
+    merged = DatasetSketch.from_dict(json.loads(json.dumps(merged.to_dict())))
+
+    for col in df.columns:
+        a, b = merged.columns[col], whole.columns[col]
+        assert (a.rows, a.nulls, a.lo, a.hi) == (b.rows, b.nulls, b.lo, b.hi)
+        # HyperLogLog: the merge is the register-wise max, identical to sketching the union
+        np.testing.assert_array_equal(a.hll.registers, b.hll.registers)
+        assert abs(a.hll.estimate() - df[col].nunique()) <= 0.05 * df[col].nunique()
+
+    # t-digest: quantiles within 1% of the p5-p95 spread of the exact ones
+    values = df["DataValue"].dropna()
+    exact = values.quantile([0.05, 0.25, 0.5, 0.75, 0.95]).to_numpy()
+    got = np.array([merged.stats()["DataValue"]["quantiles"][k] for k in ("p5", "p25", "p50", "p75", "p95")])
+    np.testing.assert_allclose(got, exact, atol=0.01 * (exact[-1] - exact[0]))
+
+    # Misra-Gries: more distinct values than TOPK_CAPACITY, yet the heavy hitters keep their
+    # rank, and each count is a lower bound within rows / (capacity + 1) of the truth
+    counts = df["Location"].value_counts()
+    assert len(counts) > TOPK_CAPACITY
+    top = merged.columns["Location"].topk.top(5)
+    assert [v for v, _ in top] == counts.index[:5].tolist()
+    for value, n in top:
+        assert counts[value] - len(df) / (TOPK_CAPACITY + 1) <= n <= counts[value]
+
+
+def test_topk_is_exact_below_capacity():
+    a = TopK.from_series(pd.Series(["x"] * 5 + ["y"] * 3))
+    b = TopK.from_series(pd.Series(["y"] * 4 + ["z"]))
+    assert a.merge(b).top() == [("y", 7), ("x", 5), ("z", 1)]
+
+
+def test_merge_rejects_different_roles():
+    df = log_frame(100)
+    other = DatasetSketch.from_frame(df, ["DataValue"], ["Location", "Date"], [])
+    with pytest.raises(ValueError):
+        sketch(df).merge(other)
+
+
+def test_materially_changed():
+    base = sketch(log_frame(10_000))
+    summary = base.summary()
+    assert materially_changed(None, summary) == "no previous summary"
+    # More rows from the same process: the agent's previous answer still holds
+    grown = base.merge(sketch(log_frame(1_000, start=10_000, seed=1)))
+    assert materially_changed(summary, grown.summary()) is None
+
+    assert materially_changed(summary, base.merge(sketch(log_frame(6_000, start=10_000, seed=1))).summary()) \
+        == "rows grew from 10,000 to 16,000"
+    shifted = base.merge(sketch(log_frame(1_500, start=10_000, seed=1, shift=60)))
+    assert materially_changed(summary, shifted.summary()) == "DataValue: distribution shifted"
+    earlier = base.merge(sketch(log_frame(100, start=-5_000, seed=1)))
+    assert materially_changed(summary, earlier.summary()) == "Date: time range extended"
+    # The first rows again, all from one new location
+    new_leader = base.merge(sketch(log_frame(2_500).assign(Location="OR")))
+    assert materially_changed(summary, new_leader.summary()) == "Location: leading categories changed"
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(session_cache, "PROFILE_DIR", str(tmp_path / "profiles"))
+    return tmp_path
+
+
+def csv_bytes(df):
+    return df.to_csv(index=False).encode()
+
+
+def test_load_dataset_parses_only_the_appended_tail(cache_dir, monkeypatch):
+    first, extra = log_frame(5_000), log_frame(400, start=5_000, seed=1)
+    v1 = csv_bytes(first)
+    v2 = v1 + csv_bytes(extra).split(b"\n", 1)[1]
+
+    base = session_cache.load_dataset(io.BytesIO(v1), name="log.csv")
+    assert base.appended_rows is None and not base.agent_reused
+    assert base.summary_change == "no previous summary"
+
+    grown = session_cache.load_dataset(io.BytesIO(v2), name="log.csv")
+    assert grown.appended_rows == len(extra)
+    assert grown.agent_reused
+    assert grown.agent_schema_str == base.schema_str and grown.agent_sample_str == base.sample_str
+    assert (grown.numeric, grown.categorical, grown.datetime) == (base.numeric, base.categorical, base.datetime)
+
+    # Same rows and values as profiling the whole file from scratch (in an empty cache)
+    monkeypatch.setattr(session_cache, "CACHE_DIR", str(cache_dir / "scratch"))
+    scratch = session_cache.load_dataset(io.BytesIO(v2), name="other.csv")
+    assert scratch.appended_rows is None
+    assert len(grown.df) == len(scratch.df) == 5_400
+    pd.testing.assert_frame_equal(grown.df.astype(object), scratch.df.astype(object))
+
+
+def test_load_dataset_reprofiles_a_nonconforming_tail(cache_dir):
+    first = log_frame(2_000)
+    v1 = csv_bytes(first)
+    session_cache.load_dataset(io.BytesIO(v1), name="log.csv")
+
+    # Text in the numeric column: the tail does not fit the profiled roles
+    v2 = v1 + b"2021-01-01 00:00:00,CA,not a number\n"
+    dirty = session_cache.load_dataset(io.BytesIO(v2), name="log.csv")
+    assert dirty.appended_rows is None
+    assert len(dirty.df) == 2_001
+
+    # Earlier rows rewritten (not an append): also a full parse
+    v3 = csv_bytes(first.assign(DataValue=first["DataValue"] + 1)) + b"2021-01-01 00:00:00,CA,1.0\n"
+    rewritten = session_cache.load_dataset(io.BytesIO(v3), name="log.csv")
+    assert rewritten.appended_rows is None
+    assert len(rewritten.df) == 2_001
@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+
+from backend import mock_agent
+
+
+def test_metrics_label_requests_by_route_template():
+    client = TestClient(mock_agent.app)
+    client.post("/agent", json={"schema_description": "a", "sample_rows": "a\n1\n"})
+    client.get("/agent/jobs/abc")
+    for i in range(5):
+        assert client.get(f"/wp-admin/{i}.php").status_code == 404
+    routes = {line.split('route="')[1].split('"')[0] for line in client.get("/metrics").text.splitlines()
+              if line.startswith("agent_request_bytes_count")}
+    assert {"/agent", "/agent/jobs/{job_id}", "<unmatched>"} <= routes
+    assert not any(route.startswith("/wp-admin") for route in routes)
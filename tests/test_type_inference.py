@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import type_inference
+
+
+def mixed_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2020-01-01", periods=rows, freq="D")
+    return pd.DataFrame({
+        "iso": days.strftime("%Y-%m-%d"),
+        "stamp": pd.date_range("2020-01-01", periods=rows, freq="min").strftime("%Y-%m-%d %H:%M:%S"),
+        "us_date": days.strftime("%m/%d/%Y"),
+        "month": days.strftime("%Y-%m"),
+        "label": rng.choice(["alpha", "beta", "gamma"], rows),
+        "text_num": rng.integers(0, 100, rows).astype(str),
+        "mostly_num": np.where(rng.random(rows) < 0.8, "1.5", "n/a"),
+        "sparse_date_col": np.where(rng.random(rows) < 0.5, "2020-01-01", None),
+        "value": rng.normal(size=rows),
+        "empty": [None] * rows,
+    }).astype({"iso": "str", "stamp": "str", "label": "str"})
+
+
+@pytest.mark.parametrize("rows", [5, 150, 1500])
+def test_small_and_stacked_paths_agree(rows, monkeypatch):
+    df = mixed_frame(rows)
+    small = type_inference.infer_column_types(df)
+    monkeypatch.setattr(type_inference, "FAST_PATH_VALUES", 0)
+    stacked = type_inference.infer_column_types(df)
+    assert small[1:] == stacked[1:]
+    for col in df.columns:
+        assert small[0][col].equals(stacked[0][col])
+
+
+def test_arrow_date_cast_matches_pandas():
+    text = pd.Series(["2020-01-01", "2020-02-30", None, "2020-03-01"], dtype="str")
+    expected = pd.to_datetime(text, format="%Y-%m-%d", errors="coerce")
+    assert type_inference._to_datetime(text, "%Y-%m-%d").equals(expected)
+    with_times = pd.Series(["2020-01-01", "2020-01-02 03:00"], dtype="str")
+    assert type_inference._to_datetime(with_times, "%Y-%m-%d").equals(
+        pd.to_datetime(with_times, format="%Y-%m-%d", errors="coerce"))
+    stamps = pd.Series(["2020-01-01 01:02:03", "2021-06-01"], dtype="str")
+    assert type_inference._to_datetime(stamps, "ISO8601").equals(pd.to_datetime(stamps, format="ISO8601"))
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import mock_agent, models
+from utils import wire
+
+zstandard = pytest.importorskip("zstandard")
+
+PAYLOAD = {"schema_description": "Location, DataValue", "sample_rows": "Location,DataValue\nCA,1.5\nTX,2.5\n"}
+
+
+def test_decompress_round_trip_and_cap():
+    body = json.dumps(PAYLOAD).encode() * 100
+    assert wire.decompress(wire.compress(body)) == body
+    bomb = wire.compress(b"0" * (8 << 20))
+    assert len(bomb) < 4096
+    with pytest.raises(wire.BodyTooLarge):
+        wire.decompress(bomb, max_size=1 << 20)
+
+
+def test_oversized_request_is_413(monkeypatch):
+    monkeypatch.setattr(models, "MAX_REQUEST_BYTES", 1 << 16)
+    client = TestClient(mock_agent.app)
+    ok = client.post("/agent", content=wire.compress(json.dumps(PAYLOAD).encode()),
+                     headers={"content-type": wire.JSON, "content-encoding": "zstd"})
+    assert ok.status_code == 200
+    bomb = wire.compress(json.dumps(PAYLOAD | {"schema_description": "x" * (1 << 20)}).encode())
+    r = client.post("/agent", content=bomb, headers={"content-type": wire.JSON, "content-encoding": "zstd"})
+    assert r.status_code == 413
+    r = client.post("/agent", json=PAYLOAD | {"schema_description": "x" * (1 << 17)})
+    assert r.status_code == 413
@@ -0,0 +1,230 @@
+import asyncio
+import bisect
+import concurrent.futures
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional
+
+import httpx
+
+from utils.wire import JSON, MSGPACK, ZSTD_MIN_BYTES, compress, decode_response, encode_request, zstandard
+
+# Async agent client for the Streamlit UI.
+#
+# Streamlit reruns the script on every interaction, so the client owns a private event loop on
+# a daemon thread and one pooled httpx.AsyncClient that lives across reruns. Callers submit
+# requests from the script thread and get concurrent.futures.Future objects back, which lets
+# app.py render whichever backend answers first and fill in the rest as they complete.
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60]
+HEDGE_MIN_SAMPLES = 5
+
+
+def is_usable(output: Optional[Dict[str, Any]]) -> bool:
+    return isinstance(output, dict) and bool(output.get("summary") or output.get("chart_specs"))
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    # "parse;dur=1.2, infer;dur=5.0, total;dur=7.1" -> {"parse": 1.2, "infer": 5.0, "total": 7.1} (ms)
+    out = {}
+    for entry in filter(None, (e.strip() for e in (header or "").split(","))):
+        name, *params = (p.strip() for p in entry.split(";"))
+        for param in params:
+            key, _, value = param.partition("=")
+            if key == "dur":
+                try:
+                    out[name] = float(value)
+                except ValueError:
+                    pass
+    return out
+
+
+class AgentClient:
+    def __init__(self, max_connections=20, history=500):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="agent-client", daemon=True)
+        self._thread.start()
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client = self._run(self._make_client(limits))
+        self._sync_client = httpx.Client(limits=limits)  # for SSE, consumed on the script thread
+        self._latencies = defaultdict(lambda: deque(maxlen=history))
+        self._timings: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    async def _make_client(self, limits):
+        return httpx.AsyncClient(limits=limits)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    # --- Latency tracking ---
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._latencies[name].append(seconds)
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(name, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def histograms(self) -> Dict[str, Dict[str, int]]:
+        # {backend: {"<=0.5s": n, ...}} using fixed buckets so backends are comparable
+        out = {}
+        with self._lock:
+            items = {k: list(v) for k, v in self._latencies.items()}
+        for name, samples in items.items():
+            counts = [0] * (len(LATENCY_BUCKETS) + 1)
+            for s in samples:
+                counts[bisect.bisect_left(LATENCY_BUCKETS, s)] += 1
+            labels = [f"<={b}s" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+            out[name] = dict(zip(labels, counts))
+        return out
+
+    def record_timing(self, name: str, timing: Dict[str, Any]):
+        with self._lock:
+            self._timings[name] = timing
+
+    def last_timings(self) -> Dict[str, Dict[str, Any]]:
+        # Most recent request per backend: client-side phases plus the server's Server-Timing stages
+        with self._lock:
+            return dict(self._timings)
+
+    def hedge_delay(self, name: str, q=0.95) -> Optional[float]:
+        with self._lock:
+            enough = len(self._latencies.get(name, ())) >= HEDGE_MIN_SAMPLES
+        return self.percentile(name, q) if enough else None
+
+    # --- Requests ---
+    async def _post(self, url: str, body: bytes, fmt: str, timeout: float, encoding: Optional[str] = None):
+        # Returns (output, timing); timing splits the client's view into wait/download/decode.
+        # httpx undoes Content-Encoding (zstd when `zstandard` is installed) in aread().
+        t0 = time.perf_counter()
+        headers = {"Content-Type": fmt, "Accept": fmt}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        async with self._client.stream("POST", url, content=body, headers=headers, timeout=timeout) as resp:
+            t_headers = time.perf_counter()
+            resp.raise_for_status()
+            body = await resp.aread()
+        t_body = time.perf_counter()
+        output = decode_response(body, resp.headers.get("content-type"))
+        t_done = time.perf_counter()
+        return output, {
+            "wait_ms": (t_headers - t0) * 1000,
+            "download_ms": (t_body - t_headers) * 1000,
+            "decode_ms": (t_done - t_body) * 1000,
+            "bytes": len(body),
+            "wire_bytes": resp.num_bytes_downloaded,
+            "format": fmt,
+            "server": parse_server_timing(resp.headers.get("server-timing")),
+        }
+
+    async def _hedged_post(self, url, body, fmt, encoding, timeout, hedge_after):
+        # Send a duplicate once the primary is slower than `hedge_after`; first success wins.
+        primary = asyncio.ensure_future(self._post(url, body, fmt, timeout, encoding))
+        if hedge_after is None or hedge_after >= timeout:
+            return await primary, False
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            return primary.result(), False
+        backup = asyncio.ensure_future(self._post(url, body, fmt, max(timeout - hedge_after, 0.1), encoding))
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result(), task is backup
+                error = task.exception()
+        raise error
+
+    async def _call(self, name, url, payload, timeout, hedge, fmt=JSON):
+        t0 = time.perf_counter()
+        result = {"backend": name, "url": url, "ok": False, "output": None, "error": None, "hedged": False}
+        try:
+            hedge_after = self.hedge_delay(name) if hedge else None
+            body, encoding = encode_request(payload, fmt), None  # once, shared by a hedged duplicate
+            if fmt == MSGPACK and len(body) >= ZSTD_MIN_BYTES and zstandard is not None:
+                body, encoding = compress(body), "zstd"  # binary formats only reach our backends
+            (result["output"], result["timing"]), result["hedged"] = await self._hedged_post(
+                url, body, fmt, encoding, timeout, hedge_after
+            )
+            result["ok"] = True
+            self.record_timing(name, result["timing"])
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency"] = time.perf_counter() - t0
+        if result["ok"]:
+            self.record(name, result["latency"])
+        return result
+
+    def submit(self, targets: Dict[str, str], payload: Dict[str, Any],
+               timeouts: Optional[Dict[str, float]] = None, default_timeout=60.0,
+               hedge=False, fmt=JSON, formats: Optional[Dict[str, str]] = None) -> Dict[str, concurrent.futures.Future]:
+        # targets: {backend name: url}. Returns {backend name: Future[result dict]}.
+        # fmt is the wire format (utils.wire.JSON / MSGPACK / ARROW) for request and response;
+        # `formats` overrides it per backend (e.g. JSON for a target that only speaks JSON).
+        timeouts, formats = timeouts or {}, formats or {}
+        return {
+            name: asyncio.run_coroutine_threadsafe(
+                self._call(name, url, payload, timeouts.get(name, default_timeout), hedge, formats.get(name, fmt)),
+                self._loop,
+            )
+            for name, url in targets.items()
+        }
+
+    def post(self, url: str, payload: Dict[str, Any], timeout=60.0, name=None, fmt=JSON) -> Dict[str, Any]:
+        # Blocking single request through the shared pool (raises on failure)
+        name = name or url
+        result = self.submit({name: url}, payload, default_timeout=timeout, fmt=fmt)[name].result()
+        if not result["ok"]:
+            raise RuntimeError(result["error"])
+        return result["output"]
+
+    # --- Jobs (POST {url}/jobs, GET {url}/jobs/{id}; see backend/jobs.py) ---
+    async def _job_request(self, method: str, url: str, timeout: float, **kwargs) -> Dict[str, Any]:
+        resp = await self._client.request(method, url, timeout=timeout, **kwargs)
+        resp.raise_for_status()
+        return resp.json()
+
+    def submit_job(self, url: str, payload: Dict[str, Any], fmt=JSON, timeout=10.0) -> Dict[str, Any]:
+        # Returns the job document ({"id", "status", ...}) as soon as the backend has queued it.
+        # Raises httpx.HTTPStatusError on 429 (queue full) so the caller can back off.
+        body = encode_request(payload, fmt)
+        return self._run(self._job_request("POST", url.rstrip("/") + "/jobs", timeout, content=body,
+                                           headers={"Content-Type": fmt}))
+
+    def job(self, url: str, job_id: str, wait=0.0, timeout=10.0) -> Dict[str, Any]:
+        # Long-polls up to `wait` seconds for the job to finish; returns its document either way
+        return self._run(self._job_request("GET", f"{url.rstrip('/')}/jobs/{job_id}", wait + timeout,
+                                           params={"wait": wait}))
+
+    def stream_events(self, url: str, payload: Dict[str, Any], timeout=60.0):
+        # Yields (event, data) from a Server-Sent Events endpoint such as /agent/stream
+        event, data = "message", []
+        t0 = time.perf_counter()
+        timing = {"bytes": 0}
+        with self._sync_client.stream("POST", url, json=payload, timeout=timeout,
+                                      headers={"Accept": "text/event-stream"}) as resp:
+            timing["wait_ms"] = (time.perf_counter() - t0) * 1000
+            timing["server"] = parse_server_timing(resp.headers.get("server-timing"))
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                timing["bytes"] += len(line) + 1
+                if not line:
+                    if data:
+                        timing.setdefault("first_event_ms", (time.perf_counter() - t0) * 1000)
+                        timing["stream_ms"] = (time.perf_counter() - t0) * 1000
+                        self.record_timing(url, timing)
+                        yield event, json.loads("\n".join(data))
+                    event, data = "message", []
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].lstrip())
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Vectorized pre-aggregation for charts. Everything here returns a small DataFrame whose size
+# depends on the number of groups/bins/buckets, never on the number of input rows, so it can
+# be shipped to the browser (or embedded in a Vega-Lite spec) regardless of dataset size.
+
+# Candidate time buckets, finest first; aggregate_over_time picks the finest that fits.
+# Every bucket is labelled by its start, weeks by their Monday (as DuckDB's date_trunc does).
+TIME_FREQS = [
+    ("s", pd.Timedelta(seconds=1)),
+    ("min", pd.Timedelta(minutes=1)),
+    ("h", pd.Timedelta(hours=1)),
+    ("D", pd.Timedelta(days=1)),
+    ("W-MON", pd.Timedelta(weeks=1)),
+    ("MS", pd.Timedelta(days=31)),
+    ("QS", pd.Timedelta(days=92)),
+    ("YS", pd.Timedelta(days=366)),
+]
+
+
+def aggregate_by_category(df, category_col, value_col, agg="mean", top_n=10):
+    grouped = df.groupby(category_col, observed=True, sort=False)[value_col].agg(agg)
+    return grouped.nlargest(top_n).reset_index() if top_n else grouped.reset_index()
+
+
+def choose_time_freq(times: pd.Series, max_points=200):
+    lo, hi = times.min(), times.max()
+    if pd.isna(lo) or lo == hi:
+        return None
+    span = hi - lo
+    for freq, width in TIME_FREQS:
+        if span / width <= max_points:
+            return freq
+    return TIME_FREQS[-1][0]
+
+
+def aggregate_over_time(df, time_col, value_col, agg="mean", max_points=200):
+    # Group by raw timestamp when that is already small; otherwise bucket to a calendar
+    # frequency chosen so that the result has at most ~max_points rows.
+    data = df[[time_col, value_col]].dropna(subset=[time_col])
+    if data[time_col].nunique() <= max_points:
+        return data.groupby(time_col, as_index=False)[value_col].agg(agg)
+    freq = choose_time_freq(data[time_col], max_points)
+    out = data.set_index(time_col)[value_col].resample(freq, closed="left", label="left").agg(agg)
+    return out.dropna().reset_index()
+
+
+def histogram_table(values, bins=30):
+    arr = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    arr = arr[np.isfinite(arr)]
+    if arr.size == 0:
+        return pd.DataFrame({"bin_start": [], "bin_end": [], "count": []})
+    counts, edges = np.histogram(arr, bins=bins)
+    return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": counts})
+
+
+def top_n_with_other(df, category_col, value_col, agg="mean", top_n=10, other_label="Other"):
+    # Top-N groups plus one bucket aggregating every remaining row with the same function
+    grouped = df.groupby(category_col, observed=True, sort=False)[value_col].agg(agg)
+    top = grouped.nlargest(top_n)
+    out = top.reset_index()
+    if len(grouped) > top_n:
+        rest = df.loc[~df[category_col].isin(top.index), value_col]
+        out[category_col] = out[category_col].astype(object)
+        out.loc[len(out)] = [other_label, rest.agg(agg)]
+    return out
+
+
+def scatter_sample(df, x_col, y_col, max_points=2000, seed=0):
+    # Rows with both values, uniformly sampled down to max_points
+    data = df[[x_col, y_col]].dropna()
+    return data.sample(max_points, random_state=seed) if len(data) > max_points else data
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets downsampling: keeps visual shape (peaks/troughs) of a
+    # line with n_out points. x must be sorted and numeric; returns selected indices.
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:nxt_end].mean() if nxt_end > end else x[-1]
+        avg_y = y[end:nxt_end].mean() if nxt_end > end else y[-1]
+        xs, ys = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (ys - y[a]) - (x[a] - xs) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def downsample_series(df, x_col, y_col, max_points=1000):
+    # LTTB over a frame sorted by x; datetimes are compared as int64 nanoseconds
+    if len(df) <= max_points:
+        return df
+    data = df.sort_values(x_col).dropna(subset=[y_col])
+    x = data[x_col]
+    xs = x.astype("int64") if pd.api.types.is_datetime64_any_dtype(x) else x
+    return data.iloc[lttb(xs.to_numpy(), data[y_col].to_numpy(), max_points)]
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Load-time dtype optimization for session datasets.
+#
+# Many Streamlit sessions share one box, so the resident size of each typed frame matters:
+#   - repeated strings (state names, topics) become `category`: 1-2 byte codes plus one copy
+#     of each distinct value instead of one string per row;
+#   - integers shrink to the smallest signed type that holds their range;
+#   - floats become float32 only when that is lossless, so the CSV sample the agent sees and the
+#     summary stats are unchanged;
+#   - other text stays, or becomes pyarrow-backed strings when it is still `object`.
+# pandas' copy-on-write means the converted frame shares every untouched column with the input.
+
+CATEGORY_MAX_RATIO = 0.5   # distinct / non-null at or below this -> category
+CATEGORY_MIN_ROWS = 50     # tiny frames gain nothing
+ARROW_STRINGS = os.getenv("DATA_AGENT_ARROW_STRINGS", "1") != "0"
+
+
+def frame_memory(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def _is_text(ser: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(ser) or pd.api.types.is_string_dtype(ser)
+
+
+def _int_target(lo, hi):
+    # Smallest signed integer dtype holding [lo, hi]; signed so that subtracting stays safe
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype)
+    return None
+
+
+def optimize_dtypes(df: pd.DataFrame, skip=(), category_max_ratio=CATEGORY_MAX_RATIO, arrow_strings=ARROW_STRINGS):
+    # -> (optimized frame, {"before": bytes, "after": bytes}); columns in `skip` keep their dtype.
+    # Numeric columns are checked block-wise (one 2-D pass for all float64 columns), and every
+    # conversion is applied in one astype call, which matters for frames with thousands of columns.
+    before = frame_memory(df)
+    targets = {}
+    cols = [col for col in df.columns if col not in skip]
+    ints = [col for col in cols if isinstance(df[col].dtype, np.dtype) and df[col].dtype.kind in "iu"]
+    if ints and len(df):
+        lo, hi = df[ints].min(), df[ints].max()
+        for col in ints:
+            target = _int_target(int(lo[col]), int(hi[col]))
+            if target is not None and target.itemsize < df[col].dtype.itemsize:
+                targets[col] = target
+    floats = [col for col in cols if df[col].dtype == np.float64]
+    if floats:
+        values = df[floats].to_numpy()
+        back = values.astype(np.float32).astype(np.float64)
+        lossless = ((values == back) | np.isnan(values)).all(axis=0)
+        targets.update({col: np.dtype(np.float32) for col, ok in zip(floats, lossless) if ok})
+    for col in cols:
+        ser = df[col]
+        if isinstance(ser.dtype, pd.CategoricalDtype) or not _is_text(ser):
+            continue
+        non_null = int(ser.notna().sum())
+        if len(ser) >= CATEGORY_MIN_ROWS and non_null and ser.nunique(dropna=True) <= non_null * category_max_ratio:
+            targets[col] = "category"
+        elif arrow_strings and pd.api.types.is_object_dtype(ser) and pd.api.types.infer_dtype(ser) == "string":
+            try:
+                pd.StringDtype("pyarrow")
+            except ImportError:
+                continue
+            targets[col] = "string[pyarrow]"
+    out = df.astype(targets) if targets else df.copy(deep=False)
+    return out, {"before": before, "after": frame_memory(out)}
+
+
+def logical_dtypes(df: pd.DataFrame) -> pd.Series:
+    # The dtypes a CSV parse gives, for an optimized frame: what schemas and prompts should show
+    def logical(dtype):
+        if isinstance(dtype, pd.CategoricalDtype):
+            return logical(dtype.categories.dtype)
+        if isinstance(dtype, np.dtype) and dtype.kind == "i":
+            return np.dtype(np.int64)
+        if dtype == np.float32:
+            return np.dtype(np.float64)
+        if isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow" and dtype.na_value is pd.NA:
+            return np.dtype(object)  # "string[pyarrow]" is only ever made from object text
+        return dtype
+    return df.dtypes.map(logical)
+
+
+def align_dtypes(head: pd.DataFrame, tail: pd.DataFrame):
+    # Make `tail` concatenate onto `head` without widening optimized columns back to text:
+    # categoricals get the union of both category sets (head's codes are unchanged).
+    # Returns (head, tail) ready for pd.concat.
+    head, tail = head.copy(deep=False), tail.copy(deep=False)
+    for col in head.columns:
+        if col not in tail.columns or not isinstance(head[col].dtype, pd.CategoricalDtype):
+            continue
+        current = head[col].cat.categories
+        new = pd.Index(tail[col].dropna().unique())
+        categories = current.append(new[~new.isin(current)])
+        head[col] = head[col].cat.set_categories(categories)
+        tail[col] = pd.Categorical(tail[col], categories=categories)
+    return head, tail
+
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
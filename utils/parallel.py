@@ -0,0 +1,38 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Column-parallel helpers for profiling wide frames.
+#
+# Profiling work is per column (regex passes over text, sorts of numeric blocks), and the heavy
+# parts run in numpy/pyarrow kernels that release the GIL, so a thread pool scales with cores
+# without pickling frames to worker processes. Narrow frames stay serial: below
+# PARALLEL_MIN_COLUMNS the pool costs more than it saves.
+
+PROFILE_WORKERS = int(os.getenv("DATA_AGENT_PROFILE_WORKERS", "0")) or min(8, os.cpu_count() or 1)
+PARALLEL_MIN_COLUMNS = 32
+BLOCK_CELLS = 1 << 22  # values per numeric block handed to one task (32 MB as float64)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=PROFILE_WORKERS, thread_name_prefix="profile")
+        return _pool
+
+
+def chunks(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def map_columns(fn, items, min_items=PARALLEL_MIN_COLUMNS):
+    # list(map(fn, items)), on the profiling pool when there are enough items to pay for it
+    items = list(items)
+    if PROFILE_WORKERS <= 1 or len(items) < min_items:
+        return [fn(item) for item in items]
+    return list(_get_pool().map(fn, items))
@@ -0,0 +1,223 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Chart recommendation: which columns are worth charting, instead of always the first
+# time/categorical/numeric column.
+#
+# Every candidate pair is scored on a uniform row sample with a few matrix passes over all
+# numeric columns at once:
+#   (numeric, numeric)      |Pearson r| from one correlation matrix; near-duplicates (|r| ~ 1) are
+#                           discounted because a scatter of two copies of a measure says nothing;
+#   (categorical, numeric)  adjusted eta^2 (share of variance between groups, the effect size of
+#                           the one-way ANOVA F-test), from group sums via a one-hot matmul;
+#   (datetime, numeric)     adjusted eta^2 over equal-count time bins (level shifts, seasonality),
+#                           or the linear trend R^2 of the bin means if higher once weighted by it.
+# Scores are in [0, 1] and comparable across kinds: quality * (prior + (1 - prior) * signal),
+# where quality covers coverage, constant and identifier-like columns, and the per-kind prior
+# keeps a time series or group comparison ahead of a bare histogram when the sample is too small
+# to show any effect. Passes run cheapest first and stop once the latency budget
+# is spent, so very wide frames still return their best candidates so far. The top-k picks are
+# chosen greedily with a penalty for repeating a chart kind or a column.
+
+SAMPLE_ROWS = 20_000
+SAMPLE_CELLS = 2_000_000  # fewer rows for wide frames: sample rows x numeric columns
+BUDGET_MS = float(os.getenv("DATA_AGENT_RECOMMEND_BUDGET_MS", "150"))
+TOP_K = 3
+MAX_NUMERIC = 64       # most useful numeric columns kept for pair scoring (pairs grow as p^2)
+MAX_CATEGORICAL = 16
+MAX_TIME = 4
+MAX_GROUPS = 50        # less frequent categories are pooled into one group
+MAX_CATEGORY_RATIO = 0.5  # more distinct values per non-null row than this: an identifier
+MIN_ID_ROWS = 50          # ...once there are enough rows to tell
+TIME_BINS = 40
+REDUNDANT_CORR = 0.995
+KIND_PRIORS = {"line": 0.3, "bar": 0.25, "scatter": 0.0, "histogram": 0.15}
+REPEAT_PENALTY = 0.5   # per already-picked chart sharing the kind or a column
+
+
+@dataclass
+class Recommendation:
+    kind: str  # "line" | "bar" | "scatter" | "histogram"
+    x: str
+    y: Optional[str]
+    score: float
+    reason: str
+
+
+def _score(kind, signal, quality):
+    prior = KIND_PRIORS[kind]
+    return float(quality * (prior + (1 - prior) * signal))
+
+
+def _sample(df, rows=SAMPLE_ROWS, seed=0):
+    return df if len(df) <= rows else df.sample(rows, random_state=seed)
+
+
+def _numeric_profile(X):
+    # X: n x p float64 with NaN. -> (mask, centered values (0 where missing), std, quality)
+    n = len(X)
+    mask = ~np.isnan(X)
+    count = mask.sum(axis=0)
+    mean = np.where(count > 0, np.nansum(X, axis=0) / np.maximum(count, 1), 0.0)
+    centered = np.where(mask, X - mean, 0.0)
+    std = np.sqrt((centered ** 2).sum(axis=0) / np.maximum(count - 1, 1))
+    s = np.sort(X, axis=0)
+    distinct = ((s[1:] != s[:-1]) & ~np.isnan(s[1:])).sum(axis=0) + (count > 0)
+    integral = np.all(np.where(mask, X == np.round(X), True), axis=0)
+    id_like = integral & (distinct == count) & (count >= MIN_ID_ROWS)
+    quality = (count / max(n, 1)) * (std > 0) * np.where(id_like, 0.2, 1.0)
+    return mask, centered, std, quality
+
+
+def _group_effect(codes, k, centered, mask):
+    # Adjusted eta^2 and F of each numeric column across k groups (codes -1 = no group)
+    onehot = (codes[:, None] == np.arange(k)).astype(np.float64)
+    w = mask.astype(np.float64)
+    counts = onehot.T @ w                         # k x p
+    sums = onehot.T @ centered
+    total_n = counts.sum(axis=0)
+    total = sums.sum(axis=0)
+    ss_between = (sums ** 2 / np.maximum(counts, 1)).sum(axis=0) - total ** 2 / np.maximum(total_n, 1)
+    ss_total = (onehot.T @ centered ** 2).sum(axis=0) - total ** 2 / np.maximum(total_n, 1)
+    groups = (counts > 0).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eta = np.where(ss_total > 0, ss_between / ss_total, 0.0)
+        df_within = np.maximum(total_n - groups, 1)
+        adjusted = 1 - (1 - eta) * (total_n - 1) / df_within
+        f_stat = np.where(ss_total > ss_between, (ss_between / np.maximum(groups - 1, 1)) /
+                          ((ss_total - ss_between) / df_within), np.inf)
+    valid = (groups >= 2) & (total_n > groups)
+    return np.where(valid, np.clip(adjusted, 0, 1), 0.0), np.where(valid, f_stat, 0.0)
+
+
+def _time_scores(tv, centered, mask):
+    # tv: int64 ns with the NaT rows already removed from every input
+    order = np.argsort(tv, kind="stable")
+    distinct = len(np.unique(tv))
+    if distinct < 3:
+        return None
+    bins = min(TIME_BINS, distinct)
+    codes = np.empty(len(tv), dtype=np.int64)
+    codes[order] = np.arange(len(tv)) * bins // len(tv)
+    eta, _ = _group_effect(codes, bins, centered, mask)
+    # Weighted linear fit of bin means against bin mean time, all columns at once
+    onehot = (codes[:, None] == np.arange(bins)).astype(np.float64)
+    w = onehot.T @ mask.astype(np.float64)       # bins x p
+    means = (onehot.T @ centered) / np.maximum(w, 1)
+    t = (onehot.T @ (tv - tv.min()).astype(np.float64)) / np.maximum(onehot.sum(axis=0), 1)
+    t = (t - t.mean()) / (t.std() or 1.0)
+    wt = w / np.maximum(w.sum(axis=0), 1)
+    tm = (wt * t[:, None]).sum(axis=0)
+    ym = (wt * means).sum(axis=0)
+    cov = (wt * (t[:, None] - tm) * (means - ym)).sum(axis=0)
+    var_t = (wt * (t[:, None] - tm) ** 2).sum(axis=0)
+    var_y = (wt * (means - ym) ** 2).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend = np.where((var_t > 0) & (var_y > 0), cov ** 2 / (var_t * var_y), 0.0)
+    # The fit is over bin means, so weight it by how much of the variance the bins carry. With
+    # one row per bin (a few dozen dates) there is no within-bin variance to compare: eta is 0
+    # and the trend stands alone.
+    singletons = (w <= 1).all(axis=0)
+    return np.where(singletons, trend, np.maximum(trend * np.sqrt(eta), eta)), trend, eta, singletons
+
+
+def score_candidates(df, nums, cats, times, budget_ms=BUDGET_MS, sample_rows=SAMPLE_ROWS) -> List[Recommendation]:
+    # All scored candidates, best first
+    t0 = time.perf_counter()
+
+    def spent():
+        return (time.perf_counter() - t0) * 1000 > budget_ms
+
+    nums = [c for c in nums if c in df.columns]
+    sample = _sample(df, max(1000, min(sample_rows, SAMPLE_CELLS // max(len(nums), 1))))
+    if not nums or sample.empty:
+        return []
+    X = sample[nums].to_numpy(dtype=np.float64, na_value=np.nan)
+    mask, centered, std, quality = _numeric_profile(X)
+    if len(nums) > MAX_NUMERIC:
+        keep = np.sort(np.argsort(-quality, kind="stable")[:MAX_NUMERIC])
+        nums, X, mask, centered, std, quality = ([nums[i] for i in keep], X[:, keep], mask[:, keep],
+                                                 centered[:, keep], std[keep], quality[keep])
+    useful = quality > 0
+    out = [Recommendation("histogram", col, None, _score("histogram", 0.0, q), "distribution")
+           for col, q in zip(nums, quality) if q > 0]
+
+    for tcol in times[:MAX_TIME]:
+        if spent():
+            break
+        ser = sample[tcol]
+        rows = ser.notna().to_numpy()
+        if rows.sum() < 3:
+            continue
+        tv = ser[rows].astype("int64").to_numpy()
+        result = _time_scores(tv, centered[rows], mask[rows])
+        if result is None:
+            continue
+        score, trend, eta, singletons = result
+        q_time = rows.mean()
+        for j, col in enumerate(nums):
+            if useful[j]:
+                spread = "one row per time bin" if singletons[j] else f"variance across time bins {eta[j]:.2f}"
+                out.append(Recommendation("line", tcol, col, _score("line", score[j], quality[j] * q_time),
+                                          f"trend R² {trend[j]:.2f}, {spread}"))
+
+    for ccol in cats[:MAX_CATEGORICAL]:
+        if spent():
+            break
+        codes, uniques = pd.factorize(sample[ccol])
+        non_null = int((codes >= 0).sum())
+        k = len(uniques)
+        if k < 2 or (non_null >= MIN_ID_ROWS and k > MAX_CATEGORY_RATIO * non_null):
+            continue
+        if k > MAX_GROUPS:  # keep the most frequent groups, pool the rest
+            rank = np.empty(k, dtype=np.int64)
+            rank[np.argsort(-np.bincount(codes[codes >= 0], minlength=k), kind="stable")] = np.arange(k)
+            codes = np.where(codes >= 0, np.minimum(rank[np.maximum(codes, 0)], MAX_GROUPS), -1)
+            k = MAX_GROUPS + 1
+        eta, f_stat = _group_effect(codes, k, centered, mask)
+        q_cat = (non_null / len(sample)) * min(1.0, 30 / k)
+        for j, col in enumerate(nums):
+            if useful[j]:
+                out.append(Recommendation("bar", ccol, col, _score("bar", eta[j], quality[j] * q_cat),
+                                          f"between-group share {eta[j]:.2f} (F = {f_stat[j]:.3g})"))
+
+    if len(nums) > 1 and not spent():
+        w = mask.astype(np.float64)
+        pairs = w.T @ w
+        z = centered / np.where(std > 0, std, 1.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = np.clip(np.where(pairs > 2, (z.T @ z) / np.maximum(pairs - 1, 1), 0.0), -1, 1)
+            # |r| adjusted for the pair count like R^2, so a few points don't look correlated by chance
+            strength = np.sqrt(np.clip(1 - (1 - corr ** 2) * (pairs - 1) / np.maximum(pairs - 2, 1), 0, 1))
+        strength *= np.where(np.abs(corr) >= REDUNDANT_CORR, 0.25, 1.0)
+        pair_quality = np.sqrt(np.outer(quality, quality))
+        ii, jj = np.triu_indices(len(nums), k=1)
+        for i, j in zip(ii, jj):
+            if strength[i, j] > 0 and pair_quality[i, j] > 0:
+                out.append(Recommendation("scatter", nums[i], nums[j], _score("scatter", strength[i, j], pair_quality[i, j]),
+                                          f"correlation r = {corr[i, j]:.2f}"))
+
+    out.sort(key=lambda r: r.score, reverse=True)
+    return out
+
+
+def recommend_charts(df, nums, cats, times, k=TOP_K, budget_ms=BUDGET_MS,
+                     sample_rows=SAMPLE_ROWS) -> List[Recommendation]:
+    # Top-k charts: greedy over the scored candidates, discounting repeated kinds and columns
+    candidates = score_candidates(df, nums, cats, times, budget_ms=budget_ms, sample_rows=sample_rows)
+    picks = []
+    while candidates and len(picks) < k:
+        def adjusted(r):
+            repeats = sum((p.kind == r.kind) + len({p.x, p.y} & {r.x, r.y} - {None}) for p in picks)
+            return r.score * REPEAT_PENALTY ** repeats
+        best = max(candidates, key=adjusted)
+        if adjusted(best) <= 0:
+            break
+        picks.append(best)
+        candidates.remove(best)
+    return picks
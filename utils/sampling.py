@@ -0,0 +1,229 @@
+import numpy as np
+import pandas as pd
+
+from utils.parallel import BLOCK_CELLS, PARALLEL_MIN_COLUMNS, chunks, map_columns
+
+# Representative sample_rows and per-column summary stats for the agent prompt.
+#
+# df.head(10) shows only the start of the file: a sorted file gives one time period, and a
+# skewed categorical may show one category. Instead, candidate rows are ranked by what they
+# add: the extremes of the time range, one row per top category, and the strongest numeric
+# outliers, then a uniform random fill. Rows are kept in that order until a token budget is
+# spent. Summary stats (quantiles, cardinality, top-k) are computed with frame-level calls
+# rather than a Python loop per statistic, and go into the schema description.
+#
+# Wide frames (thousands of numeric columns, e.g. one column per sample) are profiled in
+# blocks: one column-wise sort of a 2-D float array yields null counts, distinct counts and
+# quantiles together, and blocks run on the profiling thread pool. Their schema description
+# collapses runs of same-dtype numeric columns into one line per group, and the sample rows
+# carry only the first few columns of each group, so the prompt does not grow with the width.
+
+QUANTILES = [0.0, 0.05, 0.25, 0.5, 0.75, 0.95, 1.0]
+QUANTILE_LABELS = ["min", "p5", "p25", "p50", "p75", "p95", "max"]
+SAMPLE_TOKEN_BUDGET = 600  # ~4 characters per token for CSV text
+CHARS_PER_TOKEN = 4
+MIN_SAMPLE_ROWS = 2
+MAX_SAMPLE_ROWS = 20
+TOP_K = 5
+MAX_STRATA = 8
+OUTLIER_FENCE = 2.0  # |x - median| > 2 IQR, i.e. Tukey's 1.5 IQR fence for symmetric data
+WIDE_COLUMNS = 64        # frames wider than this get grouped schema lines
+GROUP_MIN_COLUMNS = 8    # smallest run of same-dtype numeric columns worth a group line
+SAMPLE_GROUP_COLUMNS = 4  # columns of each group kept in the sample rows
+
+
+def _block_stats(values):
+    # values: 2-D float64 (rows x columns, rows > 0) -> (non-null counts, distinct counts, quantiles
+    # with one row per QUANTILES entry). NaN sorts last, so column j's values are s[:count[j], j];
+    # quantiles interpolate like numpy/pandas "linear".
+    s = np.sort(values, axis=0)
+    valid = ~np.isnan(s)
+    count = valid.sum(axis=0)
+    first = valid.copy()
+    first[1:] &= s[1:] != s[:-1]
+    last = np.maximum(count - 1, 0)
+    pos = np.outer(QUANTILES, last)
+    lo = np.floor(pos).astype(np.int64)
+    t = pos - lo
+    cols = np.arange(s.shape[1])
+    a, b = s[lo, cols], s[np.minimum(lo + 1, last), cols]
+    q = np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
+    q[:, count == 0] = np.nan
+    return count, first.sum(axis=0), q
+
+
+def _numeric_block(df, cols):
+    return cols, _block_stats(df[cols].to_numpy(dtype=np.float64, na_value=np.nan))
+
+
+def summary_stats(df, nums, cats, times, top_k=TOP_K):
+    # {col: {"missing", "distinct", and "quantiles" | "top" | "range" by role}}
+    n = len(df)
+    stats = {}
+    # int/float64 columns of wide frames go through _block_stats (float32 quantiles would
+    # differ from pandas, which interpolates in float32); the rest column by column
+    block = [c for c in nums if df[c].dtype.kind in "iu" or df[c].dtype == np.float64] if len(nums) >= PARALLEL_MIN_COLUMNS and n else []
+    per_block = max(1, BLOCK_CELLS // n) if n else 1
+    for cols, (count, distinct, q) in map_columns(lambda cols: _numeric_block(df, cols), chunks(block, per_block),
+                                                  min_items=2):
+        for j, col in enumerate(cols):
+            stats[col] = {"missing": (n - int(count[j])) / n * 100.0, "distinct": int(distinct[j]),
+                          "quantiles": dict(zip(QUANTILE_LABELS, q[:, j].tolist()))}
+    rest = [col for col in df.columns if col not in stats]
+    nulls = df[rest].isna().sum()
+    distinct = dict(zip(rest, map_columns(lambda col: df[col].nunique(dropna=True), rest)))
+    for col in rest:
+        stats[col] = {"missing": (float(nulls[col]) / n * 100.0) if n else 0.0, "distinct": int(distinct[col])}
+    stats = {col: stats[col] for col in df.columns}
+    rest_nums = [col for col in nums if "quantiles" not in stats[col]]
+    if rest_nums and n:
+        q = df[rest_nums].quantile(QUANTILES)
+        for col in rest_nums:
+            stats[col]["quantiles"] = dict(zip(QUANTILE_LABELS, q[col].tolist()))
+    if times and n:
+        lo, hi = df[times].min(), df[times].max()
+        for col in times:
+            stats[col]["range"] = (lo[col], hi[col])
+    def top(col):
+        counts = df[col].value_counts(dropna=True)
+        counts = counts[counts > 0].head(top_k)  # categoricals also count unused categories
+        return list(zip(counts.index.tolist(), counts.tolist()))
+    for col, values in zip(cats, map_columns(top, cats)):
+        stats[col]["top"] = values
+    return stats
+
+
+def _fmt(value):
+    if isinstance(value, (float, np.floating)):
+        return "nan" if np.isnan(value) else f"{value:.4g}"
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat() if value != value.normalize() else value.date().isoformat()
+    return str(value)
+
+
+def describe_column(col, dtype, col_stats):
+    parts = [f"{col} ({dtype})", f"Missing: {col_stats['missing']:.1f}%", f"Distinct: {col_stats['distinct']}"]
+    if "quantiles" in col_stats:
+        q = col_stats["quantiles"]
+        parts.append(f"Quantiles ({'/'.join(q)}): {' / '.join(_fmt(v) for v in q.values())}")
+    if "range" in col_stats:
+        lo, hi = col_stats["range"]
+        parts.append(f"Range: {_fmt(lo)} to {_fmt(hi)}")
+    if col_stats.get("top"):
+        parts.append("Top: " + ", ".join(f"{_fmt(v)} ({n})" for v, n in col_stats["top"]))
+    return " - ".join(parts)
+
+
+def column_groups(columns, dtypes, nums, wide_columns=WIDE_COLUMNS, min_group=GROUP_MIN_COLUMNS):
+    # [[column], [column, column, ...], ...] in frame order. In frames wider than wide_columns,
+    # numeric columns sharing a dtype form one group (placed at its first column) when there are
+    # at least min_group of them; every other column is a group of one.
+    if len(columns) <= wide_columns:
+        return [[col] for col in columns]
+    numeric, by_dtype = set(nums), {}
+    for col in columns:
+        if col in numeric:
+            by_dtype.setdefault(str(dtypes[col]), []).append(col)
+    grouped = {col: members for members in by_dtype.values() if len(members) >= min_group for col in members}
+    return [grouped.get(col, [col]) for col in columns if grouped.get(col, [col])[0] == col]
+
+
+def describe_group(cols, dtype, stats):
+    missing = [stats[col]["missing"] for col in cols]
+    distinct = [stats[col]["distinct"] for col in cols]
+    parts = [f"{cols[0]} … {cols[-1]} ({len(cols):,} {dtype} columns)",
+             f"Missing: {sum(missing) / len(missing):.1f}% avg, {max(missing):.1f}% max",
+             f"Distinct: {min(distinct)} to {max(distinct)}"]
+    quantiles = pd.DataFrame([stats[col]["quantiles"] for col in cols if "quantiles" in stats[col]])
+    if not quantiles.empty:
+        median = quantiles.median()
+        parts.append(f"Median quantiles ({'/'.join(median.index)}): {' / '.join(_fmt(v) for v in median)}")
+        parts.append(f"p50 across columns: {_fmt(quantiles['p50'].min())} to {_fmt(quantiles['p50'].max())}")
+    return " - ".join(parts)
+
+
+def describe_columns(columns, dtypes, stats, nums):
+    # Schema lines for a frame (one per column, or per group for wide frames) and the groups
+    groups = column_groups(columns, dtypes, nums)
+    lines = [describe_column(g[0], dtypes[g[0]], stats[g[0]]) if len(g) == 1 else describe_group(g, dtypes[g[0]], stats)
+             for g in groups]
+    if len(groups) < len(columns):
+        lines.insert(0, f"{len(columns):,} columns: runs of same-dtype numeric columns are summarized per group; "
+                        f"sample rows show the first {SAMPLE_GROUP_COLUMNS} of each group.")
+    return lines, groups
+
+
+def sample_columns(groups, per_group=SAMPLE_GROUP_COLUMNS):
+    return [col for g in groups for col in g[:per_group]]
+
+
+def _stratum_column(df, cats):
+    # The first categorical with a useful number of groups is what charts group by
+    for col in cats:
+        k = df[col].nunique(dropna=True)
+        if 1 < k <= 1000:
+            return col
+    return None
+
+
+def candidate_rows(df, nums, cats, times, seed=0, max_rows=MAX_SAMPLE_ROWS, stats=None):
+    # Row labels in priority order (duplicates removed, first occurrence wins). Quartiles are
+    # taken from summary_stats output when given instead of being recomputed.
+    ranked = []
+    for col in times[:2]:
+        ser = df[col].dropna()
+        if len(ser):
+            ranked += [ser.idxmin(), ser.idxmax()]
+
+    strat = _stratum_column(df, cats)
+    if strat is not None:
+        top = df[strat].value_counts().head(MAX_STRATA).index
+        picked = df.loc[df[strat].isin(top), [strat]].groupby(strat, observed=True, sort=False).sample(
+            n=1, random_state=seed)
+        order = {v: i for i, v in enumerate(top)}
+        ranked += sorted(picked.index, key=lambda i: order.get(df.at[i, strat], len(order)))
+
+    if nums:
+        data = df[nums]
+        if stats is not None:
+            q = pd.DataFrame({col: stats[col]["quantiles"] for col in nums})
+            q1, med, q3 = q.loc["p25"], q.loc["p50"], q.loc["p75"]
+        else:
+            q = data.quantile([0.25, 0.5, 0.75])
+            q1, med, q3 = q.iloc[0], q.iloc[1], q.iloc[2]
+        iqr = (q3 - q1).replace(0, np.nan)
+        dev = (data - med).abs().div(iqr)
+        worst = dev.max()
+        strong = worst[worst > OUTLIER_FENCE].sort_values(ascending=False)
+        ranked += [dev[col].idxmax() for col in strong.index]
+
+    rng = np.random.default_rng(seed)
+    fill = rng.choice(len(df), size=min(len(df), max_rows), replace=False)
+    ranked += list(df.index[fill])
+    return list(dict.fromkeys(ranked))[:max_rows * 2]
+
+
+def representative_sample(df, nums, cats, times, budget_tokens=SAMPLE_TOKEN_BUDGET,
+                          min_rows=MIN_SAMPLE_ROWS, max_rows=MAX_SAMPLE_ROWS, seed=0, stats=None):
+    # CSV text of at most `budget_tokens` (estimated) drawn from candidate_rows, in file order
+    if len(df) <= max_rows:
+        text = df.to_csv(index=False)
+        if df.empty or len(text) <= budget_tokens * CHARS_PER_TOKEN:
+            return text  # small enough to send whole
+    cands = candidate_rows(df, nums, cats, times, seed=seed, max_rows=max_rows, stats=stats)
+    frame = df.loc[cands]
+    header = frame.iloc[:0].to_csv(index=False)
+    lines = frame.to_csv(index=False, header=False, lineterminator="\n").splitlines(True)
+    if len(lines) == len(cands):
+        costs = [len(line) for line in lines]
+    else:  # quoted newlines inside values: fall back to the average line length
+        costs = [sum(map(len, lines)) / max(len(cands), 1)] * len(cands)
+
+    budget = budget_tokens * CHARS_PER_TOKEN - len(header)
+    keep, used = [], 0
+    for pos, cost in enumerate(costs):
+        if len(keep) >= max_rows or (len(keep) >= min_rows and used + cost > budget):
+            break
+        keep.append(pos)
+        used += cost
+    return frame.iloc[keep].sort_index().to_csv(index=False)
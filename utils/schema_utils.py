@@ -1,13 +1,142 @@
-def infer_schema(df):
-    # Build a concise schema description
-    lines = []
-    for col in df.columns:
-        dtype = str(df[col].dtype)
-        na_pct = float(df[col].isna().mean() * 100.0)
-        # Simple sample values
-        sample_vals = df[col].dropna().unique()[:3]
-        sample_str = ", ".join(map(str, sample_vals))
-        lines.append(f"{col} ({dtype}) - Missing: {na_pct:.1f}% - Samples: {sample_str}")
-    schema_str = "\n".join(lines)
-    sample_rows = df.head(10).to_csv(index=False)
-    return schema_str, sample_rows
+import numpy as np
+import pandas as pd
+
+from utils.sampling import (SAMPLE_TOKEN_BUDGET, describe_columns, representative_sample, sample_columns,
+                            summary_stats)
+from utils.type_inference import infer_column_types
+
+
+def infer_schema(df, roles=None, budget_tokens=SAMPLE_TOKEN_BUDGET, stats=None, dtypes=None):
+    # Build a concise schema description (per-column summary stats) and a representative,
+    # token-budgeted sample. Pass roles=(numeric, categorical, datetime) with a frame that
+    # detect_columns already typed to skip inferring them again, `stats` (e.g. from
+    # utils.sketches) to skip computing them, and `dtypes` to label columns with other dtypes
+    # than the frame's (e.g. dtype_optimizer.logical_dtypes).
+    if roles is None:
+        df, nums, cats, times = infer_column_types(df)
+    else:
+        nums, cats, times = roles
+    if stats is None:
+        stats = summary_stats(df, nums, cats, times)
+    lines, groups = describe_columns(list(df.columns), df.dtypes if dtypes is None else dtypes, stats, nums)
+    df, nums, cats, times = _sample_view(df, groups, nums, cats, times)
+    sample_rows = representative_sample(df, nums, cats, times, budget_tokens=budget_tokens, stats=stats)
+    return "\n".join(lines), sample_rows
+
+
+def _sample_view(df, groups, nums, cats, times):
+    # Wide frames: only the columns the sample rows show (see sampling.sample_columns)
+    cols = sample_columns(groups)
+    if len(cols) == len(df.columns):
+        return df, nums, cats, times
+    keep = set(cols)
+    return df[cols], [c for c in nums if c in keep], [c for c in cats if c in keep], [c for c in times if c in keep]
+
+
+# --- Streaming (chunked) ingestion for files that don't fit in memory ---
+
+def _promote_dtype(a, b):
+    # Combine the dtypes pandas picked for two chunks of the same column.
+    # None means "chunk was all-null" and carries no type information.
+    if a is None:
+        return b
+    if b is None or a == b:
+        return a
+    numeric = pd.api.types.is_numeric_dtype
+    boolean = pd.api.types.is_bool_dtype
+    if numeric(a) and numeric(b) and not boolean(a) and not boolean(b):
+        return np.promote_types(a, b)
+    if pd.api.types.is_string_dtype(a) and a != np.dtype(object):
+        return a
+    if pd.api.types.is_string_dtype(b) and b != np.dtype(object):
+        return b
+    return np.dtype(object)
+
+
+def _numeric_dtype(typed, raw, nulls):
+    # The dtype infer_column_types would give the whole column, from the preview's typed dtype
+    # and the file's raw one: nulls, or dirty text it coerces to NaN, make integers float64
+    if raw is not None and pd.api.types.is_numeric_dtype(raw) and not pd.api.types.is_bool_dtype(raw):
+        return np.promote_types(typed, raw)
+    if pd.api.types.is_integer_dtype(typed) and (nulls or raw is not None):
+        return np.dtype("float64")
+    return typed
+
+
+def _reservoir_update(reservoir, slot_rows, chunk, start, k, rng):
+    # Algorithm R over a chunk: row i (global) replaces slot j ~ U[0, i] when j < k.
+    # `reservoir` is indexed by global row number; `slot_rows[j]` is the row held in slot j.
+    n = len(chunk)
+    global_rows = np.arange(start, start + n)
+    fill = max(0, min(k - start, n))
+    new_slots = {}
+    for pos in range(fill):
+        new_slots[start + pos] = pos
+    if fill < n:
+        tail = global_rows[fill:]
+        j = rng.integers(0, tail + 1)
+        hits = np.nonzero(j < k)[0]
+        for h in hits:
+            new_slots[int(j[h])] = fill + int(h)  # later rows overwrite earlier ones
+    if not new_slots:
+        return reservoir
+    slots = np.fromiter(new_slots.keys(), dtype=np.int64)
+    positions = np.fromiter(new_slots.values(), dtype=np.int64)
+    evicted = slot_rows[slots]
+    evicted = evicted[evicted >= 0]
+    slot_rows[slots] = global_rows[positions]
+    incoming = chunk.iloc[positions].set_axis(global_rows[positions])
+    if reservoir is None:
+        return incoming
+    kept = reservoir[~reservoir.index.isin(evicted)]
+    return pd.concat([kept, incoming])
+
+
+def infer_schema_chunked(source, chunksize=100_000, preview_rows=50_000,
+                         budget_tokens=SAMPLE_TOKEN_BUDGET, seed=0):
+    # Same output contract as infer_schema, but reads `source` in chunks so peak memory is
+    # bounded by `chunksize` + `preview_rows` instead of file size. Returns
+    # (schema_str, sample_rows, preview_df) where preview_df is a uniform reservoir sample.
+    # Dtypes and missing shares are exact; the other stats and the sample come from the preview.
+    rng = np.random.default_rng(seed)
+    columns = None
+    dtypes, null_counts = {}, {}
+    total = 0
+    reservoir = None
+    slot_rows = np.full(preview_rows, -1, dtype=np.int64)
+
+    with pd.read_csv(source, chunksize=chunksize) as reader:
+        for chunk in reader:
+            if columns is None:
+                columns = list(chunk.columns)
+                for col in columns:
+                    dtypes[col], null_counts[col] = None, 0
+            nulls = chunk.isna().sum()
+            for col in columns:
+                null_counts[col] += int(nulls[col])
+                if nulls[col] < len(chunk):
+                    dtypes[col] = _promote_dtype(dtypes[col], chunk[col].dtype)
+            if preview_rows:
+                reservoir = _reservoir_update(reservoir, slot_rows, chunk, total, preview_rows, rng)
+            total += len(chunk)
+
+    if columns is None:
+        return "", "", pd.DataFrame()
+
+    preview = reservoir.sort_index() if reservoir is not None else pd.DataFrame(columns=columns)
+    typed, nums, cats, times = infer_column_types(preview)
+    stats = summary_stats(typed, nums, cats, times)
+    lines = [] if len(preview) == total else [f"Stats from a {len(preview):,}-row uniform sample of {total:,} rows."]
+    for col in columns:
+        stats[col]["missing"] = (null_counts[col] / total * 100.0) if total else 0.0
+        if col in times:
+            dtypes[col] = typed[col].dtype
+        elif col in nums:
+            dtypes[col] = _numeric_dtype(typed[col].dtype, dtypes[col], null_counts[col])
+        elif dtypes[col] is None:
+            dtypes[col] = np.dtype("float64")
+    described, groups = describe_columns(columns, dtypes, stats, nums)
+    schema_str = "\n".join(lines + described)
+    sample_rows = representative_sample(*_sample_view(typed, groups, nums, cats, times), budget_tokens=budget_tokens,
+                                        seed=seed, stats=stats)
+    return schema_str, sample_rows, preview.reset_index(drop=True)
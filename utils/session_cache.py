@@ -0,0 +1,283 @@
+import hashlib
+import io
+import json
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import pandas as pd
+
+from utils.dtype_optimizer import align_dtypes, frame_memory, logical_dtypes, optimize_dtypes
+from utils.schema_utils import infer_schema, infer_schema_chunked
+from utils.sketches import DatasetSketch, materially_changed
+from utils.type_inference import apply_column_types
+from utils.viz_utils import detect_columns
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow is optional; fall back to pickle
+    pa = None
+
+# Dataset session layer: the first upload of a file is parsed once, typed (datetime columns
+# parsed by detect_columns) and written next to its schema/column roles, keyed by content
+# hash. Later loads of the same bytes read the Arrow file instead of re-parsing the CSV: it is
+# memory-mapped, but to_pandas() still copies it into pandas memory once.
+#
+# Loads that pass a dataset `name` (the upload's file name) also keep a profile per name:
+# mergeable column sketches (utils.sketches) of the last version plus the schema/sample the
+# agent last saw. A new version whose bytes start with the previous version's bytes (rows
+# appended to a log or export) only parses, types and sketches the appended tail, and the
+# agent keeps its previous basis until the summary changes materially. Streaming loads are
+# always profiled from scratch.
+#
+# Typed frames are dtype-optimized (utils.dtype_optimizer) before they are cached: repeated
+# text becomes categorical and numbers are downcast where that is lossless. The Arrow file keeps
+# those dtypes, so cache hits come back small too.
+#
+# The directory is an LRU cache bounded by DATA_AGENT_CACHE_MAX_MB: every write sweeps the least
+# recently used entries (cache hits refresh theirs) until the files fit.
+
+CACHE_DIR = os.getenv("DATA_AGENT_CACHE_DIR", os.path.join(".cache", "datasets"))
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+CACHE_VERSION = 5
+CACHE_MAX_BYTES = int(float(os.getenv("DATA_AGENT_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+
+@dataclass
+class SessionDataset:
+    key: str
+    df: pd.DataFrame
+    schema_str: str
+    sample_str: str
+    numeric: List[str] = field(default_factory=list)
+    categorical: List[str] = field(default_factory=list)
+    datetime: List[str] = field(default_factory=list)
+    streaming: bool = False
+    from_cache: bool = False
+    # What to send the agent: the basis it last saw for this dataset name, unless the summary
+    # changed materially since (then the current schema/sample)
+    agent_schema_str: str = ""
+    agent_sample_str: str = ""
+    agent_reused: bool = False
+    summary_change: Optional[str] = None
+    appended_rows: Optional[int] = None  # rows parsed from the tail on an incremental load
+    memory_before: Optional[int] = None  # bytes of the typed frame before/after dtype optimization
+    memory_after: Optional[int] = None
+
+    def __post_init__(self):
+        self.agent_schema_str = self.agent_schema_str or self.schema_str
+        self.agent_sample_str = self.agent_sample_str or self.sample_str
+
+
+def _digests(file_obj, prefix_size=None, block_size=1 << 20):
+    # One pass: (sha256 of the file, sha256 of its first prefix_size bytes, size, ends with newline)
+    h, prefix, size, last = hashlib.sha256(), None, 0, b""
+    file_obj.seek(0)
+    while True:
+        block = file_obj.read(block_size)
+        if not block:
+            break
+        if not isinstance(block, bytes):
+            block = block.encode("utf-8")
+        if prefix_size is not None and prefix is None and size + len(block) >= prefix_size:
+            cut = prefix_size - size
+            h.update(block[:cut])
+            prefix = h.hexdigest()  # hashlib objects keep accepting updates after a digest
+            h.update(block[cut:])
+        else:
+            h.update(block)
+        size += len(block)
+        last = block[-1:]
+    file_obj.seek(0)
+    return h.hexdigest(), prefix, size, last == b"\n"
+
+
+def content_hash(file_obj, block_size=1 << 20) -> str:
+    return _digests(file_obj, block_size=block_size)[0]
+
+
+def _paths(key: str):
+    base = os.path.join(CACHE_DIR, key)
+    data_ext = ".arrow" if pa is not None else ".pkl"
+    return base + data_ext, base + ".json"
+
+
+def _write_frame(df: pd.DataFrame, path: str):
+    tmp = path + ".tmp"
+    if pa is None:
+        df.to_pickle(tmp)
+    else:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def _read_frame(path: str) -> pd.DataFrame:
+    if pa is None:
+        return pd.read_pickle(path)
+    with pa.memory_map(path, "r") as source:
+        # split_blocks: one block per column instead of consolidating them (a second copy)
+        return pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+
+
+def _sweep(keep):
+    # Delete the least recently used entries until the cache fits CACHE_MAX_BYTES. An entry is
+    # every file sharing a base name (data + meta, or a profile); `keep` holds the paths just written.
+    entries = {}
+    for folder in (CACHE_DIR, PROFILE_DIR):
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            continue
+        for fname in names:
+            path = os.path.join(folder, fname)
+            if fname.endswith(".tmp") or not os.path.isfile(path):
+                continue  # another process's write in progress, or the profiles folder
+            st = os.stat(path)
+            entry = entries.setdefault(os.path.join(folder, fname.split(".", 1)[0]), [0, 0.0, []])
+            entry[0] += st.st_size
+            entry[1] = max(entry[1], st.st_mtime)
+            entry[2].append(path)
+    total = sum(size for size, _, _ in entries.values())
+    for base, (size, _, paths) in sorted(entries.items(), key=lambda kv: kv[1][1]):
+        if total <= CACHE_MAX_BYTES:
+            break
+        if keep.intersection(paths):
+            continue
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+
+
+def _profile_path(name: str) -> str:
+    return os.path.join(PROFILE_DIR, hashlib.sha256(name.encode("utf-8")).hexdigest()[:32] + ".json")
+
+
+def _load_profile(name: str):
+    try:
+        with open(_profile_path(name), "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return profile if profile.get("version") == CACHE_VERSION else None
+
+
+def _read_tail(file_obj, profile, prev_df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    # Parse and type only the bytes appended since the profiled version. None when the tail
+    # does not fit the previous columns/roles (the caller then re-profiles the whole file).
+    file_obj.seek(0)
+    header = file_obj.readline()
+    file_obj.seek(profile["size"])
+    tail = file_obj.read()
+    file_obj.seek(0)
+    # Keep text columns text even when the few appended rows happen to look numeric
+    # (categorical columns are read as their categories' dtype; align_dtypes merges the sets)
+    text = {}
+    for c in profile["categorical"]:
+        dtype = prev_df[c].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtype = dtype.categories.dtype
+        if pd.api.types.is_string_dtype(dtype):
+            text[c] = dtype
+    try:
+        chunk = pd.read_csv(io.BytesIO(header + tail), dtype=text)
+    except (ValueError, pd.errors.ParserError):
+        return None
+    if list(chunk.columns) != list(prev_df.columns):
+        return None
+    chunk, conforms = apply_column_types(chunk, profile["numeric"], profile["datetime"])
+    return chunk if conforms else None
+
+
+def load_dataset(file_obj, streaming=False, chunksize=200_000, preview_rows=100_000,
+                 name: Optional[str] = None) -> SessionDataset:
+    profile = _load_profile(name) if name and not streaming else None
+    binary = isinstance(file_obj.read(0), bytes)
+    digest, prefix, size, ends_with_newline = _digests(file_obj, profile["size"] if profile and binary else None)
+    mode = f"stream-{chunksize}-{preview_rows}" if streaming else "full"
+    key = hashlib.sha256(f"{CACHE_VERSION}:{digest}:{mode}".encode()).hexdigest()[:32]
+    data_path, meta_path = _paths(key)
+
+    if os.path.exists(data_path) and os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            df = _read_frame(data_path)
+            for path in (data_path, meta_path):
+                os.utime(path)  # most recently used, for _sweep
+            return SessionDataset(key=key, df=df, from_cache=True, **meta)
+        except Exception:
+            pass  # corrupt/partial entry: rebuild below
+
+    sketch, tail = None, None
+    if streaming:
+        schema_str, sample_str, df = infer_schema_chunked(file_obj, chunksize=chunksize, preview_rows=preview_rows)
+        df, nums, cats, times = detect_columns(df)
+        df, memory = optimize_dtypes(df)
+    else:
+        if profile and prefix == profile["digest"] and profile["ends_with_newline"] and size > profile["size"]:
+            try:
+                prev_df = _read_frame(_paths(profile["key"])[0])
+                tail = _read_tail(file_obj, profile, prev_df)
+            except Exception:
+                tail = None  # previous frame evicted or unreadable
+        if tail is not None:
+            nums, cats, times = profile["numeric"], profile["categorical"], profile["datetime"]
+            sketch = DatasetSketch.from_dict(profile["sketch"]).merge(DatasetSketch.from_frame(tail, nums, cats, times))
+            before = profile["memory_before"] + frame_memory(tail)
+            df, memory = optimize_dtypes(pd.concat(align_dtypes(prev_df, tail), ignore_index=True))
+            memory["before"] = before
+            # The agent sees the dtypes a full parse gives (str, int64, ...), not the optimized ones
+            schema_str, sample_str = infer_schema(df, roles=(nums, cats, times), stats=sketch.stats(),
+                                                  dtypes=logical_dtypes(df))
+        else:
+            df, nums, cats, times = detect_columns(pd.read_csv(file_obj))
+            if name:
+                sketch = DatasetSketch.from_frame(df, nums, cats, times)
+            # Described before optimizing, so the schema and sample are those of the parsed frame
+            schema_str, sample_str = infer_schema(df, roles=(nums, cats, times),
+                                                  stats=sketch.stats() if sketch is not None else None)
+            df, memory = optimize_dtypes(df)
+    file_obj.seek(0)
+
+    meta = {
+        "schema_str": schema_str, "sample_str": sample_str,
+        "numeric": nums, "categorical": cats, "datetime": times, "streaming": streaming,
+        "appended_rows": len(tail) if tail is not None else None,
+        "memory_before": memory["before"], "memory_after": memory["after"],
+    }
+    basis = None
+    if sketch is not None:
+        summary = sketch.summary()
+        basis = (profile or {}).get("basis")
+        change = materially_changed(basis["summary"] if basis else None, summary)
+        if change is None:
+            meta.update(agent_schema_str=basis["schema_str"], agent_sample_str=basis["sample_str"], agent_reused=True)
+        else:
+            basis = {"summary": summary, "schema_str": schema_str, "sample_str": sample_str}
+            meta["summary_change"] = change
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _write_frame(df, data_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        if sketch is not None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profile = {
+                "version": CACHE_VERSION, "name": name, "digest": digest, "size": size,
+                "ends_with_newline": ends_with_newline, "key": key,
+                "numeric": nums, "categorical": cats, "datetime": times,
+                "sketch": sketch.to_dict(), "basis": basis, "memory_before": memory["before"],
+            }
+            tmp = _profile_path(name) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(profile, f)
+            os.replace(tmp, _profile_path(name))
+        _sweep({data_path, meta_path} | ({_profile_path(name)} if sketch is not None else set()))
+    except Exception:
+        pass  # caching is best-effort; an unwritable cache dir must not break the upload
+    return SessionDataset(key=key, df=df, **meta)
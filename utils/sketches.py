@@ -0,0 +1,325 @@
+import base64
+
+import numpy as np
+import pandas as pd
+
+from utils.parallel import map_columns
+from utils.sampling import QUANTILE_LABELS, QUANTILES, TOP_K
+
+# Mergeable per-column sketches for incremental profiling.
+#
+# Every sketch built from one chunk of rows can be merged with a sketch of another chunk.
+# Merging the sketch of a file's prefix with the sketch of rows appended later gives the stats
+# of the whole file without reading the prefix again:
+#   rows / nulls / min / max   exact
+#   HyperLogLog                distinct count, ~1.6% standard error (exact-ish when small)
+#   t-digest                   quantiles; exact up to TDIGEST_COMPRESSION values
+#   top-k                      exact counts up to TOPK_CAPACITY distinct values, then
+#                              Misra-Gries (counts become lower bounds)
+# stats() has the same shape as sampling.summary_stats, so describe_column and
+# representative_sample accept it unchanged.
+
+HLL_PRECISION = 12
+TDIGEST_COMPRESSION = 200
+TOPK_CAPACITY = 1000
+
+# What counts as a material change of the schema summary (see materially_changed)
+MISSING_SHIFT_PCT = 1.0      # missing share moved by more than 1 percentage point
+QUANTILE_SHIFT = 0.1         # p5/p50/p95 moved by more than 10% of the old p5-p95 spread
+DISTINCT_GROWTH = 0.2        # distinct count changed by more than 20%
+RANGE_GROWTH = 0.25          # time span grew by more than 25%
+ROW_GROWTH = 0.5             # row count grew by more than 50%
+TOP_COMPARE = 3              # the leading categories must stay the same set
+
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    # Exact bit length of uint64 values (float log2 rounds near powers of two)
+    n = np.zeros(x.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = x >= (np.uint64(1) << np.uint64(shift))
+        n[big] += shift
+        x = np.where(big, x >> np.uint64(shift), x)
+    return n + (x > 0)
+
+
+def _hash_values(ser: pd.Series) -> np.ndarray:
+    # Normalize first so the same value hashes alike in every chunk (1 vs 1.0, str vs object)
+    ser = ser.dropna()
+    if pd.api.types.is_datetime64_any_dtype(ser):
+        ser = pd.Series(_datetime_ns(ser))
+    elif pd.api.types.is_numeric_dtype(ser):
+        ser = ser.astype("float64")
+    else:
+        ser = ser.astype(str).astype(object)
+    return pd.util.hash_pandas_object(ser, index=False).to_numpy(np.uint64)
+
+
+def _datetime_ns(ser: pd.Series) -> np.ndarray:
+    ser = ser.dropna()
+    if getattr(ser.dt, "tz", None) is not None:
+        ser = ser.dt.tz_convert(None)
+    return ser.astype("datetime64[ns]").to_numpy().view(np.int64)
+
+
+class HyperLogLog:
+    def __init__(self, p: int = HLL_PRECISION, registers=None):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8) if registers is None else registers
+
+    @classmethod
+    def from_series(cls, ser: pd.Series, p: int = HLL_PRECISION) -> "HyperLogLog":
+        hll = cls(p)
+        h = _hash_values(ser)
+        if len(h):
+            idx = (h >> np.uint64(64 - p)).astype(np.int64)
+            # Remaining bits, with a sentinel so an all-zero remainder still terminates
+            rest = (h << np.uint64(p)) | np.uint64(1 << (p - 1))
+            rank = (65 - _bit_length(rest)).astype(np.uint8)
+            np.maximum.at(hll.registers, idx, rank)
+        return hll
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        return HyperLogLog(self.p, np.maximum(self.registers, other.registers))
+
+    def estimate(self) -> int:
+        m = float(len(self.registers))
+        raw = (0.7213 / (1 + 1.079 / m)) * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            raw = m * np.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(raw))
+
+    def to_dict(self):
+        return {"p": self.p, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, d) -> "HyperLogLog":
+        return cls(d["p"], np.frombuffer(base64.b64decode(d["registers"]), dtype=np.uint8).copy())
+
+
+class TDigest:
+    def __init__(self, compression: int = TDIGEST_COMPRESSION, means=None, weights=None):
+        self.compression = compression
+        self.means = np.asarray([] if means is None else means, dtype=np.float64)
+        self.weights = np.asarray([] if weights is None else weights, dtype=np.float64)
+
+    @classmethod
+    def from_values(cls, values, compression: int = TDIGEST_COMPRESSION) -> "TDigest":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        return cls(compression)._merged(values, np.ones(len(values)))
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        return self._merged(other.means, other.weights)
+
+    def _merged(self, means, weights) -> "TDigest":
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        if len(means) > self.compression:
+            # Scale function k1: centroids whose k(q) share an integer interval are combined,
+            # which keeps centroids small in the tails, where quantile error matters most
+            q = (np.cumsum(weights) - weights / 2) / weights.sum()
+            k = np.floor(self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1)))
+            starts = np.r_[0, np.flatnonzero(np.diff(k)) + 1]
+            w = np.add.reduceat(weights, starts)
+            means, weights = np.add.reduceat(means * weights, starts) / w, w
+        return TDigest(self.compression, means, weights)
+
+    def quantiles(self, qs, lo: float, hi: float):
+        if not len(self.means):
+            return [np.nan] * len(qs)
+        # Centroid centres in rank units; for unit weights this is pandas' linear interpolation
+        centres = np.cumsum(self.weights) - self.weights / 2
+        targets = np.asarray(qs, dtype=np.float64) * (self.weights.sum() - 1) + 0.5
+        out = np.clip(np.interp(targets, centres, self.means), lo, hi)
+        out[np.asarray(qs) <= 0], out[np.asarray(qs) >= 1] = lo, hi
+        return out.tolist()
+
+    def to_dict(self):
+        return {"compression": self.compression, "means": self.means.tolist(), "weights": self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, d) -> "TDigest":
+        return cls(d["compression"], d["means"], d["weights"])
+
+
+class TopK:
+    def __init__(self, capacity: int = TOPK_CAPACITY, counts=None):
+        self.capacity = capacity
+        self.counts = dict(counts or {})
+
+    @classmethod
+    def from_series(cls, ser: pd.Series, capacity: int = TOPK_CAPACITY) -> "TopK":
+        vc = ser.value_counts(dropna=True)
+        vc = vc[vc > 0]  # categoricals also count unused categories
+        return cls(capacity)._merged(dict(zip(vc.index.tolist(), vc.tolist())))
+
+    def merge(self, other: "TopK") -> "TopK":
+        return self._merged(other.counts)
+
+    def _merged(self, counts) -> "TopK":
+        out = dict(self.counts)
+        for value, n in counts.items():
+            out[value] = out.get(value, 0) + n
+        if len(out) > self.capacity:
+            # Misra-Gries merge: subtract the (capacity+1)-th largest count, drop what hits zero
+            cut = sorted(out.values(), reverse=True)[self.capacity]
+            out = {v: n - cut for v, n in out.items() if n > cut}
+        return TopK(self.capacity, out)
+
+    def top(self, k: int = TOP_K):
+        return sorted(self.counts.items(), key=lambda kv: -kv[1])[:k]
+
+    def to_dict(self):
+        return {"capacity": self.capacity, "counts": [[v, n] for v, n in self.counts.items()]}
+
+    @classmethod
+    def from_dict(cls, d) -> "TopK":
+        return cls(d["capacity"], {v: n for v, n in d["counts"]})
+
+
+class ColumnSketch:
+    def __init__(self, role: str, rows: int = 0, nulls: int = 0, lo=None, hi=None,
+                 hll: HyperLogLog = None, digest: TDigest = None, topk: TopK = None):
+        self.role = role  # numeric / categorical / datetime
+        self.rows, self.nulls = rows, nulls
+        self.lo, self.hi = lo, hi  # float for numeric, epoch ns for datetime
+        self.hll = hll or HyperLogLog()
+        self.digest, self.topk = digest, topk
+
+    @classmethod
+    def from_series(cls, ser: pd.Series, role: str) -> "ColumnSketch":
+        nulls = int(ser.isna().sum())
+        sketch = cls(role, rows=len(ser), nulls=nulls, hll=HyperLogLog.from_series(ser))
+        if role == "numeric":
+            values = ser.dropna().to_numpy(dtype=np.float64)
+            sketch.digest = TDigest.from_values(values)
+            if len(values):
+                sketch.lo, sketch.hi = float(values.min()), float(values.max())
+        elif role == "datetime":
+            ns = _datetime_ns(ser)
+            if len(ns):
+                sketch.lo, sketch.hi = int(ns.min()), int(ns.max())
+        else:
+            sketch.topk = TopK.from_series(ser)
+        return sketch
+
+    def merge(self, other: "ColumnSketch") -> "ColumnSketch":
+        lo = min(x for x in (self.lo, other.lo) if x is not None) if self.lo is not None or other.lo is not None else None
+        hi = max(x for x in (self.hi, other.hi) if x is not None) if self.hi is not None or other.hi is not None else None
+        return ColumnSketch(
+            self.role, self.rows + other.rows, self.nulls + other.nulls, lo, hi, self.hll.merge(other.hll),
+            self.digest.merge(other.digest) if self.digest is not None else None,
+            self.topk.merge(other.topk) if self.topk is not None else None,
+        )
+
+    def stats(self):
+        out = {"missing": (self.nulls / self.rows * 100.0) if self.rows else 0.0, "distinct": self.hll.estimate()}
+        if self.role == "numeric":
+            lo = self.lo if self.lo is not None else np.nan
+            hi = self.hi if self.hi is not None else np.nan
+            out["quantiles"] = dict(zip(QUANTILE_LABELS, self.digest.quantiles(QUANTILES, lo, hi)))
+        elif self.role == "datetime":
+            out["range"] = tuple(pd.Timestamp(x) if x is not None else pd.NaT for x in (self.lo, self.hi))
+        else:
+            out["top"] = self.topk.top()
+        return out
+
+    def to_dict(self):
+        return {
+            "role": self.role, "rows": self.rows, "nulls": self.nulls, "lo": self.lo, "hi": self.hi,
+            "hll": self.hll.to_dict(),
+            "digest": self.digest.to_dict() if self.digest is not None else None,
+            "topk": self.topk.to_dict() if self.topk is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d) -> "ColumnSketch":
+        return cls(
+            d["role"], d["rows"], d["nulls"], d["lo"], d["hi"], HyperLogLog.from_dict(d["hll"]),
+            TDigest.from_dict(d["digest"]) if d["digest"] else None,
+            TopK.from_dict(d["topk"]) if d["topk"] else None,
+        )
+
+
+class DatasetSketch:
+    def __init__(self, columns):
+        self.columns = dict(columns)  # {column: ColumnSketch}, in frame order
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, nums, cats, times) -> "DatasetSketch":
+        roles = {**{c: "categorical" for c in cats}, **{c: "numeric" for c in nums}, **{c: "datetime" for c in times}}
+        sketches = map_columns(lambda col: ColumnSketch.from_series(df[col], roles.get(col, "categorical")), df.columns)
+        return cls(dict(zip(df.columns, sketches)))
+
+    def roles(self):
+        return {col: s.role for col, s in self.columns.items()}
+
+    def compatible(self, other: "DatasetSketch") -> bool:
+        return list(self.columns) == list(other.columns) and self.roles() == other.roles()
+
+    def merge(self, other: "DatasetSketch") -> "DatasetSketch":
+        if not self.compatible(other):
+            raise ValueError("cannot merge sketches of frames with different columns or roles")
+        return DatasetSketch({col: s.merge(other.columns[col]) for col, s in self.columns.items()})
+
+    @property
+    def rows(self) -> int:
+        return next(iter(self.columns.values())).rows if self.columns else 0
+
+    def stats(self):
+        return {col: s.stats() for col, s in self.columns.items()}
+
+    def summary(self):
+        # Compact, JSON-friendly view used to decide whether the agent should see the data again
+        cols = {}
+        for col, s in self.columns.items():
+            st = s.stats()
+            entry = {"role": s.role, "missing": st["missing"], "distinct": st["distinct"]}
+            if s.role == "numeric":
+                entry["quantiles"] = [st["quantiles"][k] for k in ("p5", "p50", "p95")]
+            elif s.role == "datetime":
+                entry["range"] = [s.lo, s.hi]
+            else:
+                entry["top"] = [v for v, _ in st["top"][:TOP_COMPARE]]
+            cols[col] = entry
+        return {"rows": self.rows, "columns": cols}
+
+    def to_dict(self):
+        return {"columns": [[col, s.to_dict()] for col, s in self.columns.items()]}
+
+    @classmethod
+    def from_dict(cls, d) -> "DatasetSketch":
+        return cls({col: ColumnSketch.from_dict(s) for col, s in d["columns"]})
+
+
+def materially_changed(old, new):
+    # -> reason string, or None when `new` would not change what the agent says about the data
+    if old is None:
+        return "no previous summary"
+    if list(old["columns"]) != list(new["columns"]):
+        return "columns changed"
+    if old["rows"] and (new["rows"] - old["rows"]) / old["rows"] > ROW_GROWTH:
+        return f"rows grew from {old['rows']:,} to {new['rows']:,}"
+    for col, a in old["columns"].items():
+        b = new["columns"][col]
+        if a["role"] != b["role"]:
+            return f"{col}: role changed from {a['role']} to {b['role']}"
+        if abs(a["missing"] - b["missing"]) > MISSING_SHIFT_PCT:
+            return f"{col}: missing share moved from {a['missing']:.1f}% to {b['missing']:.1f}%"
+        if a["distinct"] and abs(b["distinct"] - a["distinct"]) / a["distinct"] > DISTINCT_GROWTH:
+            return f"{col}: distinct count moved from {a['distinct']} to {b['distinct']}"
+        if "quantiles" in a:
+            (p5, p50, p95), new_q = a["quantiles"], b["quantiles"]
+            spread = abs(p95 - p5) or abs(p50) or 1.0
+            if any(abs(x - y) > QUANTILE_SHIFT * spread for x, y in zip(a["quantiles"], new_q) if x == x and y == y):
+                return f"{col}: distribution shifted"
+        if "range" in a and None not in a["range"] and None not in b["range"]:
+            span = (a["range"][1] - a["range"][0]) or 1
+            if (b["range"][1] - b["range"][0]) - span > RANGE_GROWTH * span or b["range"][0] < a["range"][0]:
+                return f"{col}: time range extended"
+        if "top" in a and set(a["top"]) != set(b["top"]):
+            return f"{col}: leading categories changed"
+    return None
@@ -0,0 +1,190 @@
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.aggregation import choose_time_freq
+from utils.session_cache import CACHE_DIR
+from utils.type_inference import guess_datetime_format
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover - duckdb is optional; charts aggregate in pandas instead
+    duckdb = None
+
+# Optional out-of-core chart engine. A dataset gets a typed Parquet copy next to its session
+# cache entry, and chart tables are computed by DuckDB over that copy: group-by, top-N with an
+# "Other" bucket, time bucketing and histogram binning all run as SQL. DuckDB only reads the
+# columns a query references (projection pushdown) and skips row groups by their min/max stats
+# (predicate pushdown), uses every core, and spills to disk past its memory limit. Only the
+# aggregated result (bounded by groups/buckets/bins) becomes a pandas frame.
+#
+# In streaming mode the Parquet copy is converted from the uploaded CSV by DuckDB itself, so
+# charts cover the whole file rather than the in-memory reservoir sample.
+#
+# The functions mirror utils.aggregation and return frames of the same shape.
+
+# pandas offset alias (aggregation.TIME_FREQS) -> date_trunc part
+DATE_TRUNC_PARTS = {"s": "second", "min": "minute", "h": "hour", "D": "day", "W-MON": "week",
+                    "MS": "month", "QS": "quarter", "YS": "year"}
+SQL_AGGS = {"mean": "avg", "sum": "sum"}
+THREADS = int(os.getenv("DATA_AGENT_DUCKDB_THREADS", "0"))  # 0 = DuckDB's default (all cores)
+MEMORY_LIMIT = os.getenv("DATA_AGENT_DUCKDB_MEMORY", "")     # e.g. "2GB"; unset = DuckDB's default
+
+
+def available() -> bool:
+    return duckdb is not None
+
+
+def _ident(name) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _literal(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _connect():
+    con = duckdb.connect()
+    if THREADS:
+        con.execute(f"SET threads = {THREADS}")
+    if MEMORY_LIMIT:
+        con.execute(f"SET memory_limit = {_literal(MEMORY_LIMIT)}")
+    return con
+
+
+def _convert_csv(con, csv_path, parquet_path, numeric, datetime):
+    # Stream the CSV into typed Parquet: text is read as VARCHAR, then cast per known role
+    src = f"read_csv({_literal(csv_path)}, header = true, all_varchar = true)"
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {src}").fetchall()]
+    exprs = []
+    for col in columns:
+        c = _ident(col)
+        if col in numeric:
+            exprs.append(f"TRY_CAST({c} AS DOUBLE) AS {c}")
+        elif col in datetime:
+            values = con.execute(f"SELECT {c} FROM {src} WHERE {c} IS NOT NULL LIMIT 1000").fetchdf()[col]
+            fmt = guess_datetime_format(values)
+            if fmt is None or fmt in ("ISO8601", "mixed"):
+                exprs.append(f"TRY_CAST({c} AS TIMESTAMP) AS {c}")
+            else:  # strptime shares the %-codes of the pandas formats in type_inference
+                exprs.append(f"TRY_STRPTIME({c}, {_literal(fmt)}) AS {c}")
+        else:
+            exprs.append(c)
+    tmp = parquet_path + ".tmp"
+    con.execute(f"COPY (SELECT {', '.join(exprs)} FROM {src}) TO {_literal(tmp)} (FORMAT parquet)")
+    os.replace(tmp, parquet_path)
+
+
+class SqlSource:
+    # One Parquet-backed dataset; safe to share across Streamlit sessions (a cursor per query)
+
+    def __init__(self, parquet_path: str):
+        self.path = parquet_path
+        self._con = _connect()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dataset(cls, ds, file_obj=None) -> "SqlSource":
+        # ds: session_cache.SessionDataset. Streaming datasets convert `file_obj` (the CSV);
+        # otherwise the typed in-memory frame is written out once.
+        path = os.path.join(CACHE_DIR, ds.key + ".parquet")
+        if not os.path.exists(path):
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            if ds.streaming and file_obj is not None:
+                csv_path = os.path.join(CACHE_DIR, ds.key + ".csv.tmp")
+                file_obj.seek(0)
+                with open(csv_path, "wb") as f:
+                    shutil.copyfileobj(file_obj, f, 1 << 20)
+                file_obj.seek(0)
+                try:
+                    con = _connect()
+                    _convert_csv(con, csv_path, path, set(ds.numeric), set(ds.datetime))
+                    con.close()
+                finally:
+                    os.remove(csv_path)
+            else:
+                tmp = path + ".tmp"
+                ds.df.to_parquet(tmp, index=False)
+                os.replace(tmp, path)
+        return cls(path)
+
+    def query(self, sql: str, params=()) -> pd.DataFrame:
+        with self._lock:
+            cur = self._con.cursor()
+        try:
+            return cur.execute(sql.replace("{data}", f"read_parquet({_literal(self.path)})"), params).fetchdf()
+        finally:
+            cur.close()
+
+    def row_count(self) -> int:
+        return int(self.query("SELECT count(*) AS n FROM {data}")["n"].iloc[0])
+
+    def aggregate_by_category(self, category_col, value_col, agg="mean", top_n=10):
+        c, v = _ident(category_col), _ident(value_col)
+        limit = f"ORDER BY {v} DESC NULLS LAST LIMIT {int(top_n)}" if top_n else ""
+        return self.query(f"SELECT {c}, {SQL_AGGS[agg]}({v}) AS {v} FROM {{data}} "
+                          f"WHERE {c} IS NOT NULL GROUP BY {c} {limit}")
+
+    def top_n_with_other(self, category_col, value_col, agg="mean", top_n=10, other_label="Other"):
+        # Top-N groups plus one bucket aggregating every remaining row, in one scan
+        c, v, f = _ident(category_col), _ident(value_col), SQL_AGGS[agg]
+        out = self.query(f"""
+            WITH grouped AS (
+                SELECT {c} AS cat, {f}({v}) AS value FROM {{data}} WHERE {c} IS NOT NULL GROUP BY {c}
+            ), top AS (
+                SELECT cat, value FROM grouped ORDER BY value DESC NULLS LAST LIMIT {int(top_n)}
+            )
+            SELECT CAST(cat AS VARCHAR) AS {c}, value AS {v}, 0 AS rest FROM top
+            UNION ALL
+            SELECT ?, {f}(d.{v}), 1 FROM {{data}} d
+            WHERE d.{c} IS NOT NULL AND d.{c} NOT IN (SELECT cat FROM top)
+            HAVING (SELECT count(*) FROM grouped) > {int(top_n)}
+            ORDER BY rest, {v} DESC NULLS LAST
+        """, [other_label])
+        return out.drop(columns="rest").reset_index(drop=True)
+
+    def aggregate_over_time(self, time_col, value_col, agg="mean", max_points=200):
+        # Raw timestamps when there are few; otherwise the finest calendar bucket that fits
+        t, v, f = _ident(time_col), _ident(value_col), SQL_AGGS[agg]
+        info = self.query(f"SELECT min({t}) AS lo, max({t}) AS hi, approx_count_distinct({t}) AS n "
+                          f"FROM {{data}} WHERE {t} IS NOT NULL")
+        lo, hi, n = info["lo"].iloc[0], info["hi"].iloc[0], info["n"].iloc[0]
+        if pd.isna(lo):
+            return pd.DataFrame({time_col: [], value_col: []})
+        freq = None if n <= max_points else choose_time_freq(pd.Series([lo, hi]), max_points)
+        key = t if freq is None else f"date_trunc({_literal(DATE_TRUNC_PARTS[freq])}, {t})"
+        out = self.query(f"SELECT {key} AS {t}, {f}({v}) AS {v} FROM {{data}} WHERE {t} IS NOT NULL "
+                         f"GROUP BY 1 HAVING {f}({v}) IS NOT NULL ORDER BY 1")
+        return out
+
+    def histogram_table(self, value_col, bins=30):
+        # Same edges as numpy.histogram: equal-width over [min, max], last bin closed
+        v = _ident(value_col)
+        where = f"{v} IS NOT NULL AND isfinite(CAST({v} AS DOUBLE))"
+        info = self.query(f"SELECT min({v})::DOUBLE AS lo, max({v})::DOUBLE AS hi FROM {{data}} WHERE {where}")
+        lo, hi = info["lo"].iloc[0], info["hi"].iloc[0]
+        if pd.isna(lo):
+            return pd.DataFrame({"bin_start": [], "bin_end": [], "count": []})
+        if lo == hi:
+            lo, hi = lo - 0.5, hi + 0.5
+        edges = np.linspace(lo, hi, bins + 1)
+        width = (hi - lo) / bins
+        counts = self.query(
+            f"SELECT least(CAST(floor(({v}::DOUBLE - ?) / ?) AS BIGINT), {bins - 1}) AS b, count(*) AS n "
+            f"FROM {{data}} WHERE {where} GROUP BY 1", [lo, width])
+        full = np.zeros(bins, dtype=np.int64)
+        full[counts["b"].to_numpy(dtype=np.int64)] = counts["n"].to_numpy(dtype=np.int64)
+        return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": full})
+
+    def scatter_sample(self, x_col, y_col, max_points=2000):
+        # Same contract as aggregation.scatter_sample: a seeded reservoir sample of complete pairs
+        x, y = _ident(x_col), _ident(y_col)
+        # (USING SAMPLE applies before WHERE, so filter in a subquery first)
+        return self.query(f"SELECT * FROM (SELECT {x}, {y} FROM {{data}} WHERE {x} IS NOT NULL AND {y} IS NOT NULL) "
+                          f"USING SAMPLE reservoir({int(max_points)} ROWS) REPEATABLE (0)")
+
+    def close(self):
+        self._con.close()
@@ -0,0 +1,249 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from utils.parallel import map_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - pyarrow is optional; pandas parses numbers instead
+    pa = pc = None
+
+# Shared column-type inference used by the Streamlit UI (viz_utils.detect_columns) and the
+# backends (freestyle_stub.infer_types, mock_agent.detect_columns).
+#
+# One pass over the columns of a small row sample decides each column's role. For text
+# columns, vectorized regex matching picks a datetime format up front, so the full column is
+# parsed exactly once with an explicit format (and pandas' unique-value cache) instead of
+# trying to_datetime and catching the exception. Dtype-decided columns (numeric, datetime,
+# categorical) are settled from one vectorized null check; text columns are classified with
+# one regex pass over all of their sampled values, and converted on the profiling pool
+# (utils.parallel) when a frame has many of them. Small samples skip both: below
+# FAST_PATH_VALUES cells each column is matched with plain `re`, which is cheaper than the
+# fixed cost of the vectorized calls. ISO dates and plain numbers in Arrow-backed text are
+# parsed by pyarrow casts.
+
+# (pattern, to_datetime format) — first match above the threshold wins
+DATETIME_PATTERNS = [
+    (r"\d{4}-\d{2}-\d{2}", "%Y-%m-%d"),
+    (r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?", "ISO8601"),
+    (r"\d{4}-\d{2}", "%Y-%m"),
+    (r"\d{4}/\d{2}/\d{2}", "%Y/%m/%d"),
+    (r"\d{1,2}/\d{1,2}/\d{4}", "%m/%d/%Y"),
+    (r"\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}(:\d{2})?", "mixed"),
+    (r"\d{1,2}-\d{1,2}-\d{4}", "%m-%d-%Y"),
+    (r"[A-Za-z]{3} \d{1,2}, \d{4}", "%b %d, %Y"),
+    (r"[A-Za-z]{3,9} \d{4}", "mixed"),
+]
+_DATETIME_RES = [(re.compile(p), fmt) for p, fmt in DATETIME_PATTERNS]
+# One combined pass rejects the common "not a date at all" case before per-format checks
+_ANY_DATETIME_RE = re.compile("|".join(f"(?:{p})" for p, _ in DATETIME_PATTERNS))
+_NUMERIC_RE = re.compile(r"[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?")
+_TIME_NAME_RE = re.compile(r"date|time|month|day|period|timestamp", re.IGNORECASE)
+
+SAMPLE_SIZE = 1000
+DATETIME_THRESHOLD = 0.8  # share of sampled non-null values that must match a date pattern
+NUMERIC_THRESHOLD = 0.6   # share of values that must coerce to a number (stub's historic rule)
+# Sampled text values below which plain `re` over Python strings beats pandas' vectorized
+# str.fullmatch, which costs ~1 ms per call whatever the length (it re-parses the pattern)
+FAST_PATH_VALUES = 2_000
+
+
+def _is_text(ser: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(ser) or pd.api.types.is_string_dtype(ser)
+
+
+def _to_numeric(ser: pd.Series) -> pd.Series:
+    # pd.to_numeric(errors="coerce"). Arrow-backed text of plain numbers is cast by pyarrow
+    # instead (an order of magnitude faster); anything it rejects goes through pandas.
+    if len(ser) and pa is not None and isinstance(ser.dtype, pd.StringDtype) and ser.dtype.storage == "pyarrow":
+        values = pa.array(ser.array)
+        try:
+            parsed = pc.cast(values, pa.float64()).to_numpy(zero_copy_only=False)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return pd.to_numeric(ser, errors="coerce")
+        if np.isfinite(parsed).all() and (parsed == np.floor(parsed)).all():
+            try:  # integral: int64 like pandas, unless the text has decimals ("1.0")
+                parsed = pc.cast(values, pa.int64()).to_numpy(zero_copy_only=False)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                pass
+        return pd.Series(parsed, index=ser.index, name=ser.name)
+    return pd.to_numeric(ser, errors="coerce")
+
+
+def _to_datetime(ser: pd.Series, fmt) -> pd.Series:
+    # pd.to_datetime(format=fmt, errors="coerce"). ISO dates in Arrow-backed text are cast by
+    # pyarrow instead (several times faster, same datetime64[us] result); anything it rejects,
+    # or a "%Y-%m-%d" column that turns out to carry times, goes through pandas.
+    if (fmt in ("%Y-%m-%d", "ISO8601") and len(ser) and pa is not None and isinstance(ser.dtype, pd.StringDtype)
+            and ser.dtype.storage == "pyarrow"):
+        try:
+            parsed = pc.cast(pa.array(ser.array), pa.timestamp("us")).to_numpy(zero_copy_only=False)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            parsed = None
+        if parsed is not None and (fmt == "ISO8601" or (parsed == parsed.astype("datetime64[D]"))[~np.isnat(parsed)].all()):
+            return pd.Series(parsed, index=ser.index, name=ser.name)
+    return pd.to_datetime(ser, format=fmt, errors="coerce", cache=True)
+
+
+def guess_datetime_format(values: pd.Series, threshold=DATETIME_THRESHOLD):
+    # values: non-null sampled strings. Returns a to_datetime format or None.
+    if values.empty:
+        return None
+    if len(values) <= FAST_PATH_VALUES:
+        return _guess_format([str(v).strip() for v in values.to_numpy(dtype=object)], threshold)
+    text = values.astype(str).str.strip()
+    if text.str.fullmatch(_ANY_DATETIME_RE).mean() < threshold:
+        return None
+    for pattern, fmt in _DATETIME_RES:
+        if text.str.fullmatch(pattern).mean() >= threshold:
+            return fmt
+    return None
+
+
+def _match_share(text, regex):
+    return sum(1 for v in text if regex.fullmatch(v)) / len(text) if text else 0.0
+
+
+def _guess_format(text, threshold):
+    # guess_datetime_format over a list of stripped strings
+    if _match_share(text, _ANY_DATETIME_RE) < threshold:
+        return None
+    for regex, fmt in _DATETIME_RES:
+        if _match_share(text, regex) >= threshold:
+            return fmt
+    return None
+
+
+def _role(fmt, numeric_share):
+    if fmt is not None:
+        return ("datetime", fmt)
+    if numeric_share >= NUMERIC_THRESHOLD:  # ratio over all sampled rows (nulls count against)
+        return ("numeric", None)
+    return ("categorical", None)
+
+
+def _threshold(col):
+    return DATETIME_THRESHOLD / 2 if _TIME_NAME_RE.search(str(col)) else DATETIME_THRESHOLD
+
+
+def _present(ser: pd.Series):
+    # Non-null values of a short column (a Python-level filter beats dropna() on a few rows)
+    return [v for v in ser.to_numpy(dtype=object) if v is not None and v is not pd.NA and v == v]
+
+
+def _classify_values(col, values, rows, coerce_numeric):
+    # Role of one text column from its non-null sampled values, with plain `re`
+    text = [str(v).strip() for v in values]
+    numeric = _match_share(text, _NUMERIC_RE) * len(text) / rows if coerce_numeric else 0.0
+    return _role(_guess_format(text, _threshold(col)), numeric)
+
+
+def _classify_text(sample: pd.DataFrame, cols, coerce_numeric):
+    # Roles of text columns from one regex pass per pattern over the stacked sample values of
+    # all of them (a per-column str call has a fixed cost that dominates on wide frames). Only
+    # columns that mostly look like dates get the per-format datetime check.
+    if len(sample) * len(cols) <= FAST_PATH_VALUES:
+        return [_classify_values(col, _present(sample[col]), len(sample), coerce_numeric) for col in cols]
+    values = [sample[col].dropna().astype(str) for col in cols]
+    counts = np.array([len(v) for v in values])
+    codes = np.repeat(np.arange(len(cols)), counts)
+    text = pd.Series(np.concatenate([v.to_numpy(dtype=object) for v in values]), dtype="str").str.strip()
+
+    def share(pattern):
+        return np.bincount(codes, weights=text.str.fullmatch(pattern).to_numpy(dtype=float), minlength=len(cols))
+
+    any_datetime = share(_ANY_DATETIME_RE) / counts
+    numeric = share(_NUMERIC_RE) / len(sample) if coerce_numeric else np.zeros(len(cols))
+    thresholds = [_threshold(col) for col in cols]
+    maybe = [i for i in range(len(cols)) if any_datetime[i] >= thresholds[i]]
+    formats = dict(zip(maybe, map_columns(lambda i: guess_datetime_format(values[i], threshold=thresholds[i]), maybe)))
+    return [_role(formats.get(i), numeric[i]) for i in range(len(cols))]
+
+
+def classify_columns(df: pd.DataFrame, sample_size=SAMPLE_SIZE, coerce_numeric=True):
+    # Returns {column: (role, datetime_format_or_None)} with role in numeric/datetime/categorical.
+    # Small samples (a few thousand cells) are classified column by column in plain Python:
+    # the frame-wide null check and stacked regex pass only pay off on bigger ones.
+    sample = df if len(df) <= sample_size else df.sample(sample_size, random_state=0)
+    small = sample.size <= FAST_PATH_VALUES
+    has_values = None if small else sample.notna().any()
+    roles, text = {}, []
+    for col, ser in sample.items():
+        if pd.api.types.is_datetime64_any_dtype(ser):
+            roles[col] = ("datetime", None)
+        elif isinstance(ser.dtype, pd.CategoricalDtype):
+            roles[col] = ("categorical", None)
+        elif pd.api.types.is_numeric_dtype(ser):
+            present = ser.notna().any() if small else has_values[col]
+            roles[col] = ("numeric", None) if present or ser.empty else ("categorical", None)
+        elif not _is_text(ser):
+            roles[col] = ("categorical", None)
+        elif small:
+            values = _present(ser)
+            roles[col] = _classify_values(col, values, len(sample), coerce_numeric) if values else ("categorical", None)
+        elif not has_values[col]:
+            roles[col] = ("categorical", None)
+        else:
+            roles[col] = None  # keeps frame order; filled below
+            text.append(col)
+    if text:
+        roles.update(zip(text, _classify_text(sample, text, coerce_numeric)))
+    return roles
+
+
+def infer_column_types(df: pd.DataFrame, sample_size=SAMPLE_SIZE, coerce_numeric=True):
+    # Classify on a sample, then convert each datetime/numeric text column once.
+    # Returns (typed_df, numeric_cols, categorical_cols, datetime_cols); `df` is not modified.
+    roles = classify_columns(df, sample_size=sample_size, coerce_numeric=coerce_numeric)
+
+    def convert(col):
+        # -> converted column, or None when a datetime column parses too poorly (it stays categorical)
+        (role, fmt), ser = roles[col], df[col]
+        if role == "datetime":
+            parsed = _to_datetime(ser, fmt)
+            # Reject if the full column parses much worse than the sample suggested
+            return parsed if parsed.notna().sum() >= ser.notna().sum() * DATETIME_THRESHOLD else None
+        return _to_numeric(ser)
+
+    is_typed = {"datetime": pd.api.types.is_datetime64_any_dtype, "numeric": pd.api.types.is_numeric_dtype}
+    pending = [col for col, (role, _) in roles.items() if role in is_typed and not is_typed[role](df[col])]
+    converted = dict(zip(pending, map_columns(convert, pending)))
+    out = df.copy(deep=False)
+    numeric_cols, categorical_cols, datetime_cols = [], [], []
+    for col, (role, _) in roles.items():
+        if col in converted:
+            if converted[col] is None:
+                categorical_cols.append(col)
+                continue
+            out[col] = converted[col]
+        {"datetime": datetime_cols, "numeric": numeric_cols}.get(role, categorical_cols).append(col)
+    return out, numeric_cols, categorical_cols, datetime_cols
+
+
+def apply_column_types(df: pd.DataFrame, numeric_cols, datetime_cols, sample_size=SAMPLE_SIZE):
+    # Convert new rows of an already-classified file (e.g. rows appended to it) to the known
+    # roles instead of classifying them again. Returns (typed_df, conforms); conforms is False
+    # when a column parses much worse than its role implies, i.e. the roles need re-inferring.
+    out = df.copy(deep=False)
+    for col in datetime_cols:
+        ser = df[col]
+        if pd.api.types.is_datetime64_any_dtype(ser):
+            continue
+        non_null = ser.dropna()
+        fmt = guess_datetime_format(non_null.head(sample_size)) or "mixed"
+        parsed = _to_datetime(ser, fmt)
+        if parsed.notna().sum() < len(non_null) * DATETIME_THRESHOLD:
+            return df, False
+        out[col] = parsed
+    for col in numeric_cols:
+        ser = df[col]
+        if pd.api.types.is_numeric_dtype(ser):
+            continue
+        parsed = _to_numeric(ser)
+        if parsed.notna().sum() < ser.notna().sum() * NUMERIC_THRESHOLD:
+            return df, False
+        out[col] = parsed
+    return out, True
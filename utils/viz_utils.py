@@ -1,33 +1,50 @@
 import pandas as pd
 import altair as alt
 
+from utils.aggregation import aggregate_over_time, histogram_table, scatter_sample, top_n_with_other
+from utils.recommend import recommend_charts
+from utils.type_inference import infer_column_types
+
+# Large-data mode: aggregate in pandas/NumPy so the browser only receives bounded tables.
+# Auto-enabled above Altair's default row limit, which would otherwise raise MaxRowsError.
+# Passing `source` (a utils.sql_engine.SqlSource) pushes the aggregation down to DuckDB
+# instead; `df` is then not scanned at all.
+LARGE_DATA_ROWS = 5000
+MAX_LINE_POINTS = 1000
+MAX_SCATTER_POINTS = 2000
+
+def is_large(df, large_data=None):
+    return len(df) > LARGE_DATA_ROWS if large_data is None else large_data
+
 def detect_columns(df: pd.DataFrame):
-    numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
-    datetime_cols = []
-    for c in df.columns:
-        if pd.api.types.is_datetime64_any_dtype(df[c]):
-            datetime_cols.append(c)
-    for c in df.columns:
-        if c not in datetime_cols and df[c].dtype == object:
-            try:
-                parsed = pd.to_datetime(df[c], errors="raise", infer_datetime_format=True)
-                na_ratio = parsed.isna().mean()
-                if na_ratio < 0.2:
-                    df[c] = parsed
-                    datetime_cols.append(c)
-            except Exception:
-                pass
-    cat_cols = [c for c in df.columns if c not in numeric_cols and c not in datetime_cols]
-    return df, numeric_cols, cat_cols, datetime_cols
-
-def chart_line_over_time(df, time_col, value_col):
-    agg = df.groupby(time_col, as_index=False)[value_col].mean()
+    # Returns (typed_df, numeric, categorical, datetime); see utils.type_inference
+    return infer_column_types(df)
+
+def chart_line_over_time(df, time_col, value_col, large_data=None, max_points=MAX_LINE_POINTS, source=None):
+    if source is not None:
+        # Raw timestamps up to max_points, calendar buckets beyond (no full-resolution pull for LTTB)
+        agg = source.aggregate_over_time(time_col, value_col, max_points=max_points)
+    elif is_large(df, large_data):
+        # Same buckets in pandas: one resample pass, no groupby over every distinct timestamp
+        agg = aggregate_over_time(df, time_col, value_col, max_points=max_points)
+    else:
+        agg = df.groupby(time_col, as_index=False)[value_col].mean()
     return alt.Chart(agg).mark_line().encode(
         x=alt.X(time_col, title=time_col),
         y=alt.Y(value_col, title=f"Mean {value_col}")
     ).properties(height=300)
 
-def chart_bar_top_categories(df, category_col, value_col, top_n=10, agg="mean"):
+def chart_bar_top_categories(df, category_col, value_col, top_n=10, agg="mean", large_data=None, source=None):
+    if source is not None or is_large(df, large_data):
+        # Same top-N, plus an "Other" bar for everything outside it
+        if source is not None:
+            agg_df = source.top_n_with_other(category_col, value_col, agg=agg, top_n=top_n)
+        else:
+            agg_df = top_n_with_other(df, category_col, value_col, agg=agg, top_n=top_n)
+        return alt.Chart(agg_df).mark_bar().encode(
+            x=alt.X(value_col, title=f"{agg.title()} {value_col}"),
+            y=alt.Y(category_col, sort=None, title=category_col)
+        ).properties(height=300)
     if agg == "mean":
         agg_df = df.groupby(category_col, as_index=False)[value_col].mean()
     else:
@@ -38,19 +55,46 @@ def chart_bar_top_categories(df, category_col, value_col, top_n=10, agg="mean"):
         y=alt.Y(category_col, sort='-x', title=category_col)
     ).properties(height=300)
 
-def chart_histogram(df, value_col, bins=30):
+def chart_histogram(df, value_col, bins=30, large_data=None, source=None):
+    if source is not None or is_large(df, large_data):
+        table = source.histogram_table(value_col, bins=bins) if source is not None else histogram_table(df[value_col], bins=bins)
+        return alt.Chart(table).mark_bar().encode(
+            x=alt.X("bin_start:Q", bin="binned", title=value_col),
+            x2="bin_end:Q",
+            y=alt.Y("count:Q", title="Count")
+        ).properties(height=300)
     return alt.Chart(df).mark_bar().encode(
         x=alt.X(f"{value_col}:Q", bin=alt.Bin(maxbins=bins), title=value_col),
         y=alt.Y('count()', title='Count')
     ).properties(height=300)
 
-def default_dashboard(df):
-    df, nums, cats, times = detect_columns(df.copy())
-    charts = []
-    if times and nums:
-        charts.append(chart_line_over_time(df, times[0], nums[0]))
-    if cats and nums:
-        charts.append(chart_bar_top_categories(df, cats[0], nums[0], top_n=10))
-    if nums:
-        charts.append(chart_histogram(df, nums[0]))
-    return charts, {"numeric": nums, "categorical": cats, "datetime": times}
+def chart_scatter(df, x_col, y_col, large_data=None, max_points=MAX_SCATTER_POINTS, source=None):
+    if source is not None:
+        data = source.scatter_sample(x_col, y_col, max_points=max_points)
+    else:
+        data = scatter_sample(df, x_col, y_col, max_points=max_points if is_large(df, large_data) else len(df))
+    return alt.Chart(data).mark_circle(opacity=0.5).encode(
+        x=alt.X(x_col, title=x_col, scale=alt.Scale(zero=False)),
+        y=alt.Y(y_col, title=y_col, scale=alt.Scale(zero=False))
+    ).properties(height=300)
+
+def recommended_chart(df, rec, large_data=None, source=None):
+    # rec: utils.recommend.Recommendation -> Altair chart
+    if rec.kind == "line":
+        return chart_line_over_time(df, rec.x, rec.y, large_data=large_data, source=source)
+    if rec.kind == "bar":
+        return chart_bar_top_categories(df, rec.x, rec.y, top_n=10, large_data=large_data, source=source)
+    if rec.kind == "scatter":
+        return chart_scatter(df, rec.x, rec.y, large_data=large_data, source=source)
+    return chart_histogram(df, rec.x, large_data=large_data, source=source)
+
+def default_dashboard(df, nums=None, cats=None, times=None, large_data=None, source=None, recommendations=None):
+    # Callers that already ran detect_columns (e.g. the session cache) pass the roles in
+    # and the typed frame, so detection isn't repeated on every rerun; `recommendations`
+    # (from utils.recommend.recommend_charts) likewise skips scoring the columns again.
+    if nums is None or cats is None or times is None:
+        df, nums, cats, times = detect_columns(df)  # returns a new frame; df is not modified
+    if recommendations is None:
+        recommendations = recommend_charts(df, nums, cats, times)
+    charts = [recommended_chart(df, rec, large_data=large_data, source=source) for rec in recommendations]
+    return charts, {"numeric": nums, "categorical": cats, "datetime": times, "recommendations": recommendations}
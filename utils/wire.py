@@ -0,0 +1,178 @@
+import io
+import json
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack is only offered when installed
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional: responses stay uncompressed (Arrow still compresses its buffers)
+    zstandard = None
+
+# Wire formats for /agent, shared by the UI client and the backends.
+#
+#   application/json                      {"schema_description", "sample_rows" (CSV), ...}
+#   application/msgpack                   same keys; sample rows as typed columns under "columns"
+#   application/vnd.apache.arrow.stream   one IPC stream: the sample rows as a typed table, the
+#                                         other request fields in the schema metadata
+#
+# Binary requests carry the sample rows as typed columns, so the stub and mock backends skip
+# the CSV parse. The UI still builds those columns from its sample CSV (encode_request without
+# `frame`), and the local runner turns them back into CSV for its prompt and cache keys.
+# Arrow responses are a table of (name, ipc) rows, one per dataset. Each ipc value is a nested
+# zstd-compressed IPC stream, and the summary/visuals/specs are in the schema metadata. JSON and
+# MessagePack bodies larger than ZSTD_MIN_BYTES are zstd-compressed (Content-Encoding: zstd)
+# when the client accepts it.
+#
+# pandas and pyarrow are imported inside the binary-format paths only, so JSON-only processes
+# (the UI before a dataset is loaded, a backend whose pandas work runs in its CPU pool) skip them.
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+ZSTD_MIN_BYTES = 4096
+META_FIELDS = ("schema_description", "sample_rows", "agent")
+RESPONSE_META = ("summary", "suggested_visuals", "chart_specs")
+
+
+def formats():
+    return [JSON, ARROW] + ([MSGPACK] if msgpack is not None else [])
+
+
+def negotiate(accept: Optional[str], default: str = JSON) -> str:
+    # First supported media type in Accept order (q-values ignored; clients send one type)
+    for part in (accept or "").split(","):
+        media = part.split(";")[0].strip().lower()
+        if media in formats():
+            return media
+    return default
+
+
+def accepts_zstd(accept_encoding: Optional[str]) -> bool:
+    return zstandard is not None and "zstd" in (accept_encoding or "").lower()
+
+
+def compress(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(body)
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+def decompress(body: bytes, max_size: Optional[int] = None) -> bytes:
+    # Streamed with a running cap: request bodies are untrusted, and a few hundred bytes of
+    # zstd can expand to gigabytes
+    if zstandard is None:
+        raise ValueError("zstd-encoded body but zstandard is not installed")
+    out, size = [], 0
+    with zstandard.ZstdDecompressor().stream_reader(body, read_across_frames=True) as reader:
+        while True:
+            chunk = reader.read(1 << 20)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise BodyTooLarge(f"decompressed body exceeds {max_size:,} bytes")
+            out.append(chunk)
+    return b"".join(out)
+
+
+# --- Typed columns ---
+
+def _ipc_bytes(table: "pa.Table") -> bytes:
+    import pyarrow as pa
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _read_ipc(body: bytes) -> "pa.Table":
+    import pyarrow as pa
+    return pa.ipc.open_stream(pa.BufferReader(body)).read_all()
+
+
+def _columns(frame: "pd.DataFrame") -> Dict[str, list]:
+    # MessagePack has no datetime type: timestamps travel as ISO strings
+    import pandas as pd
+    out = {}
+    for col in frame.columns:
+        ser = frame[col]
+        if pd.api.types.is_datetime64_any_dtype(ser):
+            ser = ser.dt.strftime("%Y-%m-%dT%H:%M:%S")
+        out[str(col)] = ser.astype(object).where(ser.notna(), None).tolist()
+    return out
+
+
+# --- Requests ---
+
+def encode_request(payload: Dict[str, Any], fmt: str = JSON, frame: Optional["pd.DataFrame"] = None) -> bytes:
+    # `frame` is the typed sample; without it (the UI's case) binary formats parse
+    # payload["sample_rows"] here, once per request
+    if fmt == JSON:
+        return json.dumps(payload).encode("utf-8")
+    import pandas as pd
+    import pyarrow as pa
+    if frame is None:
+        frame = pd.read_csv(io.StringIO(payload.get("sample_rows") or "")) if payload.get("sample_rows") else pd.DataFrame()
+    fields = {k: payload[k] for k in META_FIELDS if k != "sample_rows" and payload.get(k) is not None}
+    if fmt == MSGPACK:
+        return msgpack.packb({**fields, "columns": _columns(frame)})
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    return _ipc_bytes(table.replace_schema_metadata({k: str(v) for k, v in fields.items()}))
+
+
+def decode_request(body: bytes, content_type: Optional[str]) -> Tuple[Dict[str, Any], Optional["pd.DataFrame"]]:
+    # -> (request fields, typed sample frame or None for JSON)
+    media = (content_type or JSON).split(";")[0].strip().lower()
+    if media == ARROW:
+        table = _read_ipc(body)
+        meta = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+        return {k: meta[k] for k in META_FIELDS if k in meta}, table.to_pandas()
+    if media == MSGPACK:
+        if msgpack is None:
+            raise ValueError("MessagePack is not available on this server")
+        import pandas as pd
+        data = msgpack.unpackb(body)
+        columns = data.pop("columns", None)
+        return data, (pd.DataFrame(columns) if columns is not None else None)
+    return json.loads(body or b"{}"), None
+
+
+# --- Responses ---
+
+def encode_response(resp: Dict[str, Any], fmt: str = JSON) -> bytes:
+    if fmt == MSGPACK:
+        return msgpack.packb(resp)
+    if fmt == ARROW:
+        import pyarrow as pa
+        datasets = resp.get("datasets") or {}
+        table = pa.table({
+            "name": pa.array(list(datasets), pa.string()),
+            "ipc": pa.array([_ipc_bytes(pa.Table.from_pylist(rows)) for rows in datasets.values()], pa.binary()),
+        })
+        meta = {k: json.dumps(resp.get(k)) for k in RESPONSE_META}
+        return _ipc_bytes(table.replace_schema_metadata(meta))
+    return json.dumps(resp).encode("utf-8")
+
+
+def decode_response(body: bytes, content_type: Optional[str]) -> Dict[str, Any]:
+    # Always returns the JSON-shaped dict the UI renders (datasets as lists of records)
+    media = (content_type or JSON).split(";")[0].strip().lower()
+    if media == MSGPACK:
+        return msgpack.unpackb(body)
+    if media == ARROW:
+        table = _read_ipc(body)
+        meta = {k.decode(): json.loads(v) for k, v in (table.schema.metadata or {}).items()}
+        datasets = {name: _read_ipc(ipc).to_pylist()
+                    for name, ipc in zip(table.column("name").to_pylist(), table.column("ipc").to_pylist())}
+        return {**{k: meta.get(k) for k in RESPONSE_META}, "datasets": datasets}
+    return json.loads(body)